@@ -0,0 +1,384 @@
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep, time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PORT = 5000
+RATE = 5.0
+SETTLE = 3.0
+TIMEOUT = 600.0
+POLL_INTERVAL = 0.2
+# Blocks re-read by the commit watcher, so that it sees a short fork
+WATCHED_BLOCKS = 5
+
+
+class Ring:
+    """Ring: A ring of nodes, each one a local `rest.py` subprocess on the
+    loopback interface, started the way they are started by hand: the
+    bootstrap node first, then the other nodes, then the broadcast of the
+    blockchain and the ring.
+    """
+
+    def __init__(self, number_of_nodes: int, capacity: int, difficulty: int,\
+            port: int, directory: str):
+        """Initialize the Ring
+
+        Args:
+            number_of_nodes (int): The number of nodes
+            capacity (int): The maximum number of transactions of a block
+            difficulty (int): The number of zeros a block's hash starts with
+            port (int): The port of the bootstrap node. The other nodes use
+                        the following ports.
+            directory (str): Where the addresses file and the logs are kept
+        """
+        self.number_of_nodes = number_of_nodes
+        self.capacity = capacity
+        self.difficulty = difficulty
+        self.directory = directory
+        self.nodes = [f"127.0.0.1:{port + i}" for i in range(number_of_nodes)]
+        self.addresses_path = os.path.join(directory, "addresses.json")
+        self.processes: List[subprocess.Popen] = []
+
+    def start(self, timeout: float = 60.0) -> None:
+        """Start the nodes and wait until each one holds its 100 coins
+
+        Args:
+            timeout (float): Seconds to wait for each step
+        """
+        addresses = {str(i): x for i, x in enumerate(self.nodes)}
+        addresses["host"] = "127.0.0.1"
+        with open(self.addresses_path, "w") as f:
+            json.dump(addresses, f)
+        environment = dict(os.environ, NOOBCASH_ADDRESSES=self.addresses_path)
+
+        for i, node in enumerate(self.nodes):
+            command = [sys.executable, "rest.py", "add_node", "-i", str(i),\
+                "-p", node.split(":")[1], "-c", str(self.capacity),\
+                "-d", str(self.difficulty)]
+            if i == 0:
+                command += ["-n", str(self.number_of_nodes)]
+            log = open(os.path.join(self.directory, f"node{i}.log"), "w")
+            self.processes.append(subprocess.Popen(command, cwd=DIRECTORY,\
+                env=environment, stdout=log, stderr=subprocess.STDOUT))
+            log.close()
+            # the next node registers itself to the bootstrap node
+            self.wait(lambda: self.get(node, "/blockchain_len") is not None,\
+                timeout, f"node {i} to start")
+
+        requests.get(f"http://{self.nodes[0]}/broadcast_nodes",\
+            timeout=timeout)
+        self.wait(lambda: all(self.balance(x) == 100 for x in self.nodes),\
+            timeout, "the nodes to receive their coins")
+
+    def stop(self) -> None:
+        """Stop the nodes
+        """
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+
+    @staticmethod
+    def get(node: str, path: str, **kwargs) -> Optional[dict]:
+        """Send a GET request to a node
+
+        Returns:
+            response (dict): The JSON response, or None if the node did not
+                             answer
+        """
+        try:
+            r = requests.get(f"http://{node}{path}", timeout=10, **kwargs)
+            return r.json() if r.status_code == 200 else None
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+    def blocks(self, node: str, height: int) -> List[dict]:
+        """Download the blocks of a node that follow a height
+
+        Returns:
+            blocks (List[dict]): The blocks, oldest first, or an empty list
+                                 if the node did not answer
+        """
+        response = self.get(node, "/blocks", params={"height": height},\
+            headers={"Accept": "application/json"})
+        return response["blocks"] if response is not None else []
+
+    def balance(self, node: str) -> Optional[int]:
+        response = self.get(node, "/get_balance")
+        return response["balance"] if response is not None else None
+
+    @staticmethod
+    def wait(condition, timeout: float, description: str) -> None:
+        """Wait until a condition holds, or raise TimeoutError
+        """
+        deadline = perf_counter() + timeout
+        while not condition():
+            if perf_counter() > deadline:
+                raise TimeoutError(f"Timed out waiting for {description}")
+            sleep(POLL_INTERVAL)
+
+
+class CommitWatcher(threading.Thread):
+    """CommitWatcher: Polls a node for its last blocks and records the time
+    at which each block is first seen, so that a transaction's commit time is
+    the time the block that contains it reached the node.
+    """
+
+    def __init__(self, ring: Ring, node: str, height: int):
+        """Initialize the CommitWatcher
+
+        Args:
+            ring (Ring): The ring
+            node (str): The address of the observed node
+            height (int): The height of the node's last block
+        """
+        super().__init__(daemon=True)
+        self.ring = ring
+        self.node = node
+        # block hash -> time the block was first seen
+        self.first_seen: Dict[str, float] = {}
+        self.height = height
+        self.stopped = threading.Event()
+
+    def poll(self) -> None:
+        blocks = self.ring.blocks(self.node, self.height - WATCHED_BLOCKS)
+        now = time()
+        for block in blocks:
+            self.first_seen.setdefault(block["hash"], now)
+            self.height = max(self.height, block["index"])
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.poll()
+            self.stopped.wait(POLL_INTERVAL)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+        self.poll()
+
+
+def read_workload(number_of_nodes: int) -> List[Tuple[int, int, int]]:
+    """Read the transactions of `transactions_test_input/<n>nodes`, in the
+    order in which the nodes would send them if each one ran
+    `node_script.py` at the same time
+
+    Args:
+        number_of_nodes (int): The number of nodes of the ring
+
+    Returns:
+        transactions (List[Tuple[int, int, int]]): The (sender, receiver,
+                                                   amount) of each transaction
+    """
+    workloads = []
+    for sender in range(number_of_nodes):
+        path = os.path.join(DIRECTORY, "transactions_test_input",\
+            f"{number_of_nodes}nodes", f"transactions{sender}.txt")
+        with open(path) as f:
+            lines = [x.split() for x in f if x.strip()]
+        workloads.append([(sender, int(receiver[2:]), int(amount))\
+            for receiver, amount in lines])
+    return [x for batch in itertools.zip_longest(*workloads) for x in batch\
+        if x is not None]
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """The value below which a fraction of the values fall
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def run(number_of_nodes: int, capacity: int, difficulty: int, rate: float,\
+        port: int, settle: float, timeout: float,\
+        limit: Optional[int] = None) -> dict:
+    """Run a workload on a new ring and measure it. The transactions are sent
+    open-loop, at a fixed rate whatever the latency of the nodes, and the
+    run ends once the ring is quiescent: the nodes agree on the length of the
+    blockchain, no node holds enough pending transactions to mine a block,
+    and nothing changed for `settle` seconds.
+
+    Args:
+        number_of_nodes (int): The number of nodes
+        capacity (int): The maximum number of transactions of a block
+        difficulty (int): The number of zeros a block's hash starts with
+        rate (float): The transactions sent per second
+        port (int): The port of the bootstrap node
+        settle (float): Seconds without changes for the ring to be quiescent
+        timeout (float): Seconds after the last transaction after which the
+                         run ends anyway
+        limit (int): Send only the first transactions of the workload
+
+    Returns:
+        result (dict): The measurements, in the format of `results.json`
+    """
+    transactions = read_workload(number_of_nodes)[:limit]
+    with tempfile.TemporaryDirectory() as directory:
+        ring = Ring(number_of_nodes, capacity, difficulty, port, directory)
+        try:
+            ring.start()
+            start_height = ring.get(ring.nodes[0],\
+                "/blockchain_len")["blockchain_len"]
+            watcher = CommitWatcher(ring, ring.nodes[0], start_height)
+            watcher.start()
+
+            def send(sender: int, receiver: int, amount: int)\
+                    -> Optional[str]:
+                try:
+                    r = requests.post(\
+                        f"http://{ring.nodes[sender]}/new_transaction",\
+                        json={"receiver": ring.nodes[receiver],\
+                            "amount": amount}, timeout=timeout)
+                    return r.json().get("transaction_id")
+                except (requests.exceptions.RequestException, ValueError):
+                    return None
+
+            # transaction id -> scheduled send time
+            sent: Dict[str, float] = {}
+            start = time()
+            with ThreadPoolExecutor(max_workers=64) as executor:
+                futures = []
+                for i, (sender, receiver, amount) in enumerate(transactions):
+                    scheduled = start + i / rate
+                    sleep(max(scheduled - time(), 0))
+                    futures.append((scheduled,\
+                        executor.submit(send, sender, receiver, amount)))
+            for scheduled, future in futures:
+                if future.result() is not None:
+                    sent[future.result()] = scheduled
+
+            timed_out = not wait_for_quiescence(ring, settle, timeout)
+            end = time()
+            watcher.stop()
+
+            chain = ring.blocks(ring.nodes[0], start_height)
+            statistics = [ring.get(x, "/get_statistics")\
+                for x in ring.nodes]
+        finally:
+            ring.stop()
+
+    latencies = []
+    last_commit = start
+    for block in chain:
+        seen = watcher.first_seen.get(block["hash"], end)
+        for transaction in block["list_of_transactions"]:
+            if transaction["transaction_id"] in sent:
+                latencies.append(seen - sent[transaction["transaction_id"]])
+                last_commit = max(last_commit, seen)
+    mining_times = [x for y in statistics if y is not None\
+        for x in y["mining_times"]]
+    hashrates = [x["hashrate"] for x in statistics if x is not None]
+    execution_time = last_commit - start
+    return {
+        "mean_mining_time": sum(mining_times) / len(mining_times)\
+            if mining_times else None,
+        "number_of_block": len(chain),
+        "number_of_transactions": len(latencies),
+        "execution_time": execution_time,
+        "throughput": len(latencies) / execution_time\
+            if execution_time > 0 else 0.0,
+        "block_time": execution_time / len(chain) if chain else None,
+        "mean_hashrate": sum(hashrates) / len(hashrates)\
+            if hashrates else None,
+        "rate": rate,
+        "sent_transactions": len(transactions),
+        "failed_transactions": len(transactions) - len(sent),
+        "p50_commit_latency": percentile(latencies, 0.50),
+        "p95_commit_latency": percentile(latencies, 0.95),
+        "p99_commit_latency": percentile(latencies, 0.99),
+        "timed_out": timed_out
+    }
+
+
+def wait_for_quiescence(ring: Ring, settle: float, timeout: float) -> bool:
+    """Wait until the ring is quiescent, see `run`
+
+    Returns:
+        bool: True if the ring became quiescent else False
+    """
+    deadline = perf_counter() + timeout
+    last_state, since = None, perf_counter()
+    while perf_counter() < deadline:
+        state = [ring.get(x, "/blockchain_len") for x in ring.nodes]
+        if state != last_state:
+            last_state, since = state, perf_counter()
+        elif None not in state and\
+                len(set(x["blockchain_len"] for x in state)) == 1 and\
+                all(x["pending_transactions"] < ring.capacity\
+                    for x in state) and\
+                perf_counter() - since >= settle:
+            return True
+        sleep(POLL_INTERVAL)
+    return False
+
+
+if __name__ == "__main__":
+    """Benchmark the ring: for each combination of number of nodes, capacity
+    and difficulty, start a ring on the loopback interface, replay the
+    `transactions_test_input` workload of that number of nodes, and store
+    the throughput, block time and commit latencies of the run in
+    `results.json`, under the keys `plot.py` reads. The charts are then
+    regenerated, unless --no-plot is given.
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark a local ring")
+    parser.add_argument("-n", "--nodes", type=int, nargs="+", default=[5, 10],
+                        choices=[5, 10], help="Numbers of nodes")
+    parser.add_argument("-c", "--capacity", type=int, nargs="+",
+                        default=[1, 5, 10], help="Block capacities")
+    parser.add_argument("-d", "--difficulty", type=int, nargs="+",
+                        default=[4, 5], help="Difficulties")
+    parser.add_argument("-r", "--rate", type=float, default=RATE,
+                        help="Transactions sent per second")
+    parser.add_argument("-l", "--limit", type=int, default=None,
+                        help="Send only the first transactions of the\
+                            workload")
+    parser.add_argument("-p", "--port", type=int, default=PORT,
+                        help="Port of the bootstrap node")
+    parser.add_argument("--settle", type=float, default=SETTLE,
+                        help="Seconds without changes after which the ring\
+                            is quiescent")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help="Seconds to wait for the ring to be quiescent")
+    parser.add_argument("-o", "--output", default="results.json",
+                        help="Results file, updated after each run")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="Do not regenerate the charts")
+    args = parser.parse_args()
+
+    results = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            results = json.load(f)
+
+    for number_of_nodes, difficulty, capacity in itertools.product(\
+            args.nodes, args.difficulty, args.capacity):
+        key = f"{number_of_nodes}_nodes_{difficulty}_difficulty_"\
+            f"{capacity}_capacity"
+        print("Running", key)
+        result = run(number_of_nodes, capacity, difficulty, args.rate,\
+            args.port, args.settle, args.timeout, args.limit)
+        print(json.dumps(result, indent=4))
+        results[key] = result
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if not args.no_plot:
+        subprocess.run([sys.executable, "plot.py"], cwd=DIRECTORY,\
+            check=True)
@@ -1,5 +1,18 @@
 from .block import Block
-from .blockchain import Blockchain
+from .serialization import Reader, Writer
+from .merkle import MerkleTree, verify_proof
+from .blockchain import Blockchain, ChainSnapshot
+from .chain_index import ChainIndex
+from .store import BlockStore, StoredChain
 from .wallet import Wallet
 from .transaction import Transaction, TransactionOutput
+from .transaction_index import TransactionIndex
+from .utxo import UTXOSet
+from .mempool import Mempool
+from .locks import RWLock, TimedLock
+from .metrics import REGISTRY, Counter, Gauge, Histogram
+from .profiler import SPANS, Spans, sample_stacks
+from .verification import SignatureVerifier
+from .validation import ChainValidator
+from .miner import Miner, SerialMiner, ParallelMiner, create_miner
 from .node import Node, RingNode
@@ -1,31 +1,116 @@
 import hashlib
-from json import dumps
 from time import time
-from typing import List
+from typing import List, Optional
 
+from .merkle import MerkleTree
+from .serialization import Reader, Writer, pack_hex, unpack_hex
 from .transaction import Transaction
 
 
+def block_hash(header_prefix: bytes, nonce: int) -> str:
+    """Compute the hash of a block given its header prefix and a candidate
+    nonce. The hash is the SHA-256 of the prefix followed by the nonce's
+    decimal digits.
+
+    Args:
+        header_prefix (bytes): The block's serialized header without the
+                               nonce, as returned by `Block.header_prefix`
+        nonce (int): The candidate nonce
+
+    Returns:
+        hash (str): Block's hash for the given nonce
+    """
+    return hashlib.sha256(header_prefix + nonce_bytes(nonce)).hexdigest()
+
+
+def nonce_bytes(nonce: int) -> bytes:
+    """Serialize a nonce the way it is appended to the block header prefix
+
+    Args:
+        nonce (int): The nonce
+
+    Returns:
+        bytes: The nonce's serialization
+    """
+    return str(nonce).encode('ascii')
+
+
 class Block:
     """Blockchain block: Contains the transactions of a block of the
     blockchain. Also, contains other useful block data such as block index,
-    block nonce, etc.
+    block nonce, etc. The hashes are kept as raw bytes and exposed as hex
+    strings.
     """
 
-    def __init__(self, index: int, nonce: int, previous_hash: str):
+    __slots__ = ("index", "timestamp", "list_of_transactions",\
+        "_merkle_root", "nonce", "_previous_hash", "_hash")
+
+    def __init__(self, index: int, nonce: int, previous_hash: str,\
+            timestamp: Optional[float] = None,\
+            list_of_transactions: Optional[List[Transaction]] = None,\
+            merkle_root: Optional[str] = None, hash: Optional[str] = None):
         """Block constructor: Inititalize a Block using given parameters
 
         Args:
             index (int): Block index (block serial number)
             nonce (str): Block nonce
             previous_hash (str): Previous block's hash
+            timestamp (float): Block's creation time. Defaults to now.
+            list_of_transactions (List[Transaction]): Block's transactions
+            merkle_root (str): Block's Merkle root and
+            hash (str): Block's hash, which are given if the block was
+                        received and not created. Otherwise they are computed
+                        on first access.
         """
         self.index = index
-        self.timestamp = time()
-        self.list_of_transactions = []
+        self.timestamp = timestamp if timestamp is not None else time()
+        self.list_of_transactions = list_of_transactions\
+            if list_of_transactions is not None else []
+        self._merkle_root = pack_hex(merkle_root)
         self.nonce = nonce
-        self.previous_hash = previous_hash
-        self.hash = self.__my_hash()
+        self._previous_hash = pack_hex(previous_hash)
+        self._hash = pack_hex(hash)
+
+    @property
+    def previous_hash(self) -> str:
+        """Previous block's hash
+
+        Returns:
+            previous_hash (str): Previous block's hash
+        """
+        return unpack_hex(self._previous_hash)
+
+    @property
+    def merkle_root(self) -> str:
+        """Merkle root of the block's transactions
+
+        Returns:
+            merkle_root (str): Block's Merkle root
+        """
+        return unpack_hex(self._packed_merkle_root())
+
+    def _packed_merkle_root(self) -> bytes:
+        """Block's Merkle root as raw bytes, computed on first access
+        """
+        if self._merkle_root is None:
+            self._merkle_root = self.merkle_tree().root
+        return self._merkle_root
+
+    @property
+    def hash(self) -> str:
+        """Block's hash
+
+        Returns:
+            hash (str): Block's hash
+        """
+        return unpack_hex(self._packed_hash())
+
+    def _packed_hash(self) -> bytes:
+        """Block's hash as raw bytes, computed on first access
+        """
+        if self._hash is None:
+            self._hash = pack_hex(self.__my_hash())
+        return self._hash
 
     def set_nonce(self, nonce: int):
         """Set nonce and update block's hash
@@ -34,23 +119,56 @@ class Block:
             nonce (int): The new nonce
         """
         self.nonce = nonce
-        self.hash = self.__my_hash()
+        self._hash = None
         
+    def merkle_tree(self) -> MerkleTree:
+        """Build the Merkle tree of the block's transactions
+
+        Returns:
+            merkle_tree (MerkleTree): The Merkle tree, whose leaves are the
+                                      digests of the transactions
+        """
+        return MerkleTree([x.digest() for x in self.list_of_transactions])
+
+    def proof(self, transaction_id: str) -> Optional[List[dict]]:
+        """Inclusion proof of one of the block's transactions
+
+        Args:
+            transaction_id (str): The id of the transaction
+
+        Returns:
+            proof (List[dict]): The path from the transaction's leaf to the
+                                Merkle root, or None if the transaction is
+                                not in the block
+        """
+        for i, transaction in enumerate(self.list_of_transactions):
+            if transaction.transaction_id == transaction_id:
+                return self.merkle_tree().proof(i)
+        return None
+
+    def header_prefix(self) -> bytes:
+        """Serialize the block header without the nonce, in the canonical
+        binary format. The header contains the index, the timestamp, the
+        previous hash and the Merkle root of the transactions. While mining
+        only the nonce changes, so the prefix is computed once per block.
+
+        Returns:
+            header_prefix (bytes): The serialized header prefix
+        """
+        writer = Writer()
+        writer.write_int(self.index)
+        writer.write_float(self.timestamp)
+        writer.write_text(self._previous_hash)
+        writer.write_text(self._packed_merkle_root())
+        return writer.getvalue()
+
     def __my_hash(self) -> str:
         """Private function used to generate block's hash
 
         Returns:
             hash (str): Block's hash
         """
-        obj = {
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "list_of_transactions": [str(x) for x in\
-                self.list_of_transactions],
-            "nonce": self.nonce,
-            "previous_hash": self.previous_hash
-        }
-        return hashlib.sha256(dumps(obj).encode('utf8')).hexdigest()
+        return block_hash(self.header_prefix(), self.nonce)
 
     def add_transactions_to_block(self, transactions: List[Transaction]):
         """Add Transaction to block's list of transactions
@@ -63,7 +181,8 @@ class Block:
         """
         for transaction in transactions:
             self.list_of_transactions.append(transaction)
-        self.hash = self.__my_hash()
+        self._merkle_root = None
+        self._hash = None
         return self
 
     def to_dict(self) -> dict:
@@ -80,29 +199,63 @@ class Block:
             "timestamp": self.timestamp,
             "list_of_transactions": [x.to_dict() for x in\
                 self.list_of_transactions],
+            "merkle_root": self.merkle_root,
             "nonce": self.nonce,
             "previous_hash": self.previous_hash,
             "hash": self.hash
         }
 
-    def parser(self, dictionary: dict) -> None:
-        """Convert dictionary to object
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "Block":
+        """Convert dictionary to object. The hash and the Merkle root are
+        taken from the dictionary, not recomputed.
 
         Args:
             dictionary (dict): The dictionary to be parsed
+
+        Returns:
+            block (Block): The parsed object
+        """
+        return cls(dictionary["index"], dictionary["nonce"],\
+            dictionary["previous_hash"], dictionary["timestamp"],\
+            [Transaction.from_dict(x)\
+                for x in dictionary["list_of_transactions"]],\
+            dictionary["merkle_root"], dictionary["hash"])
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format
+
+        Args:
+            writer (Writer): The writer to write to
         """
-        list_of_transactions = []
-        for x in dictionary["list_of_transactions"]:
-            transaction = Transaction("", "", "", 0, [], "s")
-            transaction.parser(x)
-            list_of_transactions.append(transaction)
+        writer.write_int(self.index)
+        writer.write_float(self.timestamp)
+        writer.write_text(self._previous_hash)
+        writer.write_text(self._packed_merkle_root())
+        writer.write_int(self.nonce)
+        writer.write_text(self._packed_hash())
+        writer.write_list(self.list_of_transactions)
 
-        self.index = dictionary["index"]
-        self.timestamp = dictionary["timestamp"]
-        self.list_of_transactions = list_of_transactions
-        self.nonce = dictionary["nonce"]
-        self.previous_hash = dictionary["previous_hash"]
-        self.hash = dictionary["hash"]
+    @classmethod
+    def read(cls, reader: Reader) -> "Block":
+        """Read object written by `Block.write`. The hash and the Merkle root
+        are read, not recomputed.
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            block (Block): The read object
+        """
+        index = reader.read_int()
+        timestamp = reader.read_float()
+        previous_hash = reader.read_text(packed=True)
+        merkle_root = reader.read_text(packed=True)
+        nonce = reader.read_int()
+        hash = reader.read_text(packed=True)
+        list_of_transactions = reader.read_list(Transaction.read)
+        return cls(index, nonce, previous_hash, timestamp,\
+            list_of_transactions, merkle_root, hash)
 
     def validate_block(self, hash: str) -> bool:
         """Check that the the actual block hash is equal with the given one
@@ -113,4 +266,13 @@ class Block:
         Returns:
             bool: True if hash is correct else False
         """
-        return hash == self.__my_hash
+        return hash == self.__my_hash()
+
+    def validate_merkle_root(self) -> bool:
+        """Check that the block's Merkle root, which is given if the block was
+        received, is the root of its transactions' Merkle tree
+
+        Returns:
+            bool: True if the Merkle root is correct else False
+        """
+        return self._packed_merkle_root() == self.merkle_tree().root
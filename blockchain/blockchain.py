@@ -1,10 +1,25 @@
+from collections import OrderedDict
+import json
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
 from Crypto.Util.number import size
 from .block import Block
+from .chain_index import ChainIndex
+from .mempool import Mempool
+from .serialization import BINARY_BYTES, FORMAT_VERSION, ChunkedWriter,\
+    Reader, Writer
+from .store import BlockStore, StoredChain
 from .transaction import Transaction
+from .transaction_index import TransactionIndex
+
+# The number of side branch blocks kept, see `Blockchain.add_side_block`
+MAX_SIDE_BLOCKS = 1000
+
 
 class Blockchain:
-    """Blockchain: Blockchain that contains dict with blocks and other useful
-    blockchain information
+    """Blockchain: Blockchain that contains the blocks of the main chain by
+    height, an index of the blocks by hash, and other useful blockchain
+    information
     """
 
     def __init__(self, capacity: int, difficulty: int):
@@ -14,32 +29,272 @@ class Blockchain:
             capacity (int): Blockchain's block capacity
             difficulty (str): The number of zeros to be found during mining
         """
-        self.blockchain = {}
-        self.last_block = None
-        self.transactions = []
+        # the blocks of the main chain by height, the last one being the
+        # last block
+        self.blocks: Sequence[Block] = []
+        self.chain_index = ChainIndex()
+        # blocks that are not on the main chain, oldest first
+        self.side_blocks: "OrderedDict[str, Block]" = OrderedDict()
+        self.transaction_index = TransactionIndex()
+        # transactions that are not in a block yet
+        self.transactions = Mempool()
         self.number_of_transactions = 0
         self.capacity = capacity
         self.difficulty = difficulty
+        # the on-disk store of the blocks, if the blockchain is persisted
+        self.store: Optional[BlockStore] = None
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def last_block(self) -> Optional[Block]:
+        """The last block of the main chain
+
+        Returns:
+            block (Block): The last block, or None if there is no block yet
+        """
+        return self.blocks[-1] if len(self.blocks) else None
 
     def add_new_block(self, block: Block):
-        """Add new block to blockchain. Insert into the `self.blockchain` dict
-        the previous block (which has reached the max number of transactions),
-        and keep new block to `self.last_block` variable.
+        """Add new block to blockchain, after the last block.
 
         Args:
-            block (Block): The new block to be assigned to `self.last_block`
-                           variable
+            block (Block): The new block, which becomes the last block
 
         Returns:
             blockchain (Blockchain): Blockchain after the insertion of a new
                                      block
         """
-        self.blockchain[block.previous_hash] = self.last_block
-        self.last_block = block
+        self.blocks.append(block)
+        self.chain_index.append(block.hash, block.previous_hash)
+        self.side_blocks.pop(block.hash, None)
+        self.transaction_index.add_block(block)
         return self
 
+    def add_side_block(self, block: Block) -> bool:
+        """Keep a block that does not extend the last block, but whose parent
+        is known, as a block of a side branch. Only the newest
+        `MAX_SIDE_BLOCKS` side blocks are kept.
+
+        Args:
+            block (Block): The block
+
+        Returns:
+            bool: True if the block was added, False if it is already known
+                  or its parent is unknown
+        """
+        if self.get_block(block.hash) is not None or\
+                self.get_block(block.previous_hash) is None:
+            return False
+        self.__keep_side_block(block)
+        return True
+
+    def __keep_side_block(self, block: Block) -> None:
+        """Private function that keeps a side block and evicts the oldest
+        side block if there are too many
+        """
+        self.side_blocks[block.hash] = block
+        self.chain_index.add_child(block.previous_hash, block.hash)
+        if len(self.side_blocks) > MAX_SIDE_BLOCKS:
+            _, evicted = self.side_blocks.popitem(last=False)
+            self.chain_index.remove_child(evicted.previous_hash, evicted.hash)
+
+    def children_of(self, hash: str) -> List[Block]:
+        """The known children of a block, on the main chain and on side
+        branches
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            children (List[Block]): The children, the one on the main chain
+                                    first
+        """
+        return [self.get_block(x) for x in self.chain_index.children_of(hash)]
+
+    def get_block(self, hash: str) -> Optional[Block]:
+        """Find a block of the blockchain by its hash, on the main chain or
+        on a side branch
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            block (Block): The block, or None if it is not in the blockchain
+        """
+        height = self.chain_index.height_of(hash)
+        if height is not None:
+            return self.blocks[height]
+        return self.side_blocks.get(hash)
+
+    def get_transaction(self, transaction_id: str)\
+            -> Optional[Tuple[Block, int]]:
+        """Find a transaction of the main chain by its id
+
+        Args:
+            transaction_id (str): The transaction's id
+
+        Returns:
+            block, position (Block, int): The transaction's block and its
+                position in the block, or None if the transaction is not on
+                the main chain
+        """
+        location = self.transaction_index.locate(transaction_id)
+        if location is None:
+            return None
+        return self.blocks[location[0]], location[1]
+
+    def get_block_at(self, height: int) -> Optional[Block]:
+        """Find the block of the main chain at a height
+
+        Args:
+            height (int): The block's height, i.e. its index
+
+        Returns:
+            block (Block): The block, or None if the main chain is shorter
+        """
+        if 0 <= height < len(self.blocks):
+            return self.blocks[height]
+        return None
+
+    def iter_blocks(self) -> Iterator[Block]:
+        """Iterate over the blocks of the main chain from the last one back to
+        the genesis block
+
+        Returns:
+            blocks (Iterator[Block]): The blocks, newest first
+        """
+        for height in range(len(self.blocks) - 1, -1, -1):
+            yield self.blocks[height]
+
+    def locator(self) -> List[str]:
+        """Hashes that describe the blockchain to a peer, so that the peer
+        can find the last block both blockchains share: the 10 newest blocks,
+        then blocks exponentially further apart, and the genesis block.
+
+        Returns:
+            hashes (List[str]): The hashes, newest first
+        """
+        hashes = []
+        step = 1
+        height = len(self.chain_index) - 1
+        while height > 0:
+            hashes.append(self.chain_index.hash_at(height))
+            if len(hashes) >= 10:
+                step *= 2
+            height -= step
+        if len(self.chain_index):
+            hashes.append(self.chain_index.hash_at(0))
+        return hashes
+
+    def blocks_after(self, hash: str) -> Optional[List[Block]]:
+        """The blocks of the main chain that follow a block
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            blocks (List[Block]): The following blocks, oldest first, or None
+                                  if the block is not on the main chain
+        """
+        height = self.chain_index.height_of(hash)
+        if height is None:
+            return None
+        return list(self.blocks[height + 1:])
+
+    def replace_suffix(self, hash: str, blocks: List[Block]) -> List[Block]:
+        """Replace the blocks that follow a block of the main chain with the
+        given ones. Only the replaced part of the blockchain is touched, and
+        the replaced blocks are kept as a side branch.
+
+        Args:
+            hash (str): The hash of the last block to be kept
+            blocks (List[Block]): The new blocks that follow it, oldest first
+
+        Returns:
+            removed (List[Block]): The removed blocks, oldest first
+        """
+        height = self.chain_index.height_of(hash)
+        removed = list(self.blocks[height + 1:])
+        del self.blocks[height + 1:]
+        self.chain_index.truncate(height + 1)
+        for block in reversed(removed):
+            self.transaction_index.remove_block(block)
+        for block in removed:
+            self.__keep_side_block(block)
+        for block in blocks:
+            self.add_new_block(block)
+        return removed
+
+    def attach_store(self, store: BlockStore) -> None:
+        """Persist the blockchain to a store: its blocks replace the stored
+        ones, and from now on the blocks are read from and appended to the
+        store.
+
+        Args:
+            store (BlockStore): The store
+        """
+        store.truncate(0)
+        for block in self.blocks:
+            store.append(block)
+        self.blocks = StoredChain(store)
+        self.store = store
+
+    @classmethod
+    def from_store(cls, store: BlockStore, capacity: int, difficulty: int,\
+            transaction_index: Optional[TransactionIndex] = None,\
+            height: int = -1) -> "Blockchain":
+        """Open a blockchain persisted to a store. The blocks are read when
+        they are accessed, except for the ones whose transactions are indexed.
+
+        Args:
+            store (BlockStore): The store
+            capacity (int): Blockchain's block capacity
+            difficulty (str): The number of zeros to be found during mining
+            transaction_index (TransactionIndex): The index of the
+                transactions up to a height, e.g. from a snapshot. The
+                transactions of the blocks after it are indexed.
+            height (int): The height of the last block the index includes
+
+        Returns:
+            blockchain (Blockchain): The blockchain
+        """
+        blockchain = cls(capacity, difficulty)
+        blockchain.blocks = StoredChain(store)
+        blockchain.chain_index = ChainIndex(store.hashes())
+        if transaction_index is not None:
+            blockchain.transaction_index = transaction_index
+        else:
+            height = -1
+        for i in range(height + 1, len(store)):
+            blockchain.transaction_index.add_block(store.get(i))
+        blockchain.number_of_transactions = store.number_of_transactions()
+        blockchain.store = store
+        return blockchain
+
+    def snapshot(self) -> "ChainSnapshot":
+        """Take an immutable snapshot of the blockchain, so that it can be
+        read without holding the lock that guards the blockchain. The blocks
+        of a persisted blockchain are still read from the store, through a
+        frozen `StoredChain` that keeps the blocks a branch switch removes
+        from the store.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired.
+
+        Returns:
+            snapshot (ChainSnapshot): The snapshot
+        """
+        if isinstance(self.blocks, StoredChain):
+            blocks = StoredChain(self.store, list(self.chain_index.hashes))
+        else:
+            blocks = list(self.blocks)
+        return ChainSnapshot(blocks, list(self.transactions),\
+            self.number_of_transactions, self.capacity, self.difficulty)
+
     def to_dict(self) -> dict:
-        """Convert object to dict
+        """Convert object to dict. The blocks before the last one are given
+        by hash.
 
         Args:
             None
@@ -47,43 +302,216 @@ class Blockchain:
         Returns:
             dict (dict): Object's dict
         """
+        return self.snapshot().to_dict()
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "Blockchain":
+        """Convert dictionary to object
+
+        Args:
+            dictionary (dict): The dictionary to be parsed
+
+        Returns:
+            blockchain (Blockchain): The parsed object
+        """
+        blockchain = cls(dictionary["capacity"], dictionary["difficulty"])
+        blockchain.number_of_transactions =\
+            dictionary["number_of_transactions"]
+        blocks = [Block.from_dict(x) for x in\
+            dictionary["blockchain"].values()]
+        blocks.sort(key=lambda x: x.index)
+        for block in blocks:
+            blockchain.add_new_block(block)
+        blockchain.add_new_block(Block.from_dict(dictionary["last_block"]))
+        blockchain.transactions = Mempool(Transaction.from_dict(x)\
+            for x in dictionary["transactions"])
+        return blockchain
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format. The blocks before the
+        last one are written after their hashes, by height.
+
+        Args:
+            writer (Writer): The writer to write to
+        """
+        self.snapshot().write(writer)
+
+    @classmethod
+    def read(cls, reader: Reader) -> "Blockchain":
+        """Read object written by `Blockchain.write`
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            blockchain (Blockchain): The read object
+        """
+        blockchain = cls(reader.read_int(), reader.read_int())
+        blockchain.number_of_transactions = reader.read_int()
+        blocks = []
+        for _ in range(reader.read_varint()):
+            reader.read_text()
+            blocks.append(Block.read(reader))
+        blocks.sort(key=lambda x: x.index)
+        blocks.append(Block.read(reader))
+        for block in blocks:
+            blockchain.add_new_block(block)
+        blockchain.transactions = Mempool(reader.read_list(Transaction.read))
+        return blockchain
+
+    @classmethod
+    def from_ndjson(cls, lines: Iterable[bytes]) -> "Blockchain":
+        """Parse a blockchain streamed by `ChainSnapshot.iter_ndjson`, one
+        line at a time
+
+        Args:
+            lines (Iterable[bytes]): The lines of the stream
+
+        Returns:
+            blockchain (Blockchain): The parsed object
+        """
+        lines = iter(x for x in lines if x)
+        header = json.loads(next(lines))
+        blockchain = cls(header["capacity"], header["difficulty"])
+        blockchain.number_of_transactions = header["number_of_transactions"]
+        for line in lines:
+            item = json.loads(line)
+            if "block" in item:
+                blockchain.add_new_block(Block.from_dict(item["block"]))
+            else:
+                blockchain.transactions = Mempool(Transaction.from_dict(x)\
+                    for x in item["transactions"])
+        return blockchain
+
+
+class ChainSnapshot:
+    """ChainSnapshot: An immutable view of a blockchain at some point, which
+    can be read and serialized without holding the lock that guards the
+    blockchain. The blocks are shared with the blockchain, since a block does
+    not change once it is appended, and only the references to them and the
+    mempool are copied.
+    """
+
+    def __init__(self, blocks: Sequence[Block],\
+            transactions: List[Transaction], number_of_transactions: int,\
+            capacity: int, difficulty: int):
+        """Initialize the ChainSnapshot
+
+        Args:
+            blocks (Sequence[Block]): The blocks of the main chain by height
+            transactions (List[Transaction]): The transactions of the mempool
+            number_of_transactions (int): See `Blockchain`
+            capacity (int): Blockchain's block capacity
+            difficulty (int): The number of zeros to be found during mining
+        """
+        self.blocks = blocks
+        self.transactions = transactions
+        self.number_of_transactions = number_of_transactions
+        self.capacity = capacity
+        self.difficulty = difficulty
+
+    def to_dict(self) -> dict:
+        """Convert the blockchain to dict, see `Blockchain.to_dict`
+
+        Returns:
+            dict (dict): The blockchain's dict
+        """
         blockchain_to_dict = {}
-        for hash, block in self.blockchain.items():
-            blockchain_to_dict[hash] = block.to_dict()
+        for height in range(len(self.blocks) - 1):
+            block = self.blocks[height]
+            blockchain_to_dict[block.hash] = block.to_dict()
 
         return {
             "blockchain": blockchain_to_dict,
-            "last_block": self.last_block.to_dict(),
+            "last_block": self.blocks[-1].to_dict(),
             "transactions": [x.to_dict() for x in self.transactions],
             "number_of_transactions": self.number_of_transactions,
             "capacity": self.capacity,
             "difficulty": self.difficulty
         }
 
-    def parser(self, dictionary: dict) -> None:
-        """Convert dictionary to object
+    def write(self, writer: Writer) -> None:
+        """Write the blockchain in the canonical binary format, see
+        `Blockchain.write`
 
         Args:
-            dictionary (dict): The dictionary to be parsed
+            writer (Writer): The writer to write to
         """
-        transactions = []
-        for x in dictionary["transactions"]:
-            transaction = Transaction("", "", "", 0, [], "s")
-            transaction.parser(x)
-            transactions.append(transaction)
+        for _ in self.__write_parts(writer):
+            pass
 
-        last_block = Block(0, 0, "")
-        last_block.parser(dictionary["last_block"])
+    def __write_parts(self, writer: Writer) -> Iterator[None]:
+        """Private function that writes the blockchain in the canonical
+        binary format, pausing after each block
+        """
+        writer.write_int(self.capacity)
+        writer.write_int(self.difficulty)
+        writer.write_int(self.number_of_transactions)
+        writer.write_varint(len(self.blocks) - 1)
+        for height in range(len(self.blocks) - 1):
+            block = self.blocks[height]
+            writer.write_text(block.hash)
+            block.write(writer)
+            yield
+        self.blocks[-1].write(writer)
+        writer.write_list(self.transactions)
+        yield
 
-        blockchain = {}
-        for hash, block in dictionary["blockchain"].items():
-            new_block = Block(0, 0, "")
-            new_block.parser(block)
-            blockchain[hash] = new_block
+    def iter_binary(self) -> Iterator[bytes]:
+        """Serialize the blockchain like `serialization.dumps`, in chunks,
+        so that the blocks are serialized one at a time while the chunks are
+        sent
 
-        self.capacity = dictionary["capacity"]
-        self.difficulty = dictionary["difficulty"]
-        self.transactions = transactions
-        self.number_of_transactions = dictionary["number_of_transactions"]
-        self.last_block = last_block
-        self.blockchain = blockchain
+        Returns:
+            chunks (Iterator[bytes]): The serialized blockchain, in chunks
+        """
+        writer = ChunkedWriter()
+        writer.write_varint(FORMAT_VERSION)
+        for _ in self.__write_parts(writer):
+            chunk = writer.take()
+            if chunk:
+                BINARY_BYTES.inc(len(chunk))
+                yield chunk
+        chunk = writer.take(force=True)
+        BINARY_BYTES.inc(len(chunk))
+        yield chunk
+
+    def iter_json(self) -> Iterator[bytes]:
+        """Serialize the blockchain's dict (see `Blockchain.to_dict`) to
+        JSON, one block at a time
+
+        Returns:
+            chunks (Iterator[bytes]): The JSON text, in chunks
+        """
+        yield b'{"blockchain": {'
+        for height in range(len(self.blocks) - 1):
+            block = self.blocks[height]
+            yield (", " if height else "").encode('utf8') +\
+                json.dumps(block.hash).encode('utf8') + b": " +\
+                json.dumps(block.to_dict()).encode('utf8')
+        yield ('}, "last_block": ' + json.dumps(self.blocks[-1].to_dict()) +\
+            ', "transactions": ' +\
+            json.dumps([x.to_dict() for x in self.transactions]) +\
+            f', "number_of_transactions": {self.number_of_transactions}' +\
+            f', "capacity": {self.capacity}' +\
+            f', "difficulty": {self.difficulty}}}').encode('utf8')
+
+    def iter_ndjson(self) -> Iterator[bytes]:
+        """Serialize the blockchain to newline-delimited JSON: a header line
+        with the blockchain's parameters, a line per block by height, and a
+        line with the mempool. See `Blockchain.from_ndjson`.
+
+        Returns:
+            lines (Iterator[bytes]): The lines
+        """
+        yield json.dumps({
+            "capacity": self.capacity,
+            "difficulty": self.difficulty,
+            "number_of_transactions": self.number_of_transactions,
+            "length": len(self.blocks)
+        }).encode('utf8') + b"\n"
+        for height in range(len(self.blocks)):
+            yield json.dumps({"block": self.blocks[height].to_dict()})\
+                .encode('utf8') + b"\n"
+        yield json.dumps({"transactions":\
+            [x.to_dict() for x in self.transactions]}).encode('utf8') + b"\n"
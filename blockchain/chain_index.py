@@ -0,0 +1,125 @@
+from typing import Dict, Iterable, List, Optional
+
+
+class ChainIndex:
+    """ChainIndex: Index of the blocks of a blockchain by hash. Keeps the hash
+    of the block at each height of the main chain, the height of each block
+    of the main chain, and the children of the blocks that are not on the
+    main chain, i.e. the side branches.
+    """
+
+    def __init__(self, hashes: Optional[Iterable[str]] = None):
+        """Initialize the ChainIndex
+
+        Args:
+            hashes (Iterable[str]): The hashes of the main chain's blocks,
+                                    by height
+        """
+        self.hashes: List[str] = list(hashes) if hashes is not None else []
+        self.heights: Dict[str, int] = {x: i for i, x in\
+            enumerate(self.hashes)}
+        # parent hash -> hashes of the children that are not on the main
+        # chain
+        self.children: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, hash: object) -> bool:
+        return hash in self.heights
+
+    def height_of(self, hash: str) -> Optional[int]:
+        """Find the height of a block of the main chain
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            height (int): The block's height, or None if the block is not on
+                          the main chain
+        """
+        return self.heights.get(hash)
+
+    def hash_at(self, height: int) -> str:
+        """The hash of the main chain's block at a height
+
+        Args:
+            height (int): The block's height
+
+        Returns:
+            hash (str): The block's hash
+        """
+        return self.hashes[height]
+
+    def append(self, hash: str, parent: str) -> None:
+        """Append a block to the main chain. If the block was on a side
+        branch, it is no longer a side child of its parent.
+
+        Args:
+            hash (str): The block's hash
+            parent (str): The hash of its parent, i.e. the last block
+        """
+        self.heights[hash] = len(self.hashes)
+        self.hashes.append(hash)
+        self.remove_child(parent, hash)
+
+    def truncate(self, length: int) -> List[str]:
+        """Remove the main chain's blocks from a height on. The removed blocks
+        become a side branch of the block before them.
+
+        Args:
+            length (int): The number of blocks to be kept
+
+        Returns:
+            removed (List[str]): The hashes of the removed blocks, by height
+        """
+        removed = self.hashes[length:]
+        del self.hashes[length:]
+        parent = self.hashes[-1] if self.hashes else None
+        for hash in removed:
+            del self.heights[hash]
+            if parent is not None:
+                self.add_child(parent, hash)
+            parent = hash
+        return removed
+
+    def add_child(self, parent: str, hash: str) -> None:
+        """Record a block of a side branch
+
+        Args:
+            parent (str): The hash of the block's parent
+            hash (str): The block's hash
+        """
+        children = self.children.setdefault(parent, [])
+        if hash not in children:
+            children.append(hash)
+
+    def remove_child(self, parent: str, hash: str) -> None:
+        """Forget a block of a side branch
+
+        Args:
+            parent (str): The hash of the block's parent
+            hash (str): The block's hash
+        """
+        children = self.children.get(parent)
+        if children is None or hash not in children:
+            return
+        children.remove(hash)
+        if not children:
+            del self.children[parent]
+
+    def children_of(self, hash: str) -> List[str]:
+        """The children of a block: the next block of the main chain, if the
+        block is on it, followed by the children on side branches
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            children (List[str]): The children's hashes
+        """
+        children = []
+        height = self.heights.get(hash)
+        if height is not None and height + 1 < len(self.hashes):
+            children.append(self.hashes[height + 1])
+        return children + self.children.get(hash, [])
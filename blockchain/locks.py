@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+import threading
+from time import perf_counter
+from typing import Iterator, Optional
+
+from .metrics import REGISTRY
+from .profiler import SPANS
+
+LOCK_WAIT = REGISTRY.histogram("noobcash_lock_wait_seconds",\
+    "Seconds spent waiting to acquire a lock", ("lock",))
+
+
+class RWLock:
+    """RWLock: A reader-writer lock. Any number of readers may hold the lock
+    at the same time, while a writer holds it alone. Waiting writers are
+    preferred over new readers, so that a steady stream of reads cannot keep
+    a block from being appended. The lock is not reentrant: a thread that
+    holds it must not acquire it again.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        """Initialize the RWLock
+
+        Args:
+            name (str): If given, the time spent waiting for the lock is
+                        recorded under the lock wait metric as
+                        `<name>_read` and `<name>_write`. It is recorded
+                        as the "lock_wait" phase of the timed spans either
+                        way.
+        """
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._read_wait = LOCK_WAIT.labels(f"{name}_read") if name else None
+        self._write_wait = LOCK_WAIT.labels(f"{name}_write") if name\
+            else None
+
+    def acquire_read(self) -> None:
+        """Acquire the lock for reading, waiting while a writer holds it or
+        waits for it.
+        """
+        start = perf_counter()
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        waited = perf_counter() - start
+        if self._read_wait is not None:
+            self._read_wait.observe(waited)
+        SPANS.add("lock_wait", waited)
+
+    def release_read(self) -> None:
+        """Release the lock, acquired for reading
+        """
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """Acquire the lock for writing, waiting while it is held.
+        """
+        start = perf_counter()
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        waited = perf_counter() - start
+        if self._write_wait is not None:
+            self._write_wait.observe(waited)
+        SPANS.add("lock_wait", waited)
+
+    def release_write(self) -> None:
+        """Release the lock, acquired for writing
+        """
+        with self._condition:
+            self._writer = False
+            self._condition.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock for reading for the duration of a `with` block
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock for writing for the duration of a `with` block
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class TimedLock:
+    """TimedLock: A mutual exclusion lock, like `threading.Lock`, that
+    records the time spent waiting for it under the lock wait metric and as
+    the "lock_wait" phase of the timed spans.
+    """
+
+    def __init__(self, name: str):
+        """Initialize the TimedLock
+
+        Args:
+            name (str): The lock's label in the lock wait metric
+        """
+        self._lock = threading.Lock()
+        self._wait = LOCK_WAIT.labels(name)
+
+    def acquire(self) -> None:
+        """Acquire the lock, waiting while it is held.
+        """
+        start = perf_counter()
+        self._lock.acquire()
+        waited = perf_counter() - start
+        self._wait.observe(waited)
+        SPANS.add("lock_wait", waited)
+
+    def release(self) -> None:
+        """Release the lock
+        """
+        self._lock.release()
+
+    def __enter__(self) -> "TimedLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
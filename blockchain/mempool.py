@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional
+
+from .transaction import Transaction
+
+
+class Mempool:
+    """Mempool: The transactions that are not in a block yet, in arrival
+    order and deduplicated by transaction id.
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = ()):
+        """Initialize the Mempool
+
+        Args:
+            transactions (Iterable[Transaction]): The initial transactions
+        """
+        self.transactions: "OrderedDict[str, Transaction]" = OrderedDict()
+        for transaction in transactions:
+            self.add(transaction)
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        return iter(list(self.transactions.values()))
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return transaction_id in self.transactions
+
+    def get(self, transaction_id: str) -> Optional[Transaction]:
+        """Find a transaction of the mempool by its id
+
+        Args:
+            transaction_id (str): The transaction's id
+
+        Returns:
+            transaction (Transaction): The transaction, or None if it is not
+                                       in the mempool
+        """
+        return self.transactions.get(transaction_id)
+
+    def add(self, transaction: Transaction) -> bool:
+        """Append a transaction, unless a transaction with the same id is
+        already in the mempool.
+
+        Args:
+            transaction (Transaction): The transaction to be added
+
+        Returns:
+            bool: True if the transaction was added else False
+        """
+        if transaction.transaction_id in self.transactions:
+            return False
+        self.transactions[transaction.transaction_id] = transaction
+        return True
+
+    def take(self, count: int) -> List[Transaction]:
+        """Remove and return the oldest transactions.
+
+        Args:
+            count (int): The maximum number of transactions to take
+
+        Returns:
+            transactions (List[Transaction]): The taken transactions, oldest
+                                              first
+        """
+        taken = []
+        while self.transactions and len(taken) < count:
+            taken.append(self.transactions.popitem(last=False)[1])
+        return taken
+
+    def put_back(self, transactions: List[Transaction]) -> None:
+        """Return previously taken transactions to the front of the mempool,
+        keeping their order.
+
+        Args:
+            transactions (List[Transaction]): The transactions to put back
+        """
+        for transaction in reversed(transactions):
+            self.transactions[transaction.transaction_id] = transaction
+            self.transactions.move_to_end(transaction.transaction_id,\
+                last=False)
+
+    def remove(self, transaction_ids: Iterable[str]) -> int:
+        """Remove the transactions with the given ids, if present.
+
+        Args:
+            transaction_ids (Iterable[str]): The ids of the transactions
+
+        Returns:
+            count (int): The number of removed transactions
+        """
+        count = 0
+        for transaction_id in transaction_ids:
+            if self.transactions.pop(transaction_id, None) is not None:
+                count += 1
+        return count
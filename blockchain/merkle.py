@@ -0,0 +1,91 @@
+import hashlib
+from typing import List
+
+
+class MerkleTree:
+    """MerkleTree: Binary hash tree over a list of leaf digests. Each level
+    hashes the concatenation of pairs of nodes, and the last node of a level
+    with an odd number of nodes is paired with itself.
+    """
+
+    def __init__(self, leaves: List[bytes]):
+        """Build the MerkleTree
+
+        Args:
+            leaves (List[bytes]): The SHA-256 digests of the leaves
+        """
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            if len(level) % 2 == 1:
+                level = level + [level[-1]]
+            self.levels.append([hashlib.sha256(level[i] + level[i+1])\
+                .digest() for i in range(0, len(level), 2)])
+
+    @property
+    def root(self) -> bytes:
+        """The Merkle root, or the digest of the empty string if there are no
+        leaves
+        """
+        if not self.levels[0]:
+            return hashlib.sha256(b"").digest()
+        return self.levels[-1][0]
+
+    def proof(self, index: int) -> List[dict]:
+        """Inclusion proof of a leaf: the sibling of each node on the path
+        from the leaf to the root, along with the side of the sibling.
+
+        Args:
+            index (int): The index of the leaf
+
+        Returns:
+            proof (List[dict]): The path from the leaf to the root, as a list
+                of {"hash": <sibling's hash in hex>,
+                    "position": <"left" or "right">}
+        """
+        proof = []
+        for level in self.levels[:-1]:
+            if index % 2 == 0:
+                sibling = level[index+1] if index+1 < len(level)\
+                    else level[index]
+                proof.append({"hash": sibling.hex(), "position": "right"})
+            else:
+                proof.append({"hash": level[index-1].hex(),\
+                    "position": "left"})
+            index //= 2
+        return proof
+
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """Compute the Merkle root of a list of leaf digests
+
+    Args:
+        leaves (List[bytes]): The SHA-256 digests of the leaves
+
+    Returns:
+        root (bytes): The Merkle root
+    """
+    return MerkleTree(leaves).root
+
+
+def verify_proof(leaf: bytes, proof: List[dict], root: bytes) -> bool:
+    """Check a leaf's inclusion proof against a Merkle root, without having
+    the rest of the leaves.
+
+    Args:
+        leaf (bytes): The leaf's digest
+        proof (List[dict]): The inclusion proof, as returned by
+                            `MerkleTree.proof`
+        root (bytes): The expected Merkle root
+
+    Returns:
+        bool: True if the proof leads to the root else False
+    """
+    node = leaf
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            node = hashlib.sha256(sibling + node).digest()
+        else:
+            node = hashlib.sha256(node + sibling).digest()
+    return node == root
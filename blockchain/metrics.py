@@ -0,0 +1,313 @@
+"""Counters, gauges and histograms of a node, exposed in the Prometheus text
+format by the /metrics endpoint.
+
+The metrics are meant to be left on in production, so recording a value
+costs a lock acquisition and an addition: a histogram keeps cumulative
+bucket counts, found by bisection, and no samples. Gauges that mirror the
+node's state (e.g. the depth of the mempool) are computed by a function when
+the metrics are collected, so they cost nothing in between. The metrics of
+the blockchain package are defined next to the code they measure and
+registered to `REGISTRY`.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+import math
+import threading
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# The content type of the Prometheus text format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the buckets of latency histograms
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1,\
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value: float) -> str:
+    """Format a sample value the way the Prometheus text format expects it
+    """
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    """Format the labels of a sample, e.g. `{peer="127.0.0.1:5001"}`
+    """
+    if not names:
+        return ""
+    return "{" + ",".join(f'{x}="{escape(y)}"'\
+        for x, y in zip(names, values)) + "}"
+
+
+def escape(value: str) -> str:
+    """Escape a label value
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n")\
+        .replace('"', '\\"')
+
+
+class Metric:
+    """Metric: Base class of the metrics. A metric with label names holds a
+    child per combination of label values, created by `labels` on first use.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str,\
+            labelnames: Tuple[str, ...] = ()):
+        """Initialize the Metric
+
+        Args:
+            name (str): The metric's name, e.g. "noobcash_blocks_total"
+            documentation (str): The metric's description
+            labelnames (Tuple[str, ...]): The names of the metric's labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children: Dict[Tuple[str, ...], "Metric"] = {}
+
+    def labels(self, *values: str) -> "Metric":
+        """Get the child of the given label values, creating it if needed
+
+        Args:
+            values (str): The label values, in the order of the label names
+
+        Returns:
+            metric (Metric): The child, recorded like a metric without labels
+        """
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.__class__.__new__(self.__class__)
+                    child.init_child(self)
+                    self.children[values] = child
+        return child
+
+    def init_child(self, parent: "Metric") -> None:
+        """Initialize a child created by `labels`
+        """
+        self.lock = threading.Lock()
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """The metric's samples
+
+        Returns:
+            samples (Iterator[Tuple[str, str, float]]): The name suffix, the
+                formatted labels and the value of each sample
+        """
+        if not self.labelnames:
+            yield from self.child_samples("")
+            return
+        for values, child in sorted(self.children.items()):
+            yield from child.child_samples(format_labels(self.labelnames,\
+                values))
+
+    def child_samples(self, labels: str) -> Iterator[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Format the metric in the Prometheus text format
+
+        Returns:
+            lines (List[str]): The lines of the metric
+        """
+        lines = [f"# HELP {self.name} {self.documentation}",\
+            f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} "\
+                f"{format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Counter: A value that only increases, e.g. the number of validated
+    transactions.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str,\
+            labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def init_child(self, parent: Metric) -> None:
+        super().init_child(parent)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increase the counter
+
+        Args:
+            amount (float): The increase, which must not be negative
+        """
+        with self.lock:
+            self.value += amount
+
+    def child_samples(self, labels: str) -> Iterator[Tuple[str, str, float]]:
+        yield "", labels, self.value
+
+
+class Gauge(Metric):
+    """Gauge: A value computed by a function when the metrics are collected,
+    e.g. the depth of the mempool.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str,\
+            function: Optional[Callable[[], float]] = None):
+        """Initialize the Gauge
+
+        Args:
+            name (str): The metric's name
+            documentation (str): The metric's description
+            function (Callable[[], float]): Computes the gauge's value. It
+                                            can be set later, see
+                                            `set_function`.
+        """
+        super().__init__(name, documentation)
+        self.function = function
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Set the function that computes the gauge's value
+        """
+        self.function = function
+
+    def child_samples(self, labels: str) -> Iterator[Tuple[str, str, float]]:
+        if self.function is not None:
+            yield "", labels, self.function()
+
+
+class Histogram(Metric):
+    """Histogram: The distribution of observed values, e.g. latencies, in
+    cumulative buckets, along with their count and sum.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str,\
+            labelnames: Tuple[str, ...] = (),\
+            buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Initialize the Histogram
+
+        Args:
+            name (str): The metric's name
+            documentation (str): The metric's description
+            labelnames (Tuple[str, ...]): The names of the metric's labels
+            buckets (Tuple[float, ...]): The upper bounds of the buckets, in
+                                         increasing order
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def init_child(self, parent: Metric) -> None:
+        super().init_child(parent)
+        self.buckets = parent.buckets
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value
+
+        Args:
+            value (float): The observed value
+        """
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the seconds spent in a `with` block
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def child_samples(self, labels: str) -> Iterator[Tuple[str, str, float]]:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        # the `le` label goes after the metric's labels
+        prefix = labels[:-1] + "," if labels else "{"
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield "_bucket", f'{prefix}le="{format_value(bound)}"}}',\
+                cumulative
+        yield "_count", labels, cumulative
+        yield "_sum", labels, total
+
+
+class Registry:
+    """Registry: The metrics exposed by the /metrics endpoint.
+    """
+
+    def __init__(self):
+        """Initialize the Registry
+        """
+        self.metrics: Dict[str, Metric] = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, unless a metric with the same name exists
+
+        Args:
+            metric (Metric): The metric
+
+        Returns:
+            metric (Metric): The registered metric of that name
+        """
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str,\
+            labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Create and register a Counter, see `Counter`
+        """
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str,\
+            function: Optional[Callable[[], float]] = None) -> Gauge:
+        """Create and register a Gauge, see `Gauge`
+        """
+        return self.register(Gauge(name, documentation, function))
+
+    def histogram(self, name: str, documentation: str,\
+            labelnames: Tuple[str, ...] = (),\
+            buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Create and register a Histogram, see `Histogram`
+        """
+        return self.register(Histogram(name, documentation, labelnames,\
+            buckets))
+
+    def render(self) -> str:
+        """Format every metric in the Prometheus text format
+
+        Returns:
+            text (str): The metrics
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda x: x.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# The registry of the node's metrics
+REGISTRY = Registry()
@@ -0,0 +1,215 @@
+from abc import ABC, abstractmethod
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Optional, Tuple
+
+from .block import Block, nonce_bytes
+
+# Number of nonces a mining process tries between two checks of the stop flag
+CHECK_INTERVAL = 1000
+
+# Seconds between two checks of the cancel event while waiting for the
+# processes of a ParallelMiner
+CANCEL_POLL_INTERVAL = 0.01
+
+# Stop flag shared by the processes of a ParallelMiner pool. It is set by the
+# pool initializer, since synchronization primitives can only be passed to
+# worker processes when they are created.
+_stop_event = None
+
+
+def valid_hash(hash: str, difficulty: int) -> bool:
+    """Check whether a block hash satisfies the proof-of-work difficulty
+
+    Args:
+        hash (str): The block hash
+        difficulty (int): The number of leading zeros required
+
+    Returns:
+        bool: True if the hash starts with `difficulty` zeros else False
+    """
+    return hash[:difficulty] == "0" * difficulty
+
+
+def search_nonces(header_prefix: bytes, start: int, step: int,\
+        difficulty: int, stop_event=None) -> Tuple[Optional[int], int]:
+    """Search the nonces start, start+step, start+2*step, ... until one that
+    satisfies the difficulty is found. The SHA-256 state of the header prefix
+    is computed once and copied for every attempt, so each attempt only
+    hashes the nonce's bytes.
+
+    Args:
+        header_prefix (bytes): The block's header prefix, as returned by
+                               `Block.header_prefix`
+        start (int): The first nonce to try
+        step (int): The distance between two consecutive tried nonces
+        difficulty (int): The number of leading zeros required
+        stop_event (Event): If given, it is checked every CHECK_INTERVAL
+                            attempts and the search stops when it is set
+
+    Returns:
+        nonce, attempts (int, int): The found nonce, or None if the search
+                                    was stopped, and the number of hashed
+                                    nonces
+    """
+    prefix_state = hashlib.sha256(header_prefix)
+    zeros = "0" * difficulty
+    nonce = start
+    attempts = 0
+    while True:
+        state = prefix_state.copy()
+        state.update(nonce_bytes(nonce))
+        attempts += 1
+        if state.hexdigest().startswith(zeros):
+            return nonce, attempts
+        nonce += step
+        if (stop_event is not None and attempts % CHECK_INTERVAL == 0
+                and stop_event.is_set()):
+            return None, attempts
+
+
+def _init_worker(stop_event) -> None:
+    """Initializer of the ParallelMiner worker processes
+
+    Args:
+        stop_event (multiprocessing.Event): The pool's stop flag
+    """
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _search(header_prefix: bytes, start: int, step: int,\
+        difficulty: int) -> Tuple[Optional[int], int]:
+    """Nonce search executed by the ParallelMiner worker processes. Stops
+    when the pool's stop flag is set.
+    """
+    return search_nonces(header_prefix, start, step, difficulty,\
+        _stop_event)
+
+
+class Miner(ABC):
+    """Miner: Base class of the proof-of-work engines used by
+    `Node.mine_block`. After each call to `mine`, `attempts` holds the
+    number of nonces it hashed, whether a nonce was found or not.
+    """
+
+    attempts = 0
+
+    @abstractmethod
+    def mine(self, block: Block, difficulty: int,\
+            cancel_event: Optional[threading.Event] = None) -> Optional[int]:
+        """Find a nonce for the given block, starting from the block's
+        current nonce. The block itself is not modified.
+
+        Args:
+            block (Block): The block to be mined
+            difficulty (int): The number of leading zeros required
+            cancel_event (threading.Event): If given, mining stops as soon as
+                                            the event is set
+
+        Returns:
+            nonce (int): The found nonce, or None if mining was cancelled
+        """
+
+    def shutdown(self) -> None:
+        """Release any resources held by the miner.
+        """
+        pass
+
+
+class SerialMiner(Miner):
+    """SerialMiner: Tries one nonce at a time in the calling thread.
+    """
+
+    def mine(self, block: Block, difficulty: int,\
+            cancel_event: Optional[threading.Event] = None) -> Optional[int]:
+        nonce, self.attempts = search_nonces(block.header_prefix(),\
+            block.nonce, 1, difficulty, cancel_event)
+        return nonce
+
+
+class ParallelMiner(Miner):
+    """ParallelMiner: Splits the nonce space across a pool of processes.
+    Process i of n tries the nonces start+i, start+i+n, start+i+2n, ... The
+    first nonce found is returned and the rest of the processes are stopped.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        """Initialize the ParallelMiner. The process pool is created on the
+        first call to `mine`.
+
+        Args:
+            processes (int): The number of mining processes. Defaults to the
+                             number of available cores.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        # spawn instead of fork, since the miner lives in a multi-threaded
+        # Flask process
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        self._executor = None
+        # the stop flag is shared, so only one block can be mined at a time
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool, if it does not exist yet.
+
+        Returns:
+            executor (ProcessPoolExecutor): The miner's process pool
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self._stop_event,))
+        return self._executor
+
+    def mine(self, block: Block, difficulty: int,\
+            cancel_event: Optional[threading.Event] = None) -> Optional[int]:
+        header_prefix = block.header_prefix()
+        with self._lock:
+            executor = self._get_executor()
+            self._stop_event.clear()
+            futures = [executor.submit(_search, header_prefix,\
+                block.nonce + i, self.processes, difficulty)\
+                for i in range(self.processes)]
+            pending = set(futures)
+            nonce = None
+            while nonce is None and pending:
+                done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL,\
+                    return_when=FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                for future in done:
+                    if future.result()[0] is not None:
+                        nonce = future.result()[0]
+                        break
+            self._stop_event.set()
+            wait(pending)
+            self.attempts = sum(x.result()[1] for x in futures)
+        return nonce
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def create_miner(processes: int) -> Miner:
+    """Create the mining engine for the given number of processes.
+
+    Args:
+        processes (int): The number of mining processes, or 0 to use all of
+                         the available cores
+
+    Returns:
+        miner (Miner): A SerialMiner if a single process is requested, else
+                       a ParallelMiner
+    """
+    if processes == 1 or (processes == 0 and os.cpu_count() == 1):
+        return SerialMiner()
+    return ParallelMiner(processes or None)
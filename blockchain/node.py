@@ -1,31 +1,53 @@
 import threading
-from time import time
-from typing import List
+from time import perf_counter, time
+from typing import Callable, Dict, List, Optional, Tuple
 
 from .block import Block
-from .blockchain import Blockchain
+from .blockchain import Blockchain, ChainSnapshot
+from .locks import RWLock, TimedLock
+from .metrics import REGISTRY
+from .miner import Miner, SerialMiner
+from .profiler import SPANS
 from .wallet import Wallet
-from .transaction import Transaction, TransactionOutput
+from .transaction import Transaction
+from .serialization import intern_text
+from .store import BlockStore
+from .utxo import UTXOSet
+from .validation import ChainValidator
+from .verification import SignatureVerifier
+
+TRANSACTIONS_CREATED = REGISTRY.counter(\
+    "noobcash_transactions_created_total", "Transactions created by the node")
+TRANSACTIONS_VALIDATED = REGISTRY.counter(\
+    "noobcash_transactions_validated_total",\
+    "Received transactions that were validated")
+TRANSACTIONS_REJECTED = REGISTRY.counter(\
+    "noobcash_transactions_rejected_total",\
+    "Received transactions that were rejected")
+VALIDATE_SECONDS = REGISTRY.histogram(\
+    "noobcash_validate_transactions_seconds",\
+    "Seconds spent validating a batch of received transactions")
+FORK_RESOLUTIONS = REGISTRY.counter("noobcash_fork_resolutions_total",\
+    "Attempts to switch to a peer's longer branch, by result", ("result",))
 
 
 class RingNode:
     """RingNode: A node class for ring list items.
     """
-    def __init__(self, index: int, address: str, public_key: str,\
-        utxos: List[TransactionOutput]):
+
+    __slots__ = ("index", "address", "public_key")
+
+    def __init__(self, index: int, address: str, public_key: str):
         """Initialize the RingNode
 
         Args:
             index (int): Ring node's index
             address (int): Ring node's address
             public_key (int): Ring node's public_key
-            utxos (List[TransactionOutput]): Ring node's list of unspent
-                                             transactions
         """
         self.index = index
-        self.address = address
-        self.public_key = public_key
-        self.utxos = [x for x in utxos]
+        self.address = intern_text(address)
+        self.public_key = intern_text(public_key)
 
     def to_dict(self) -> dict:
         """Convert object to dict
@@ -39,45 +61,231 @@ class RingNode:
         return {
             "index": self.index,
             "address": self.address,
-            "public_key": self.public_key,
-            "utxos": [x.to_dict() for x in self.utxos]
+            "public_key": self.public_key
         }
 
-    def parser(self, dictionary: dict) -> None:
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "RingNode":
         """Convert dictionary to object
 
         Args:
             dictionary (dict): The dictionary to be parsed
-        """
-        utxos = []
-        for x in dictionary["utxos"]:
-            utxo = TransactionOutput(0, "", 0)
-            utxo.parser(x)
-            utxos.append(utxo)
 
-        self.index = dictionary["index"]
-        self.address = dictionary["address"]
-        self.public_key = dictionary["public_key"]
-        self.utxos = utxos
+        Returns:
+            ring_node (RingNode): The parsed object
+        """
+        return cls(dictionary["index"], dictionary["address"],\
+            dictionary["public_key"])
 
 class Node:
     """Node: Node that contains node's information and a list (ring) of the
     rest of the nodes.
+
+    Concurrency model: the node's state is guarded by three locks, always
+    acquired in this order, each one optionally:
+    - `chain_lock`, a reader-writer lock that guards the blockchain's blocks
+      and indexes. Appending a block or switching branch holds it for
+      writing, and reads (e.g. of a transaction or of a snapshot of the
+      blockchain) hold it for reading. Transactions are created and
+      validated, and blocks are mined, without it.
+    - `mempool_lock`, which guards the mempool, the number of transactions
+      and the block producer's state, e.g. the block being mined. Blocks are
+      also appended with it held, so that a transaction is never both in
+      the mempool and in the blockchain, or in neither. The block producer
+      waits on it, through `producer_condition`, for the mempool to fill up.
+    - `utxo_lock`, which guards the UTXO set. A transaction is applied to
+      the UTXO set and added to the mempool under both locks, so every
+      applied transaction is in the mempool, the block being mined or the
+      blockchain.
     """
-    def __init__(self, index: int, capacity: int, difficulty: int):
+    def __init__(self, index: int, capacity: int, difficulty: int,\
+            miner: Optional[Miner] = None,\
+            chain_lock: Optional[RWLock] = None,\
+            verifier: Optional[SignatureVerifier] = None,\
+            wallet: Optional[Wallet] = None):
         """Initialize the Node
 
         Args:
             index (int): Node's index
             capacity (int): Node's blockchain capacity
             difficulty (int): Node's blockchain difficulty
+            miner (Miner): The mining engine used to mine new blocks.
+                           Defaults to a SerialMiner.
+            chain_lock (RWLock): The lock that guards the blockchain. The
+                                 block producer acquires it for writing to
+                                 append a mined block. Defaults to a new
+                                 lock.
+            verifier (SignatureVerifier): Verifies the transactions'
+                                          signatures. Defaults to a verifier
+                                          that uses every core.
+            wallet (Wallet): Node's wallet, which is given if the node is
+                             restored. Defaults to a new wallet.
         """
         self.blockchain = Blockchain(capacity, difficulty)
         self.index = index
-        self.wallet = self.create_wallet()
+        self.wallet = wallet if wallet is not None else self.create_wallet()
         self.ring = []
+        # Indexes of the ring nodes by address and by public key
+        self.ring_by_address: Dict[str, RingNode] = {}
+        self.ring_by_public_key: Dict[str, RingNode] = {}
+        # The unspent transaction outputs of every node of the ring
+        self.utxos = UTXOSet()
         self.mining_times = []
-        self.transaction_lock = threading.Lock()
+        # the number of nonces hashed for each mined block, and the nonces
+        # hashed and the seconds spent mining overall, cancelled blocks
+        # included
+        self.mining_attempts = []
+        self.hashes = 0
+        self.hashing_time = 0.0
+        self.miner = miner if miner is not None else SerialMiner()
+        self.verifier = verifier if verifier is not None\
+            else SignatureVerifier()
+        self.validator = ChainValidator(difficulty, capacity, self.verifier)
+        self.chain_lock = chain_lock if chain_lock is not None else RWLock()
+        self.mempool_lock = threading.RLock()
+        self.utxo_lock = TimedLock("utxo")
+        # The block producer waits on this condition until the mempool is
+        # full. The block being mined and the event that cancels its mining.
+        self.producer_condition = threading.Condition(self.mempool_lock)
+        self.mining_block = None
+        self.mining_cancel = threading.Event()
+        # The number of longer branches being downloaded, during which no
+        # block is produced
+        self.syncing = 0
+        # Called with each block mined by this node, after it is appended
+        # to the blockchain
+        self.on_block_mined: Optional[Callable[[Block], None]] = None
+
+    @classmethod
+    def restore(cls, store: BlockStore, miner: Optional[Miner] = None,\
+            chain_lock: Optional[RWLock] = None,\
+            verifier: Optional[SignatureVerifier] = None) -> "Node":
+        """Restore a node from its store, after a restart: the blockchain
+        is opened from the store, and the UTXO set, the transaction index and
+        the mempool are loaded from the latest snapshot, after which only the
+        transactions of the following blocks are applied and indexed. The
+        transactions received after the snapshot that were still pending are
+        lost, but so are their effects on the UTXO set.
+
+        Args:
+            store (BlockStore): The store the node was attached to, see
+                                `Node.attach_store`
+            miner (Miner): See `Node.__init__`
+            chain_lock (RWLock): See `Node.__init__`
+            verifier (SignatureVerifier): See `Node.__init__`
+
+        Returns:
+            node (Node): The restored node
+        """
+        state = store.load_state()
+        snapshot = store.load_snapshot()
+        if state is None or snapshot is None:
+            raise ValueError(f"No node is stored in {store.path}")
+        node = cls(state["index"], state["capacity"], state["difficulty"],\
+            miner, chain_lock, verifier,\
+            Wallet(state["public_key"], state["private_key"]))
+        node.set_ring([RingNode.from_dict(x) for x in state["ring"]])
+        height, node.utxos, transaction_index, pending = snapshot
+        node.blockchain = Blockchain.from_store(store, state["capacity"],\
+            state["difficulty"], transaction_index, height)
+        # the snapshot also includes the transactions that were pending, so
+        # some of the following transactions may already be applied
+        for i in range(height + 1, len(store)):
+            for transaction in store.get(i).list_of_transactions:
+                node.utxos.apply_transaction(transaction)
+        # the pending transactions that are not in the blockchain yet go
+        # back to the mempool, since their effects are in the UTXO set
+        with node.producer_condition:
+            for transaction in pending:
+                node.add_transaction(transaction)
+        return node
+
+    def attach_store(self, store: BlockStore) -> None:
+        """Persist the node to a store, so that it can be restored after a
+        restart. The blockchain is written to the store, along with the
+        node's state and a snapshot of the UTXO set.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired.
+
+        Args:
+            store (BlockStore): The store
+        """
+        self.blockchain.attach_store(store)
+        self.save_state()
+        self.save_snapshot()
+
+    def save_state(self) -> None:
+        """Save the node's index, keys, ring and blockchain parameters to
+        its store, if the node is persisted
+        """
+        store = self.blockchain.store
+        if store is None:
+            return
+        store.save_state({
+            "index": self.index,
+            "public_key": self.wallet.public_key,
+            "private_key": self.wallet.private_key,
+            "ring": [x.to_dict() for x in self.ring],
+            "capacity": self.blockchain.capacity,
+            "difficulty": self.blockchain.difficulty
+        })
+
+    def save_snapshot(self) -> None:
+        """Save a snapshot of the UTXO set, of the transaction index and of
+        the pending transactions to the node's store, if the node is
+        persisted. The UTXO set includes the effects of the transactions of
+        the mempool and of the block being mined, so they are saved along
+        with it.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired.
+        """
+        store = self.blockchain.store
+        if store is None:
+            return
+        with self.mempool_lock, self.utxo_lock:
+            pending = list(self.blockchain.transactions)
+            if self.mining_block is not None:
+                pending[:0] = self.mining_block.list_of_transactions
+            store.save_snapshot(self.blockchain.last_block.index, self.utxos,\
+                self.blockchain.transaction_index, pending)
+
+    def snapshot(self) -> ChainSnapshot:
+        """Take an immutable snapshot of the blockchain and the mempool, see
+        `Blockchain.snapshot`. The transactions of the block being mined are
+        pending as well, so they are given at the front of the mempool.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired, at least for reading.
+
+        Returns:
+            snapshot (ChainSnapshot): The snapshot
+        """
+        with self.mempool_lock:
+            snapshot = self.blockchain.snapshot()
+            if self.mining_block is not None:
+                snapshot.transactions[:0] =\
+                    self.mining_block.list_of_transactions
+            return snapshot
+
+    def add_block(self, block: Block) -> None:
+        """Append a block to the blockchain, and save a snapshot of the UTXO
+        set every `snapshot_interval` blocks if the node is persisted.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired.
+
+        Args:
+            block (Block): The block, which extends the last block
+        """
+        self.blockchain.add_new_block(block)
+        self.snapshot_if_due()
+
+    def snapshot_if_due(self) -> None:
+        """Save a snapshot of the UTXO set if `snapshot_interval` blocks
+        were appended since the last one.
+        """
+        store = self.blockchain.store
+        if store is not None and self.blockchain.last_block.index -\
+                store.snapshot_height >= store.snapshot_interval:
+            self.save_snapshot()
 
     def set_ring(self, ring_nodes: List[RingNode]):
         """Set node's ring of node.
@@ -87,6 +295,8 @@ class Node:
                                          to the ring
         """
         self.ring = [x for x in ring_nodes]
+        self.ring_by_address = {x.address: x for x in self.ring}
+        self.ring_by_public_key = {x.public_key: x for x in self.ring}
 
     def create_wallet(self):
         """Create node's wallet.
@@ -100,6 +310,8 @@ class Node:
             node_ring (RingNode): The node to be added to the ring
         """
         self.ring.append(node_ring)
+        self.ring_by_address[node_ring.address] = node_ring
+        self.ring_by_public_key[node_ring.public_key] = node_ring
 
     def create_transaction(self, receiver: str, amount: int) -> Transaction:
         """Create a new transaction made by the node.
@@ -112,34 +324,54 @@ class Node:
             transaction (Transaction): The created transaction or None if
                                        transaction could not be made.
         """
-        self.transaction_lock.acquire()
-        sum = 0
-        i = 0
-        transaction_inputs = []
-        utxos = self.ring[self.index].utxos
-        while i < len(utxos):
-            sum += utxos[i].amount
-            transaction_inputs.append(utxos[i])
-            if sum >= amount:
-                break
-            i += 1
-
-        if sum < amount:
-            print("Not enough coins to make transaction")
-            self.transaction_lock.release()
-            return None
-        self.ring[self.index].utxos = self.ring[self.index].utxos[i+1:]
-        self.wallet.unspent_transactions = self.ring[self.index].utxos
-        transaction = Transaction(self.ring[self.index].address,\
-            self.wallet.public_key, receiver, amount,\
-            transaction_inputs)
-        transaction.sign_transaction(self.wallet.private_key)
-        transaction_outputs = transaction.transaction_outputs
-        self.find_node_from_address(receiver).utxos.\
-            append(transaction_outputs[0])
-        self.ring[self.index].utxos.append(transaction_outputs[1])
-        self.transaction_lock.release()
-        return transaction
+        return self.create_transactions([(receiver, amount)])[0]
+
+    def create_transactions(self, transfers: List[Tuple[str, int]])\
+            -> List[Optional[Transaction]]:
+        """Create and sign a batch of transactions made by the node, under a
+        single acquisition of the UTXO lock, and add them to the mempool.
+
+        Args:
+            transfers (List[Tuple[str, int]]): The (receiver address, amount)
+                                               of each transaction
+
+        Returns:
+            transactions (List[Transaction]): The created transactions, with
+                None for each transaction that could not be made.
+        """
+        transactions = []
+        address = self.ring[self.index].address
+        with self.producer_condition, self.utxo_lock:
+            for receiver, amount in transfers:
+                if self.find_node_from_address(receiver) is None:
+                    print("Receiver is not a node of the ring")
+                    transactions.append(None)
+                    continue
+                transaction_inputs = self.utxos.select_inputs(address,\
+                    amount)
+                if amount <= 0 or transaction_inputs is None:
+                    print("Not enough coins to make transaction")
+                    transactions.append(None)
+                    continue
+                transaction = Transaction(address, self.wallet.public_key,\
+                    receiver, amount, transaction_inputs)
+                transaction.sign_transaction(self.wallet.private_key)
+                if not self.utxos.apply_transaction(transaction):
+                    print("Transaction could not be applied")
+                    transactions.append(None)
+                    continue
+                self.add_transaction(transaction)
+                transactions.append(transaction)
+                TRANSACTIONS_CREATED.inc()
+        return transactions
+
+    def wallet_balance(self) -> int:
+        """Compute the balance of the node's wallet.
+
+        Returns:
+            balance (int): The sum of the node's unspent transaction outputs
+        """
+        return self.utxos.balance(self.ring[self.index].address)
     
     def find_node_from_address(self, address: str) -> RingNode:
         """Find a ring node given its address.
@@ -150,16 +382,32 @@ class Node:
         Returns:
             node (RingNode): The found ring node.
         """
-        for node in self.ring:
-            if node.address == address:
-                return node
-        return None
+        return self.ring_by_address.get(address)
+
+    def find_node_from_public_key(self, public_key: str) -> RingNode:
+        """Find a ring node given its public key.
+
+        Args:
+            public_key (str): The public key of the node to be found
+
+        Returns:
+            node (RingNode): The found ring node.
+        """
+        return self.ring_by_public_key.get(public_key)
 
     def validate_transaction(self, transaction: Transaction) -> bool:
         """Validate transaction by:
-        1. Verifying signature
-        2. Enough coins to make transaction
-        Also update sender's and receiver's utxos.
+        1. Checking that the sender and the receiver are nodes of the ring,
+           that the sender's public key is the registered one, and that the
+           ids of the transaction and its outputs are the hashes of their
+           contents (see `Transaction.validate_ids`)
+        2. Verifying signature
+        3. Checking that its inputs are unspent outputs of the sender that
+           cover the amount
+        Also spend its inputs and insert its outputs to the UTXO set, and add
+        it to the mempool. A transaction the node already has (see
+        `knows_transaction`), e.g. because the block that contains it arrived
+        first, is valid and left as is.
 
         Args:
             transaction (Transaction): transaction to be validated
@@ -167,132 +415,397 @@ class Node:
         Returns:
             bool: True if validated else false
         """
-        self.transaction_lock.acquire()
-        if not transaction.verify_transaction():
-            self.transaction_lock.release()
-            return False
-        
-        sender_node = self.find_node_from_address(transaction.sender_address)
-        
-        if sum([x.amount for x in sender_node.utxos]) < transaction.amount:
-            self.transaction_lock.release()
-            return False
-        
-        transaction_inputs_ids = set([x.id for x in\
-            transaction.transaction_inputs])
-
-        sender = self.find_node_from_address(transaction.sender_address).index
-        spent_transactions = []
+        return self.validate_transactions([transaction])[0]
+
+    def validate_transactions(self, transactions: List[Transaction])\
+            -> List[bool]:
+        """Validate a batch of transactions, in order, as described in
+        `validate_transaction`. The signatures are verified as a batch by the
+        node's verifier before the UTXO lock is acquired, and the lock is
+        acquired once for the whole batch, along with the mempool lock. The
+        blockchain lock is not needed, since blocks are appended with the
+        mempool lock held, so transactions are validated while a block is
+        mined.
 
-        for i in range(len(self.ring[sender].utxos)):
-            if (self.ring[sender].utxos[i].transaction_id in
-                    transaction_inputs_ids):
-                spent_transactions.remove(self.ring[sender].utxos[i])
+        Args:
+            transactions (List[Transaction]): transactions to be validated
 
-        for i in range(len(spent_transactions)):
-            self.ring[sender].utxos.remove(spent_transactions[i])
+        Returns:
+            validated (List[bool]): For each transaction, True if validated
+                                    else False
+        """
+        start = perf_counter()
+        known = []
+        for transaction in transactions:
+            sender = self.find_node_from_public_key(\
+                transaction.sender_public_key)
+            known.append(sender is not None and
+                sender.address == transaction.sender_address and
+                self.find_node_from_address(transaction.receiver_address)
+                    is not None and
+                transaction.validate_ids())
+
+        signed = self.verifier.verify_many([transaction for x, transaction\
+            in zip(known, transactions) if x])
+        signed.reverse()
+        verified = [x and signed.pop() for x in known]
+
+        # every transaction applied to the UTXO set is in the mempool, the
+        # block being mined or the blockchain, see `ChainValidator.replay`
+        validated = []
+        with self.producer_condition, self.utxo_lock:
+            for valid, transaction in zip(verified, transactions):
+                if valid and not self.knows_transaction(\
+                        transaction.transaction_id):
+                    valid = self.utxos.apply_transaction(transaction)
+                    if valid:
+                        self.add_transaction(transaction)
+                validated.append(valid)
+        accepted = sum(validated)
+        TRANSACTIONS_VALIDATED.inc(accepted)
+        TRANSACTIONS_REJECTED.inc(len(validated) - accepted)
+        VALIDATE_SECONDS.observe(perf_counter() - start)
+        return validated
+
+    def knows_transaction(self, transaction_id: str) -> bool:
+        """Check if a transaction is in the blockchain, in the mempool or in
+        the block being mined.
 
-        self.find_node_from_address(transaction.receiver_address)\
-            .utxos.append(transaction.transaction_outputs[0])
-        self.find_node_from_address(transaction.sender_address)\
-            .utxos.append(transaction.transaction_outputs[1])
+        Args:
+            transaction_id (str): The transaction's id
 
-        if (self.find_node_from_address(transaction.sender_address).index
-                == self.index):
-            self.wallet.unspent_transactions = self.ring[self.index].utxos
+        Returns:
+            bool: True if the node has the transaction else False
+        """
+        with self.mempool_lock:
+            return transaction_id in self.blockchain.transaction_index or\
+                transaction_id in self.blockchain.transactions or\
+                self.mining_block is not None and any(\
+                    x.transaction_id == transaction_id\
+                    for x in self.mining_block.list_of_transactions)
 
-        self.transaction_lock.release()
-        return True
+    def pending_transactions(self) -> int:
+        """Count the transactions that are not in the blockchain yet: the
+        ones of the mempool and of the block being mined.
 
-    def add_transaction(self, transaction: Transaction) -> int:
-        """Add transaction to blockchain transactions. If it has reached the
-        blockchain capacity create new block and mine it.
+        Returns:
+            count (int): The number of pending transactions
+        """
+        with self.mempool_lock:
+            count = len(self.blockchain.transactions)
+            if self.mining_block is not None:
+                count += len(self.mining_block.list_of_transactions)
+            return count
+
+    def add_transaction(self, transaction: Transaction) -> None:
+        """Add transaction to the mempool, unless the node already has it
+        (see `knows_transaction`), and wake up the block producer.
         IMPORTANT NOTE: This part is considered a critical section... Before
-        calling this function, lock should be acquired.
+        calling this function, the UTXO lock should be acquired and the
+        transaction applied to the UTXO set.
 
         Args:
             transaction (Transaction): Transaction to be added
+        """
+        with self.producer_condition:
+            if not self.knows_transaction(transaction.transaction_id):
+                self.blockchain.transactions.add(transaction)
+                self.blockchain.number_of_transactions += 1
+            self.producer_condition.notify()
+
+    def start_producer(self) -> None:
+        """Start the block producer: a background thread that, whenever the
+        mempool holds `capacity` transactions, creates a block with them,
+        mines it, appends it to the blockchain and hands it to
+        `on_block_mined`.
+        """
+        threading.Thread(target=self.produce_blocks, name="block-producer",\
+            daemon=True).start()
+
+    def wake_producer(self) -> None:
+        """Notify the block producer that the mempool or the blockchain has
+        changed.
+        """
+        with self.producer_condition:
+            self.producer_condition.notify()
+
+    def can_produce_block(self) -> bool:
+        """Check whether the block producer should start a new block.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, the mempool lock should be acquired.
 
         Returns:
-            nonce (int): -1 if added block successfully, or nonce > 0 if new
-                         block created and mined.
+            bool: True if no block is being mined nor a longer branch is
+                  being downloaded, and the mempool holds at least
+                  `capacity` transactions
         """
-        if len(self.blockchain.transactions) < self.blockchain.capacity:
-            self.blockchain.number_of_transactions += 1
-            self.blockchain.transactions.append(transaction)
-            return -1
+        return (self.mining_block is None and not self.syncing and
+                self.blockchain.last_block is not None and
+                len(self.blockchain.transactions) >= self.blockchain.capacity)
 
-        last_block = self.blockchain.last_block
-        block = Block(last_block.index+1, 0, last_block.hash)
-        added_transactions = self.blockchain.\
-                                transactions[:self.blockchain.capacity]
-        block.add_transactions_to_block(added_transactions)
-        self.blockchain.transactions = self.blockchain.\
-                                transactions[self.blockchain.capacity:]
-        self.blockchain.number_of_transactions += 1
-        self.blockchain.transactions.append(transaction)
-        nonce = self.mine_block(block)
+    def produce_blocks(self) -> None:
+        """Main loop of the block producer thread. Each block is timed as a
+        "produce_block" operation while spans are enabled.
+        """
+        while True:
+            with self.producer_condition:
+                while not self.can_produce_block():
+                    self.producer_condition.wait()
+
+            with SPANS.operation("produce_block"):
+                self.produce_block()
+
+    def produce_block(self) -> None:
+        """Produce a block: it is created with the blockchain lock held for
+        reading, mined without it, appended with it held for writing, and
+        handed to `on_block_mined`.
+        """
+        with self.chain_lock.read(), self.mempool_lock:
+            # the blockchain may have changed while no lock was held
+            if not self.can_produce_block():
+                return
+            last_block = self.blockchain.last_block
+            block = Block(last_block.index+1, 0, last_block.hash)
+            block.add_transactions_to_block(self.blockchain.transactions\
+                .take(self.blockchain.capacity))
+            self.mining_block = block
+            self.mining_cancel = threading.Event()
+            cancel_event = self.mining_cancel
+
+        with SPANS.span("mine"):
+            if self.mine_block(block, cancel_event) == -1:
+                return
 
-        return nonce
+        with self.chain_lock.write():
+            with self.mempool_lock:
+                # the block may have been cancelled after its nonce was found
+                if self.mining_block is not block:
+                    return
+                self.mining_block = None
+                self.add_block(block)
+
+        if self.on_block_mined is not None:
+            try:
+                self.on_block_mined(block)
+            except Exception as e:
+                print("Could not hand over mined block:", e)
+
+    def cancel_mining(self, block: Optional[Block] = None) -> None:
+        """Stop the ongoing mining, because a competing block arrived or the
+        blockchain was replaced. The transactions of the block being mined
+        are put back to the front of the mempool.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired for writing.
 
-    def mine_block(self, block: Block) -> int:
-        """Mine new block.
+        Args:
+            block (Block): The competing block. Mining is cancelled only if it
+                           extends the same parent as the block being mined.
+                           If None, mining is cancelled unconditionally.
+        """
+        with self.mempool_lock:
+            if self.mining_block is None:
+                return
+            if (block is not None and
+                    block.previous_hash != self.mining_block.previous_hash):
+                return
+
+            self.mining_cancel.set()
+            self.blockchain.transactions.put_back(\
+                self.mining_block.list_of_transactions)
+            self.mining_block = None
+
+    def begin_sync(self) -> None:
+        """Stop producing blocks while a longer branch is downloaded from a
+        peer without holding the lock, since a block mined meanwhile would
+        most likely be replaced. The ongoing mining is cancelled.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired for writing.
+        """
+        with self.mempool_lock:
+            self.syncing += 1
+            self.cancel_mining()
+
+    def end_sync(self) -> None:
+        """Resume producing blocks after a download started by `begin_sync`
+        """
+        with self.producer_condition:
+            self.syncing -= 1
+            self.producer_condition.notify()
+
+    def mine_block(self, block: Block,\
+            cancel_event: Optional[threading.Event] = None) -> int:
+        """Mine new block, by finding its nonce.
 
         Args:
             block (Block): The new block to be mined.
+            cancel_event (threading.Event): If given, mining stops as soon as
+                                            the event is set
 
         Returns:
             nonce (int): The nonce found or -1 if the event is set.
         """
         start_time = time()
-        while 1:
-            if self.valid_proof(block):
-                self.mining_times.append(time()-start_time)
-                self.blockchain.add_new_block(block)
-                return block.nonce
-            block.set_nonce(block.nonce+1)
+        nonce = self.miner.mine(block, self.blockchain.difficulty,\
+            cancel_event)
+        elapsed = time()-start_time
+        self.hashes += self.miner.attempts
+        self.hashing_time += elapsed
+        if nonce is None:
+            return -1
+        block.set_nonce(nonce)
+        self.mining_times.append(elapsed)
+        self.mining_attempts.append(self.miner.attempts)
+        return block.nonce
 
-        return -1
+    def hashrate(self) -> float:
+        """Compute the node's mining speed over all the blocks it has mined
+        or tried to mine
 
-    def valid_proof(self, block) -> bool:
-        return (block.hash[:self.blockchain.difficulty] ==\
-                    "0" * self.blockchain.difficulty)
+        Returns:
+            hashrate (float): The hashed nonces per second
+        """
+        if not self.hashing_time:
+            return 0.0
+        return self.hashes / self.hashing_time
 
-    def resolve_conflicts(self, blockchain: Blockchain) -> None:
-        """Validate that the blockchain that we received is valid and resolve
-        conflicts between transactions of the 2 blockchains.
-        In this function we make sure that each unique transaction exists once.
+    def check_blocks(self, blocks: List[Block]) -> bool:
+        """Check blocks received from a peer as far as possible without the
+        blockchain, see `ChainValidator.check_blocks`. The lock is not
+        needed, so the signatures are verified before it is acquired.
+
+        Args:
+            blocks (List[Block]): The blocks, oldest first
+
+        Returns:
+            bool: True if the blocks are valid else False
+        """
+        reason = self.validator.check_blocks(blocks, None,\
+            {x.public_key: x.address for x in self.ring})
+        if reason is not None:
+            print("Invalid blocks:", reason)
+        return reason is None
+
+    def replay_blocks(self, ancestor: Block, blocks: List[Block]) -> bool:
+        """Check the transactions of blocks that follow a block of the main
+        chain against the blockchain, and apply the ones the node has not
+        validated yet to the UTXO set, see `ChainValidator.replay`.
         IMPORTANT NOTE: This part is considered a critical section... Before
-        calling this function, lock should be acquired.
+        calling this function, lock should be acquired for writing, and the
+        block being mined should be cancelled.
 
         Args:
-            blockchain (Blockchain): The blockchain that is to replace the
-                current
+            ancestor (Block): The block of the main chain the blocks follow
+            blocks (List[Block]): The blocks, which passed `check_blocks`
+
+        Returns:
+            bool: True if the blocks are valid else False
         """
-        for hash, block in blockchain.blockchain.items():
-            if not block.validate_block(hash):
-                return
+        with self.mempool_lock, self.utxo_lock:
+            reason = self.validator.replay(ancestor, blocks, self.utxos,\
+                self.blockchain.transaction_index,\
+                self.blockchain.transactions)
+        if reason is not None:
+            print("Invalid blocks:", reason)
+        return reason is None
+
+    def add_received_block(self, block: Block) -> bool:
+        """Append a block received from a peer that extends the last block.
+        The mining of a block with the same parent is cancelled, and the
+        block's transactions are replayed and removed from the mempool.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired for writing.
+
+        Args:
+            block (Block): The block, which passed `check_blocks`
+
+        Returns:
+            bool: True if the block was appended else False
+        """
+        last_block = self.blockchain.last_block
+        if block.index != last_block.index + 1 or\
+                block.previous_hash != last_block.hash:
+            return False
+        with self.mempool_lock:
+            self.cancel_mining(block)
+            if not self.replay_blocks(last_block, [block]):
+                return False
+            self.delete_duplicate_transactions(block)
+            self.add_block(block)
+        return True
 
-        transactions_set = set()
-        for trans in blockchain.transactions:
-            transactions_set.add(trans.transaction_id)
+    def valid_proof(self, block) -> bool:
+        return (block.hash[:self.blockchain.difficulty] ==\
+                    "0" * self.blockchain.difficulty)
 
-        for hash, block in blockchain.blockchain.items():
-            for trans in block.list_of_transactions:
-                transactions_set.add(trans.transaction_id)
+    def resolve_conflicts(self, blocks: List[Block]) -> bool:
+        """Resolve a fork by switching to a peer's longer branch. The blocks
+        of the peer's branch that follow the last common block replace the
+        node's blocks after that block, once their transactions are replayed
+        (see `Node.replay_blocks`), so that the cost depends on the length of
+        the fork and not on the length of the blockchain. The
+        transactions of the replaced blocks that are not in the new ones go
+        back to the mempool, and the transactions of the new blocks are
+        removed from the mempool, so that each unique transaction exists once.
+        The ongoing mining is cancelled if the node switches branch.
+        IMPORTANT NOTE: This part is considered a critical section... Before
+        calling this function, lock should be acquired for writing.
 
-        old_transactions = self.blockchain.transactions
-        self.blockchain = blockchain
-        for trans in old_transactions:
-            if (trans.transaction_id not in transactions_set
-                    and self.validate_transaction(trans)):
-                self.add_transaction(trans)
+        Args:
+            blocks (List[Block]): The peer's blocks after the last common
+                block, oldest first, which passed `check_blocks`
+
+        Returns:
+            bool: True if the node switched to the peer's branch else False
+        """
+        if not blocks:
+            return False
+        ancestor = self.blockchain.get_block(blocks[0].previous_hash)
+        # the node may have switched branch since the blocks were requested,
+        # leaving their ancestor on a side branch
+        main_block = ancestor and\
+            self.blockchain.get_block_at(ancestor.index)
+        if main_block is None or main_block.hash != ancestor.hash or\
+                ancestor.index + len(blocks) <=\
+                self.blockchain.last_block.index or\
+                blocks[0].index != ancestor.index + 1:
+            return False
+        # the effects of the removed transactions were applied when they
+        # were received, and the ones of the new blocks by `replay_blocks`
+        with self.mempool_lock:
+            self.cancel_mining()
+            if not self.replay_blocks(ancestor, blocks):
+                FORK_RESOLUTIONS.labels("rejected").inc()
+                return False
+
+            removed = self.blockchain.replace_suffix(ancestor.hash, blocks)
+            removed_transactions = [x for block in removed\
+                for x in block.list_of_transactions]
+            removed_ids = set(x.transaction_id for x in removed_transactions)
+            added_ids = set()
+            for block in blocks:
+                for trans in block.list_of_transactions:
+                    added_ids.add(trans.transaction_id)
+                    if trans.transaction_id not in removed_ids and\
+                            trans.transaction_id not in\
+                            self.blockchain.transactions:
+                        self.blockchain.number_of_transactions += 1
+            self.blockchain.transactions.remove(added_ids)
+            self.blockchain.transactions.put_back([x for x in\
+                removed_transactions if x.transaction_id not in added_ids])
+        store = self.blockchain.store
+        if store is not None and ancestor.index < store.snapshot_height:
+            # the snapshot includes replaced blocks
+            self.save_snapshot()
+        else:
+            self.snapshot_if_due()
+        FORK_RESOLUTIONS.labels("switched").inc()
+        return True
 
     def delete_duplicate_transactions(self, block: Block) -> None:
         """When adding a new block that another node sent you, it is possible
         that inside the block exist some transactions that also exist in
-        `Blockchain.transactions` list. We should delete those transactions
-        from `Blockchain.transactions` since they will be added to the
+        the `Blockchain.transactions` mempool. We should delete those
+        transactions from the mempool since they will be added to the
         blockchain via the broadcasted block.
 
         Args:
@@ -301,18 +814,11 @@ class Node:
         added_transactions = set()
         for trans in block.list_of_transactions:
             added_transactions.add(trans.transaction_id)
-        
-        count = len(added_transactions)
-
-        new_transactions = []
-        for trans in self.blockchain.transactions:
-            if trans.transaction_id not in added_transactions:
-                new_transactions.append(trans)
-            else:
-                count -= 1
-        
-        self.blockchain.number_of_transactions += count
-        self.blockchain.transactions = new_transactions
+
+        with self.mempool_lock:
+            removed = self.blockchain.transactions.remove(added_transactions)
+            self.blockchain.number_of_transactions +=\
+                len(added_transactions) - removed
 
 
     # def broadcast_transaction(self):
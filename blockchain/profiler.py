@@ -0,0 +1,202 @@
+"""Tools that show where a running node spends its time, without restarting
+it under a profiler: a sampling profiler over all of the node's threads, and
+per-request timing spans.
+
+The sampling profiler looks at the stack of every thread at a fixed
+interval, so its cost depends on the sampling rate and not on the work the
+node does, and nothing is recorded while it does not run. Threads that wait
+(e.g. for a lock) are sampled too, so the profile shows where the time goes,
+not only where the CPU goes.
+
+Timing spans break a request down into phases (e.g. parse, validate, lock
+wait, mine, broadcast). They are off by default; when off, marking a phase
+costs a lookup of a thread-local attribute.
+"""
+from contextlib import contextmanager
+import os
+import sys
+import threading
+from time import perf_counter, sleep
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .metrics import REGISTRY
+
+# Seconds between two samples of the threads' stacks
+SAMPLING_INTERVAL = 0.01
+
+REQUEST_PHASE_SECONDS = REGISTRY.histogram("noobcash_request_phase_seconds",\
+    "Seconds spent in each phase of a request, while spans are enabled",\
+    ("operation", "phase"))
+
+
+def frame_label(code, labels: Dict[object, str]) -> str:
+    """The label of a stack frame in a collapsed stack, e.g.
+    `node.py:validate_transactions`
+
+    Args:
+        code (code): The frame's code object
+        labels (Dict[object, str]): The labels found so far, by code object
+
+    Returns:
+        label (str): The label
+    """
+    label = labels.get(code)
+    if label is None:
+        label = f"{os.path.basename(code.co_filename)}:{code.co_name}"\
+            .replace(";", ":").replace(" ", "_")
+        labels[code] = label
+    return label
+
+
+def sample_stacks(seconds: float, interval: float = SAMPLING_INTERVAL)\
+        -> Dict[str, int]:
+    """Sample the stacks of every thread, except the calling one, for a
+    while
+
+    Args:
+        seconds (float): The seconds to sample for
+        interval (float): The seconds between two samples
+
+    Returns:
+        counts (Dict[str, int]): The number of samples of each stack, whose
+                                 frames are separated by ";", outermost first
+    """
+    counts: Dict[str, int] = {}
+    labels: Dict[object, str] = {}
+    me = threading.get_ident()
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code, labels))
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        sleep(interval)
+    return counts
+
+
+def collapse(counts: Dict[str, int]) -> str:
+    """Format sampled stacks in the collapsed format that flamegraph tools
+    read: one `<stack> <count>` line per stack
+
+    Args:
+        counts (Dict[str, int]): The number of samples of each stack
+
+    Returns:
+        text (str): The collapsed stacks
+    """
+    return "".join(f"{stack} {count}\n"\
+        for stack, count in sorted(counts.items()))
+
+
+class Spans:
+    """Spans: Times the phases of the operation each thread runs, e.g. of
+    the request a Flask worker serves. An operation starts with `begin` and
+    ends with `end`; in between, `span` times a phase and `add` records time
+    measured elsewhere (e.g. spent waiting for a lock). A phase's time
+    excludes the phases nested in it, so the phases of an operation add up
+    to at most its duration. Each phase is recorded under the request phase
+    metric.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """Initialize the Spans
+
+        Args:
+            enabled (bool): Whether operations are timed. It can be changed
+                            at any time.
+        """
+        self.enabled = enabled
+        self._local = threading.local()
+
+    def begin(self, operation: str) -> None:
+        """Start timing an operation in the calling thread, if spans are
+        enabled. An operation that did not end is discarded.
+
+        Args:
+            operation (str): The operation's name, e.g. the endpoint
+        """
+        if not self.enabled:
+            self._local.operation = None
+            return
+        self._local.operation = operation
+        self._local.start = perf_counter()
+        self._local.phases = {}
+        # the time of the phases nested in each running phase
+        self._local.nested = []
+
+    def end(self) -> Optional[List[Tuple[str, float]]]:
+        """Stop timing the operation of the calling thread, and record its
+        phases
+
+        Returns:
+            phases (List[Tuple[str, float]]): The seconds spent in each
+                phase, and in the operation as a whole ("total"), or None if
+                no operation is timed
+        """
+        operation = getattr(self._local, "operation", None)
+        if operation is None:
+            return None
+        self._local.operation = None
+        phases = list(self._local.phases.items())
+        phases.append(("total", perf_counter() - self._local.start))
+        for phase, seconds in phases:
+            REQUEST_PHASE_SECONDS.labels(operation, phase).observe(seconds)
+        return phases
+
+    def add(self, phase: str, seconds: float) -> None:
+        """Record time spent in a phase of the calling thread's operation, if
+        one is timed
+
+        Args:
+            phase (str): The phase, e.g. "lock_wait"
+            seconds (float): The seconds spent in it
+        """
+        if getattr(self._local, "operation", None) is None:
+            return
+        phases = self._local.phases
+        phases[phase] = phases.get(phase, 0.0) + seconds
+        if self._local.nested:
+            self._local.nested[-1] += seconds
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """Time a phase of the calling thread's operation, for the duration
+        of a `with` block
+
+        Args:
+            phase (str): The phase, e.g. "validate"
+        """
+        if getattr(self._local, "operation", None) is None:
+            yield
+            return
+        nested = self._local.nested
+        nested.append(0.0)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            excluded = nested.pop()
+            self.add(phase, elapsed - excluded)
+            if nested:
+                # the nested phase's time was already excluded from it
+                nested[-1] += excluded
+
+    @contextmanager
+    def operation(self, operation: str) -> Iterator[None]:
+        """Time an operation for the duration of a `with` block, see `begin`
+        """
+        self.begin(operation)
+        try:
+            yield
+        finally:
+            self.end()
+
+
+# The spans of the node's requests and blocks
+SPANS = Spans()
@@ -0,0 +1,376 @@
+"""Canonical binary format of the blockchain objects.
+
+Every value is written in a fixed order, with no field names:
+- integers as zigzag varints
+- floats as 8-byte big-endian doubles
+- texts (ids, hashes, keys, addresses, signatures) as a tagged, length
+  prefixed value. Lowercase hex strings are stored as their raw bytes, which
+  halves the size of the keys, hashes and signatures.
+- lists as a varint count followed by the items
+
+The same bytes are hashed and signed, so the ids, the signatures and the
+block hashes do not depend on the JSON representation of the objects. Each
+class provides a `write(writer)` method and a `read(reader)` classmethod.
+"""
+import io
+import re
+import struct
+import sys
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Union
+
+from .metrics import REGISTRY
+
+# The content type of the binary format in HTTP requests and responses
+CONTENT_TYPE = "application/x-noobcash"
+
+# The content type of newline-delimited JSON, one object per line
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# Bytes of the binary format produced by `dumps` and the streamed
+# serializations. JSON and NDJSON are not counted.
+BINARY_BYTES = REGISTRY.counter("noobcash_binary_serialized_bytes_total",\
+    "Bytes serialized in the binary format, excluding JSON and NDJSON")
+
+# Prepended by `dump`/`dumps`, so that the format can change in the future
+FORMAT_VERSION = 1
+
+# The size of the chunks of a streamed serialization, see `ChunkedWriter`
+CHUNK_SIZE = 64 * 1024
+
+# Tags of the texts
+TEXT_STR = 0
+TEXT_HEX = 1
+TEXT_INT = 2
+
+_HEX = re.compile(r"(?:[0-9a-f]{2})+")
+_DOUBLE = struct.Struct(">d")
+
+
+class Writer:
+    """Writer: Writes values to a binary stream in the canonical format
+    """
+
+    def __init__(self, stream: Optional[BinaryIO] = None):
+        """Initialize the Writer
+
+        Args:
+            stream (BinaryIO): The stream to write to. Defaults to an
+                               in-memory buffer, see `Writer.getvalue`.
+        """
+        self.stream = stream if stream is not None else io.BytesIO()
+
+    def write_varint(self, value: int) -> None:
+        """Write a non negative integer, 7 bits per byte
+        """
+        if value < 0:
+            raise ValueError(f"Negative varint: {value}")
+        out = bytearray()
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+        self.stream.write(out)
+
+    def write_int(self, value: int) -> None:
+        """Write an integer, zigzag encoded so that small negative values are
+        short too
+        """
+        self.write_varint(value * 2 if value >= 0 else -value * 2 - 1)
+
+    def write_float(self, value: float) -> None:
+        """Write a float as an 8-byte double
+        """
+        self.stream.write(_DOUBLE.pack(value))
+
+    def write_bytes(self, value: bytes) -> None:
+        """Write length-prefixed bytes
+        """
+        self.write_varint(len(value))
+        self.stream.write(value)
+
+    def write_text(self, value: Union[str, bytes, int]) -> None:
+        """Write a text field. Lowercase hex strings are stored as raw bytes,
+        and bytes are taken to be an already packed hex string (see
+        `pack_hex`). Integers are accepted, since the genesis transaction uses
+        0 as the sender's address and public key.
+        """
+        if isinstance(value, bytes):
+            self.write_varint(TEXT_HEX)
+            self.write_bytes(value)
+        elif isinstance(value, int):
+            self.write_varint(TEXT_INT)
+            self.write_int(value)
+        elif _HEX.fullmatch(value):
+            self.write_varint(TEXT_HEX)
+            self.write_bytes(bytes.fromhex(value))
+        else:
+            self.write_varint(TEXT_STR)
+            self.write_bytes(value.encode('utf8'))
+
+    def write_list(self, items: list) -> None:
+        """Write a list of objects that provide a `write(writer)` method
+        """
+        self.write_varint(len(items))
+        for item in items:
+            item.write(self)
+
+    def getvalue(self) -> bytes:
+        """The written bytes, if writing to the default in-memory buffer
+        """
+        return self.stream.getvalue()
+
+
+class ChunkedWriter(Writer):
+    """ChunkedWriter: A Writer whose output is taken in chunks while it is
+    written, so that a large object is streamed instead of being serialized
+    in memory as a whole
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        """Initialize the ChunkedWriter
+
+        Args:
+            chunk_size (int): The size a chunk must reach to be taken
+        """
+        super().__init__()
+        self.chunk_size = chunk_size
+
+    def take(self, force: bool = False) -> bytes:
+        """Take the output written since the last chunk, if it has reached
+        the chunk size
+
+        Args:
+            force (bool): Take the output whatever its size, e.g. at the end
+
+        Returns:
+            chunk (bytes): The output, or empty bytes if it is too small
+        """
+        if not force and self.stream.tell() < self.chunk_size:
+            return b""
+        chunk = self.stream.getvalue()
+        self.stream = io.BytesIO()
+        return chunk
+
+
+class Reader:
+    """Reader: Reads values in the canonical format from a binary stream
+    """
+
+    def __init__(self, stream: Union[BinaryIO, bytes]):
+        """Initialize the Reader
+
+        Args:
+            stream (BinaryIO): The stream to read from, or the bytes to read
+        """
+        if isinstance(stream, (bytes, bytearray, memoryview)):
+            stream = io.BytesIO(stream)
+        self.stream = stream
+
+    def _read(self, size: int) -> bytes:
+        """Read exactly `size` bytes
+        """
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise ValueError("Unexpected end of data")
+        return data
+
+    def read_varint(self) -> int:
+        """Read a non negative integer
+        """
+        value = 0
+        shift = 0
+        while True:
+            byte = self._read(1)[0]
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def read_int(self) -> int:
+        """Read a zigzag encoded integer
+        """
+        value = self.read_varint()
+        return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+    def read_float(self) -> float:
+        """Read an 8-byte double
+        """
+        return _DOUBLE.unpack(self._read(_DOUBLE.size))[0]
+
+    def read_bytes(self) -> bytes:
+        """Read length-prefixed bytes
+        """
+        return self._read(self.read_varint())
+
+    def read_text(self, packed: bool = False) -> Union[str, bytes, int]:
+        """Read a text field
+
+        Args:
+            packed (bool): Return hex strings as their raw bytes, see
+                           `pack_hex`
+        """
+        tag = self.read_varint()
+        if tag == TEXT_INT:
+            return self.read_int()
+        if tag == TEXT_HEX:
+            data = self.read_bytes()
+            return data if packed else data.hex()
+        if tag == TEXT_STR:
+            return self.read_bytes().decode('utf8')
+        raise ValueError(f"Unknown text tag: {tag}")
+
+    def read_list(self, read: Callable[["Reader"], object]) -> list:
+        """Read a list written by `Writer.write_list`
+
+        Args:
+            read (Callable): Reads a single item, e.g. `Transaction.read`
+        """
+        return [read(self) for _ in range(self.read_varint())]
+
+
+def pack_hex(value: Union[str, bytes, int, None])\
+        -> Union[str, bytes, int, None]:
+    """Compact in-memory form of a text field: a lowercase hex string
+    (a hash, an id or a signature) is kept as its raw bytes, which take half
+    the space. Other values, e.g. the genesis block's previous hash "1", are
+    kept as they are.
+
+    Args:
+        value: The text field
+
+    Returns:
+        The raw bytes of a hex string, else the value itself
+    """
+    if isinstance(value, str) and _HEX.fullmatch(value):
+        return bytes.fromhex(value)
+    return value
+
+
+def unpack_hex(value: Union[str, bytes, int, None])\
+        -> Union[str, int, None]:
+    """Inverse of `pack_hex`
+
+    Args:
+        value: The packed text field
+
+    Returns:
+        The hex string of raw bytes, else the value itself
+    """
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def intern_text(value: Union[str, int]) -> Union[str, int]:
+    """Intern a text field that repeats across many objects, i.e. an address
+    or a public key, so that all the objects share a single copy.
+
+    Args:
+        value: The text field
+
+    Returns:
+        The interned string, or the value itself if it is not a string
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def encode(value) -> bytes:
+    """Canonical bytes of an object, or of a list of objects, without the
+    format version. These are the bytes that get hashed and signed.
+
+    Args:
+        value: An object with a `write(writer)` method, or a list of them
+
+    Returns:
+        data (bytes): The canonical bytes
+    """
+    writer = Writer()
+    if isinstance(value, list):
+        writer.write_list(value)
+    else:
+        value.write(writer)
+    return writer.getvalue()
+
+
+def dump(value, stream: BinaryIO) -> None:
+    """Write an object, or a list of objects, to a stream, preceded by the
+    format version.
+
+    Args:
+        value: An object with a `write(writer)` method, or a list of them
+        stream (BinaryIO): The stream to write to
+    """
+    writer = Writer(stream)
+    writer.write_varint(FORMAT_VERSION)
+    if isinstance(value, list):
+        writer.write_list(value)
+    else:
+        value.write(writer)
+
+
+def dumps(value) -> bytes:
+    """Serialize an object, or a list of objects, see `dump`.
+
+    Returns:
+        data (bytes): The serialized object
+    """
+    stream = io.BytesIO()
+    dump(value, stream)
+    data = stream.getvalue()
+    BINARY_BYTES.inc(len(data))
+    return data
+
+
+def load(stream: Union[BinaryIO, bytes], cls: type, many: bool = False):
+    """Read an object, or a list of objects, written by `dump`
+
+    Args:
+        stream (BinaryIO): The stream to read from, or the bytes to read
+        cls (type): The class of the object(s), which provides a
+                    `read(reader)` classmethod
+        many (bool): Whether a list of objects was written
+
+    Returns:
+        The object, or the list of objects
+
+    Raises:
+        ValueError: If the data is malformed or of an unknown version
+    """
+    reader = Reader(stream)
+    version = reader.read_varint()
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version: {version}")
+    return reader.read_list(cls.read) if many else cls.read(reader)
+
+
+def loads(data: bytes, cls: type, many: bool = False):
+    """Deserialize an object, or a list of objects, see `load`.
+    """
+    return load(data, cls, many)
+
+
+def iter_dumps(values: Iterable, count: int) -> Iterator[bytes]:
+    """Serialize a list of objects like `dumps`, in chunks, so that the
+    objects are serialized one at a time while the chunks are sent
+
+    Args:
+        values (Iterable): Objects with a `write(writer)` method
+        count (int): The number of objects
+
+    Returns:
+        chunks (Iterator[bytes]): The serialized list, in chunks
+    """
+    writer = ChunkedWriter()
+    writer.write_varint(FORMAT_VERSION)
+    writer.write_varint(count)
+    for value in values:
+        value.write(writer)
+        chunk = writer.take()
+        if chunk:
+            BINARY_BYTES.inc(len(chunk))
+            yield chunk
+    chunk = writer.take(force=True)
+    BINARY_BYTES.inc(len(chunk))
+    yield chunk
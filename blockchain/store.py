@@ -0,0 +1,391 @@
+from collections import OrderedDict
+from collections.abc import Sequence
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+from typing import Dict, List, Optional, Tuple, Union
+
+from .block import Block
+from .serialization import Reader, dumps, encode, load, pack_hex
+from .transaction import Transaction
+from .transaction_index import TransactionIndex
+from .utxo import UTXOSet
+
+LOG_FILE = "blocks.log"
+INDEX_FILE = "blocks.idx"
+SNAPSHOT_FILE = "utxos.snapshot"
+STATE_FILE = "node.json"
+
+# Header of a log record: the length of the encoded block that follows
+_RECORD = struct.Struct(">I")
+# Index entry of a block: the offset of its log record, the length of the
+# encoded block, the block's hash and its number of transactions
+_ENTRY = struct.Struct(">QI32sI")
+# Header of the snapshot file: the height of the last block it includes
+_SNAPSHOT = struct.Struct(">Q")
+
+
+class BlockStore:
+    """BlockStore: Keeps a node's blockchain on disk, so that a restarted node
+    does not need to be bootstrapped again. It consists of:
+    - an append-only log of the blocks in the canonical binary format, which
+      is memory-mapped for reading
+    - an index with the log offset and the hash of each block, by height
+    - the latest snapshot of the UTXO set, of the transaction index and of
+      the pending transactions whose effects the UTXO set includes, so that
+      only the blocks after the snapshot are replayed on restart
+    - the node's state (index, keys, ring)
+    """
+
+    def __init__(self, path: str, snapshot_interval: int = 100,\
+            cache_size: int = 1024, sync: bool = False):
+        """Open the BlockStore, creating it if needed. Records that were not
+        completely written (e.g. because the node crashed) are dropped.
+
+        Args:
+            path (str): The directory of the store's files
+            snapshot_interval (int): The number of blocks between two UTXO
+                                     snapshots
+            cache_size (int): The number of decoded blocks kept in memory
+            sync (bool): Whether to fsync the files after each block
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.cache_size = cache_size
+        self.sync = sync
+        self.lock = threading.RLock()
+        self.log = open(os.path.join(path, LOG_FILE), "a+b")
+        self.index = open(os.path.join(path, INDEX_FILE), "a+b")
+        # (offset, length, hash, number of transactions) of each block, by
+        # height
+        self.entries: List[Tuple[int, int, str, int]] = []
+        self.heights: Dict[str, int] = {}
+        self.cache: "OrderedDict[int, Block]" = OrderedDict()
+        self._map: Optional[mmap.mmap] = None
+        # the frozen views of the stored blocks, see `StoredChain`
+        self.views: "weakref.WeakSet[StoredChain]" = weakref.WeakSet()
+        self._load_index()
+        snapshot = self._read_snapshot_height()
+        self.snapshot_height = snapshot if snapshot is not None else -1
+
+    def _load_index(self) -> None:
+        """Read the index, and drop the entries whose log record is not
+        completely written.
+        """
+        self.index.seek(0)
+        data = self.index.read()
+        log_size = os.fstat(self.log.fileno()).st_size
+        end = 0
+        for offset, length, hash, transactions in _ENTRY.iter_unpack(\
+                data[:len(data) - len(data) % _ENTRY.size]):
+            if offset != end or offset + _RECORD.size + length > log_size:
+                break
+            end = offset + _RECORD.size + length
+            hash = hash.hex()
+            self.heights[hash] = len(self.entries)
+            self.entries.append((offset, length, hash, transactions))
+        self.log_size = end
+        self.log.truncate(end)
+        self.index.truncate(len(self.entries) * _ENTRY.size)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def height_of(self, hash: str) -> Optional[int]:
+        """Find the height of a stored block
+
+        Args:
+            hash (str): The block's hash
+
+        Returns:
+            height (int): The block's height, or None if it is not stored
+        """
+        return self.heights.get(hash)
+
+    def hash_at(self, height: int) -> str:
+        """The hash of the stored block at a height
+
+        Args:
+            height (int): The block's height
+
+        Returns:
+            hash (str): The block's hash
+        """
+        return self.entries[height][2]
+
+    def hashes(self) -> List[str]:
+        """The hashes of the stored blocks, by height
+
+        Returns:
+            hashes (List[str]): The hashes
+        """
+        return [x[2] for x in self.entries]
+
+    def number_of_transactions(self) -> int:
+        """The number of transactions in the stored blocks, without reading
+        them. The transaction of the genesis block is not counted.
+
+        Returns:
+            number_of_transactions (int): The number of transactions
+        """
+        return sum(x[3] for x in self.entries[1:])
+
+    def append(self, block: Block) -> None:
+        """Append a block, which must follow the last stored block
+
+        Args:
+            block (Block): The block to be stored
+        """
+        hash = pack_hex(block.hash)
+        if not isinstance(hash, bytes) or len(hash) != 32:
+            raise ValueError(f"Cannot store block with hash {block.hash}")
+        data = encode(block)
+        with self.lock:
+            if block.index != len(self.entries):
+                raise ValueError(f"Block {block.index} does not follow "\
+                    f"stored block {len(self.entries) - 1}")
+            offset = self.log_size
+            self.log.write(_RECORD.pack(len(data)) + data)
+            self.log.flush()
+            self.index.write(_ENTRY.pack(offset, len(data), hash,\
+                len(block.list_of_transactions)))
+            self.index.flush()
+            if self.sync:
+                os.fsync(self.log.fileno())
+                os.fsync(self.index.fileno())
+            self.log_size += _RECORD.size + len(data)
+            self.heights[block.hash] = len(self.entries)
+            self.entries.append((offset, len(data), block.hash,\
+                len(block.list_of_transactions)))
+            self._cache(block.index, block)
+
+    def get(self, height: int) -> Block:
+        """Read the stored block at a height
+
+        Args:
+            height (int): The block's height
+
+        Returns:
+            block (Block): The block
+        """
+        with self.lock:
+            block = self.cache.get(height)
+            if block is not None:
+                self.cache.move_to_end(height)
+                return block
+            offset, length = self.entries[height][:2]
+            start = offset + _RECORD.size
+            if self._map is None or len(self._map) < start + length:
+                self._remap()
+            block = Block.read(Reader(self._map[start:start + length]))
+            self._cache(height, block)
+            return block
+
+    def _cache(self, height: int, block: Block) -> None:
+        """Keep a decoded block, evicting the least recently used one if the
+        cache is full.
+        """
+        self.cache[height] = block
+        self.cache.move_to_end(height)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _remap(self) -> None:
+        """Memory-map the whole log, after it has grown
+        """
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self.log.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def truncate(self, length: int) -> None:
+        """Remove the stored blocks from a height on, e.g. when the node
+        switches to another branch.
+
+        Args:
+            length (int): The number of blocks to be kept
+        """
+        with self.lock:
+            if length >= len(self.entries):
+                return
+            # the frozen views keep the blocks they still see
+            for view in list(self.views):
+                for height in range(length,\
+                        min(len(view.hashes), len(self.entries))):
+                    if height not in view.retained and\
+                            self.entries[height][2] == view.hashes[height]:
+                        view.retained[height] = self.get(height)
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.log_size = self.entries[length][0]
+            self.log.truncate(self.log_size)
+            self.index.truncate(length * _ENTRY.size)
+            for entry in self.entries[length:]:
+                del self.heights[entry[2]]
+            del self.entries[length:]
+            for height in [x for x in self.cache if x >= length]:
+                del self.cache[height]
+
+    def _write_atomically(self, name: str, data: bytes) -> None:
+        """Replace a file of the store, so that a crash leaves either the old
+        or the new file.
+        """
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def save_snapshot(self, height: int, utxos: UTXOSet,\
+            transaction_index: TransactionIndex,\
+            transactions: Optional[List[Transaction]] = None) -> None:
+        """Save a snapshot of the UTXO set, of the transaction index and of
+        the pending transactions, replacing the previous one.
+        IMPORTANT NOTE: None of them must change while they are saved.
+
+        Args:
+            height (int): The height of the last block the snapshot includes
+            utxos (UTXOSet): The UTXO set
+            transaction_index (TransactionIndex): The transaction index
+            transactions (List[Transaction]): The transactions that are not
+                                              in the blockchain but were
+                                              applied to the UTXO set
+        """
+        self._write_atomically(SNAPSHOT_FILE, _SNAPSHOT.pack(height) +\
+            dumps(utxos) + dumps(transaction_index) +\
+            dumps(transactions or []))
+        self.snapshot_height = height
+
+    def _read_snapshot_height(self) -> Optional[int]:
+        """Read the height of the saved snapshot
+        """
+        try:
+            with open(os.path.join(self.path, SNAPSHOT_FILE), "rb") as f:
+                return _SNAPSHOT.unpack(f.read(_SNAPSHOT.size))[0]
+        except (FileNotFoundError, struct.error):
+            return None
+
+    def load_snapshot(self) -> Optional[Tuple[int, UTXOSet,\
+            TransactionIndex, List[Transaction]]]:
+        """Load the saved snapshot of the UTXO set, of the transaction index
+        and of the pending transactions
+
+        Returns:
+            height, utxos, transaction_index, transactions (int, UTXOSet,
+                TransactionIndex, List[Transaction]): The height of the last
+                block the snapshot includes, the UTXO set, the transaction
+                index and the pending transactions, or None if there is no
+                snapshot
+        """
+        try:
+            with open(os.path.join(self.path, SNAPSHOT_FILE), "rb") as f:
+                height = _SNAPSHOT.unpack(f.read(_SNAPSHOT.size))[0]
+                utxos = load(f, UTXOSet)
+                transaction_index = load(f, TransactionIndex)
+                # snapshots saved before the pending transactions were kept
+                # end here
+                rest = f.read()
+                transactions = load(rest, Transaction, many=True) if rest\
+                    else []
+                return height, utxos, transaction_index, transactions
+        except FileNotFoundError:
+            return None
+
+    def save_state(self, state: dict) -> None:
+        """Save the node's state
+
+        Args:
+            state (dict): The state, which must be JSON serializable
+        """
+        self._write_atomically(STATE_FILE, json.dumps(state).encode('utf8'))
+        os.chmod(os.path.join(self.path, STATE_FILE), 0o600)
+
+    def load_state(self) -> Optional[dict]:
+        """Load the node's state
+
+        Returns:
+            state (dict): The saved state, or None if there is none
+        """
+        try:
+            with open(os.path.join(self.path, STATE_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def close(self) -> None:
+        """Close the store's files
+        """
+        with self.lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self.log.close()
+            self.index.close()
+
+
+class StoredChain(Sequence):
+    """StoredChain: The `Blockchain.blocks` sequence (height -> block) of a
+    blockchain kept in a BlockStore. Blocks are read from the store when
+    accessed, so that a restarted node does not decode its whole blockchain.
+    A view frozen to the blocks stored at some point keeps seeing them after
+    the store is truncated: the store hands it the blocks it removes.
+    """
+
+    def __init__(self, store: BlockStore, hashes: Optional[List[str]] = None):
+        """Initialize the StoredChain
+
+        Args:
+            store (BlockStore): The store of the blockchain
+            hashes (List[str]): The hashes of the blocks, by height, if the
+                                view is frozen to the blocks stored at some
+                                point, see `Blockchain.snapshot`
+        """
+        self.store = store
+        self.hashes = hashes
+        # the blocks of a frozen view that were removed from the store
+        self.retained: Dict[int, Block] = {}
+        if hashes is not None:
+            with store.lock:
+                store.views.add(self)
+
+    def __getitem__(self, height: Union[int, slice])\
+            -> Union[Block, List[Block]]:
+        if isinstance(height, slice):
+            return [self[x] for x in range(*height.indices(len(self)))]
+        if height < 0:
+            height += len(self)
+        if not 0 <= height < len(self):
+            raise IndexError(height)
+        with self.store.lock:
+            block = self.retained.get(height)
+            if block is None:
+                block = self.store.get(height)
+        if self.hashes is not None and block.hash != self.hashes[height]:
+            raise ValueError(f"Block {height} was replaced")
+        return block
+
+    def __len__(self) -> int:
+        return len(self.hashes) if self.hashes is not None\
+            else len(self.store)
+
+    def append(self, block: Block) -> None:
+        """Append a block to the store
+
+        Args:
+            block (Block): The block, which follows the last stored block
+        """
+        self.store.append(block)
+
+    def __delitem__(self, heights: slice) -> None:
+        """Only the blocks from a height on can be removed, i.e.
+        `del chain[height:]`, which truncates the store.
+        """
+        if not isinstance(heights, slice) or heights.stop is not None or\
+                heights.step is not None:
+            raise TypeError("Only the blocks from a height on can be removed")
+        self.store.truncate(heights.indices(len(self.store))[0])
@@ -6,18 +6,24 @@ import Crypto.Random
 from Crypto.Hash import SHA
 from Crypto.PublicKey import RSA
 from Crypto.Signature import PKCS1_v1_5
-from json import dumps
 import requests
 from flask import Flask, jsonify, request, render_template
 from typing import List, Optional
 
+from .serialization import Reader, Writer, encode, intern_text, pack_hex,\
+    unpack_hex
+from .verification import verify_signature
+
 
 class TransactionOutput:
-    """TransactionOutput: A class for the transaction outputs of a transaction
+    """TransactionOutput: A class for the transaction outputs of a transaction.
+    The ids are kept as raw bytes and exposed as hex strings.
     """
 
+    __slots__ = ("_transaction_id", "recipient_address", "amount", "_id")
+
     def __init__(self, transaction_id: int, recipient_address: str,\
-        amount: int):
+        amount: int, id: Optional[str] = None):
         """Initialize the TransactionOutput
 
         Args:
@@ -25,24 +31,60 @@ class TransactionOutput:
                                   is output of
             recipient_address (str): The address of the receiver
             amount (int): The transaction's amount
+            id (str): The output's id, which is given if the output was
+                      received and not created. Otherwise it is computed on
+                      first access.
         """
-        self.transaction_id = transaction_id
-        self.recipient_address = recipient_address
+        self._transaction_id = pack_hex(transaction_id)
+        self.recipient_address = intern_text(recipient_address)
         self.amount = amount
-        self.id = self.__my_hash()
+        self._id = pack_hex(id)
+
+    @property
+    def transaction_id(self) -> str:
+        """The id of the transaction this transaction is output of
+
+        Returns:
+            transaction_id (str): The transaction's id
+        """
+        return unpack_hex(self._transaction_id)
+
+    @property
+    def id(self) -> str:
+        """TransactionOutput's id, i.e. its hash
+
+        Returns:
+            id (str): TransactionOutput's id
+        """
+        return unpack_hex(self._packed_id())
+
+    def _packed_id(self) -> bytes:
+        """TransactionOutput's id as raw bytes, computed on first access
+        """
+        if self._id is None:
+            self._id = self.__my_hash()
+        return self._id
 
-    def __my_hash(self) -> str:
+    def __my_hash(self) -> bytes:
         """Private function used to generate transaction output's hash
 
         Returns:
-            hash (str): TransactionOutput's hash
+            hash (bytes): TransactionOutput's hash
         """
-        obj = {
-            "transaction_id": self.transaction_id,
-            "recipient_address": self.recipient_address,
-            "amount": self.amount
-        }
-        return hashlib.sha256(dumps(obj).encode('utf8')).hexdigest()
+        writer = Writer()
+        writer.write_text(self._transaction_id)
+        writer.write_text(self.recipient_address)
+        writer.write_int(self.amount)
+        return hashlib.sha256(writer.getvalue()).digest()
+
+    def validate_id(self) -> bool:
+        """Check that the output's id, which is given if the output was
+        received, is the hash of its contents
+
+        Returns:
+            bool: True if the id is correct else False
+        """
+        return self._packed_id() == self.__my_hash()
 
     def to_dict(self) -> dict:
         """Convert object to dict
@@ -60,28 +102,66 @@ class TransactionOutput:
             "id": self.id
         }
 
-    def parser(self, dictionary: dict) -> None:
-        """Convert dictionary to object
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "TransactionOutput":
+        """Convert dictionary to object. The id is taken from the dictionary,
+        not recomputed.
 
         Args:
             dictionary (dict): The dictionary to be parsed
+
+        Returns:
+            transaction_output (TransactionOutput): The parsed object
         """
-        self.transaction_id = dictionary["transaction_id"]
-        self.recipient_address = dictionary["recipient_address"]
-        self.amount = dictionary["amount"]
-        self.id = dictionary["id"]
+        return cls(dictionary["transaction_id"],\
+            dictionary["recipient_address"], dictionary["amount"],\
+            dictionary["id"])
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format
+
+        Args:
+            writer (Writer): The writer to write to
+        """
+        writer.write_text(self._transaction_id)
+        writer.write_text(self.recipient_address)
+        writer.write_int(self.amount)
+        writer.write_text(self._packed_id())
+
+    @classmethod
+    def read(cls, reader: Reader) -> "TransactionOutput":
+        """Read object written by `TransactionOutput.write`. The id is read,
+        not recomputed.
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            transaction_output (TransactionOutput): The read object
+        """
+        return cls(reader.read_text(packed=True), reader.read_text(),\
+            reader.read_int(), reader.read_text(packed=True))
 
 
 class Transaction:
     """Transaction: Contains the transaction amount, along with
     other useful transaction data such as sender's address, receiver's
-    address, etc.
+    address, etc. The id and the signature are kept as raw bytes and exposed
+    as hex strings, and the addresses and the public key are interned, since
+    they repeat across the transactions of a node.
     """
 
+    __slots__ = ("sender_address", "sender_public_key", "receiver_address",\
+        "amount", "transaction_inputs", "_signature", "_transaction_id",\
+        "_transaction_outputs")
+
     def __init__(self, sender_address: str, sender_public_key: str,\
             recipient_address: str, amount: int,\
             transaction_inputs: List[TransactionOutput],
-            signature: Optional[str] = None) -> None:
+            signature: Optional[str] = None,\
+            transaction_id: Optional[str] = None,\
+            transaction_outputs: Optional[List[TransactionOutput]] = None)\
+            -> None:
         """Initialize Transaction
 
         Args:
@@ -92,39 +172,100 @@ class Transaction:
                 inputs
             signature (str): Transaction signature, which is given if
                 transaction was broadcasted and not created
+            transaction_id (str): Transaction's id, which is given if
+                transaction was broadcasted. Otherwise it is computed on
+                first access.
+            transaction_outputs (List[TransactionOutput]): List of transaction
+                outputs, which is given if transaction was broadcasted.
+                Otherwise it is generated on first access.
 
         Returns:
             None
         """
-        self.sender_address = sender_address
-        self.sender_public_key = sender_public_key
-        self.receiver_address = recipient_address
+        self.sender_address = intern_text(sender_address)
+        self.sender_public_key = intern_text(sender_public_key)
+        self.receiver_address = intern_text(recipient_address)
         self.amount = amount
         self.transaction_inputs = [x for x in transaction_inputs]
         if signature:
             self.signature = signature
         else:
             self.signature = ""
-        self.transaction_id = self.__my_hash()
-        self.transaction_outputs = self.\
-            generate_transaction_outputs(transaction_inputs)
+        self._transaction_id = pack_hex(transaction_id)
+        self._transaction_outputs = transaction_outputs
 
-    def __my_hash(self) -> str:
-        """Private function used to generate transaction's hash
+    @property
+    def signature(self) -> str:
+        """Transaction's signature
 
         Returns:
-            hash (str): Transaction's hash
+            signature (str): Transaction's signature in hex
         """
-        obj = {
-            "sender_address": self.sender_address,
-            "sender_public_key": self.sender_public_key,
-            "receiver_address": self.receiver_address,
-            "amount": self.amount,
-            "transaction_inputs": [x.to_dict() for x in\
-                self.transaction_inputs],
-            "signature": str(self.signature)
-        }
-        return hashlib.sha256(dumps(obj).encode('utf8')).hexdigest()
+        return unpack_hex(self._signature)
+
+    @signature.setter
+    def signature(self, signature: str) -> None:
+        self._signature = pack_hex(signature)
+
+    @property
+    def transaction_id(self) -> str:
+        """Transaction's id, i.e. its hash
+
+        Returns:
+            transaction_id (str): Transaction's id
+        """
+        return unpack_hex(self._packed_id())
+
+    def _packed_id(self) -> bytes:
+        """Transaction's id as raw bytes, computed on first access
+        """
+        if self._transaction_id is None:
+            self._transaction_id = self.__my_hash()
+        return self._transaction_id
+
+    @property
+    def transaction_outputs(self) -> List[TransactionOutput]:
+        """Transaction's outputs: the amount to the receiver and the change
+        to the sender
+
+        Returns:
+            transaction_outputs (List[TransactionOutput]): List of transaction
+                outputs
+        """
+        if self._transaction_outputs is None:
+            self._transaction_outputs = self.\
+                generate_transaction_outputs(self.transaction_inputs)
+        return self._transaction_outputs
+
+    def __my_hash(self) -> bytes:
+        """Private function used to generate transaction's hash. The
+        signature is not hashed, since it signs the transaction's id, so the
+        id is the same whenever it is first computed.
+
+        Returns:
+            hash (bytes): Transaction's hash
+        """
+        writer = Writer()
+        writer.write_text(self.sender_address)
+        writer.write_text(self.sender_public_key)
+        writer.write_text(self.receiver_address)
+        writer.write_int(self.amount)
+        writer.write_list(self.transaction_inputs)
+        return hashlib.sha256(writer.getvalue()).digest()
+
+    def validate_ids(self) -> bool:
+        """Check that the transaction's id and the ids of its outputs, which
+        are given if the transaction was received, are the hashes of their
+        contents, and that the outputs belong to the transaction
+
+        Returns:
+            bool: True if the ids are correct else False
+        """
+        id = self.__my_hash()
+        if self._packed_id() != id:
+            return False
+        return all(x._transaction_id == id and x.validate_id()\
+            for x in self.transaction_outputs)
 
     def generate_transaction_outputs(self, \
             transaction_inputs: List[TransactionOutput]) ->\
@@ -145,12 +286,21 @@ class Transaction:
         # the bootstrap node
         if not transaction_inputs:
             sender_amount = 0
-        receiver_transaction_output = TransactionOutput(self.transaction_id, \
+        receiver_transaction_output = TransactionOutput(self._packed_id(),\
             self.receiver_address, self.amount)
-        sender_transaction_output = TransactionOutput(self.transaction_id, \
+        sender_transaction_output = TransactionOutput(self._packed_id(),\
             self.sender_address, sender_amount)
         return [receiver_transaction_output, sender_transaction_output]
 
+    def digest(self) -> bytes:
+        """SHA-256 digest of the whole transaction, signature included. Used
+        as the transaction's leaf in the block's Merkle tree.
+
+        Returns:
+            digest (bytes): Transaction's digest
+        """
+        return hashlib.sha256(encode(self)).digest()
+
     def to_dict(self) -> dict:
         """Convert object to dict
 
@@ -161,6 +311,7 @@ class Transaction:
             dict (dict): Object's dict
         """
         return {
+            "transaction_id": self.transaction_id,
             "sender_address": self.sender_address,
             "sender_public_key": self.sender_public_key,
             "receiver_address": self.receiver_address,
@@ -172,31 +323,83 @@ class Transaction:
             "signature": self.signature
         }
 
-    def parser(self, dictionary: dict) -> None:
-        """Convert dictionary to object
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "Transaction":
+        """Convert dictionary to object. The id and the outputs are taken
+        from the dictionary, not recomputed.
 
         Args:
             dictionary (dict): The dictionary to be parsed
+
+        Returns:
+            transaction (Transaction): The parsed object
+        """
+        return cls(dictionary["sender_address"],\
+            dictionary["sender_public_key"], dictionary["receiver_address"],\
+            dictionary["amount"],\
+            [TransactionOutput.from_dict(x)\
+                for x in dictionary["transaction_inputs"]],\
+            dictionary["signature"], dictionary["transaction_id"],\
+            [TransactionOutput.from_dict(x)\
+                for x in dictionary["transaction_outputs"]])
+
+    def write_unsigned(self, writer: Writer) -> None:
+        """Write the transaction without its signature in the canonical
+        binary format
+
+        Args:
+            writer (Writer): The writer to write to
         """
-        transaction_inputs = []
-        for transaction_input in dictionary["transaction_inputs"]:
-            transaction = TransactionOutput(0, "", 0)
-            transaction.parser(transaction_input)
-            transaction_inputs.append(transaction)
-
-        transaction_outputs = []
-        for transaction_output in dictionary["transaction_outputs"]:
-            transaction = TransactionOutput(0, "", 0)
-            transaction.parser(transaction_output)
-            transaction_outputs.append(transaction)
-
-        self.sender_address = dictionary["sender_address"]
-        self.sender_public_key = dictionary["sender_public_key"]
-        self.receiver_address = dictionary["receiver_address"]
-        self.amount = dictionary["amount"]
-        self.transaction_inputs = transaction_inputs
-        self.transaction_outputs = transaction_outputs
-        self.signature = dictionary["signature"]
+        writer.write_text(self._packed_id())
+        writer.write_text(self.sender_address)
+        writer.write_text(self.sender_public_key)
+        writer.write_text(self.receiver_address)
+        writer.write_int(self.amount)
+        writer.write_list(self.transaction_inputs)
+        writer.write_list(self.transaction_outputs)
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format
+
+        Args:
+            writer (Writer): The writer to write to
+        """
+        self.write_unsigned(writer)
+        writer.write_text(self._signature)
+
+    @classmethod
+    def read(cls, reader: Reader) -> "Transaction":
+        """Read object written by `Transaction.write`. The id and the outputs
+        are read, not recomputed.
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            transaction (Transaction): The read object
+        """
+        transaction_id = reader.read_text(packed=True)
+        sender_address = reader.read_text()
+        sender_public_key = reader.read_text()
+        receiver_address = reader.read_text()
+        amount = reader.read_int()
+        transaction_inputs = reader.read_list(TransactionOutput.read)
+        transaction_outputs = reader.read_list(TransactionOutput.read)
+        signature = reader.read_text(packed=True)
+        return cls(sender_address, sender_public_key, receiver_address,\
+            amount, transaction_inputs, signature, transaction_id,\
+            transaction_outputs)
+
+    def signing_payload(self) -> bytes:
+        """The bytes covered by the transaction's signature, i.e. the
+        canonical bytes of the transaction without its signature.
+
+        Returns:
+            payload (bytes): The signed payload
+        """
+        writer = Writer()
+        self.write_unsigned(writer)
+        return writer.getvalue()
 
     # https://gist.github.com/cevaris/e003cdeac4499d225f06
     # https://pycryptodome.readthedocs.io/en/latest/src/signature/pkcs1_v1_5.html
@@ -208,23 +411,15 @@ class Transaction:
         """
         signer = PKCS1_v1_5.new(RSA.\
             importKey(unhexlify(sender_private_key)))
-        str_dict = SHA.new(str(self.to_dict()).encode('utf8'))
+        str_dict = SHA.new(self.signing_payload())
         self.signature = hexlify(signer.sign(str_dict)).decode('ascii')
 
     def verify_transaction(self) -> bool:
         """Verify transaction by checking transaction signature with sender's
-        private key
+        public key
 
         Returns:
             bool: True if verified else False
         """
-        public_key = RSA.importKey(unhexlify(self.sender_public_key))
-        verifier = PKCS1_v1_5.new(public_key)
-        str_dict = SHA.new(str(self.to_dict()).encode('utf8'))
-        
-        try:
-            verifier.verify(str_dict, unhexlify(self.signature))
-        except:
-            return False
-        else:
-            return True
+        return verify_signature(self.sender_public_key,\
+            self.signing_payload(), self.signature)
@@ -0,0 +1,174 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from .block import Block
+from .serialization import Reader, Writer, intern_text, pack_hex
+
+# Location of a transaction with a 32-byte id: the id, the height of its
+# block and its position in the block
+_LOCATION = struct.Struct(">32sII")
+
+
+class TransactionIndex:
+    """TransactionIndex: Index of the transactions of the main chain, by id
+    (the height of their block and their position in it) and by address (the
+    ids of the transactions the address sent or received, oldest first). It
+    is updated as blocks are added to or removed from the main chain. The
+    ids are kept as raw bytes.
+    """
+
+    def __init__(self):
+        """Initialize the TransactionIndex
+        """
+        self.locations: Dict[bytes, Tuple[int, int]] = {}
+        self.by_address: Dict[str, List[bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __contains__(self, transaction_id: str) -> bool:
+        return pack_hex(transaction_id) in self.locations
+
+    def locate(self, transaction_id: str) -> Optional[Tuple[int, int]]:
+        """Find a transaction of the main chain
+
+        Args:
+            transaction_id (str): The transaction's id
+
+        Returns:
+            height, position (int, int): The height of the transaction's
+                block and its position in the block, or None if the
+                transaction is not on the main chain
+        """
+        return self.locations.get(pack_hex(transaction_id))
+
+    def history(self, address: str, offset: int = 0,\
+            limit: Optional[int] = None) -> List[Tuple[int, int]]:
+        """The transactions an address sent or received, newest first
+
+        Args:
+            address (str): The address
+            offset (int): The number of newest transactions to skip
+            limit (int): The maximum number of transactions. Defaults to all.
+
+        Returns:
+            locations (List[Tuple[int, int]]): The height of each
+                transaction's block and its position in the block
+        """
+        ids = self.by_address.get(address, [])
+        end = len(ids) - offset
+        start = 0 if limit is None else max(end - limit, 0)
+        return [self.locations[x] for x in reversed(ids[start:max(end, 0)])]
+
+    def count(self, address: str) -> int:
+        """The number of transactions an address sent or received
+
+        Args:
+            address (str): The address
+
+        Returns:
+            count (int): The number of transactions
+        """
+        return len(self.by_address.get(address, []))
+
+    @staticmethod
+    def __addresses(transaction) -> List[str]:
+        """Private function that returns the distinct addresses of a
+        transaction. The genesis transaction has no sender address.
+        """
+        addresses = []
+        for address in (transaction.sender_address,\
+                transaction.receiver_address):
+            if isinstance(address, str) and address not in addresses:
+                addresses.append(address)
+        return addresses
+
+    def add_block(self, block: Block) -> None:
+        """Index the transactions of a block appended to the main chain. A
+        transaction that is already on the main chain keeps its first
+        location.
+
+        Args:
+            block (Block): The block
+        """
+        for position, transaction in enumerate(block.list_of_transactions):
+            id = transaction._packed_id()
+            if id in self.locations:
+                continue
+            self.locations[id] = (block.index, position)
+            for address in self.__addresses(transaction):
+                self.by_address.setdefault(address, []).append(id)
+
+    def remove_block(self, block: Block) -> None:
+        """Remove the transactions of a block removed from the main chain,
+        which must be its newest indexed block
+
+        Args:
+            block (Block): The block
+        """
+        for position in range(len(block.list_of_transactions) - 1, -1, -1):
+            transaction = block.list_of_transactions[position]
+            id = transaction._packed_id()
+            if self.locations.get(id) != (block.index, position):
+                continue
+            del self.locations[id]
+            for address in self.__addresses(transaction):
+                ids = self.by_address[address]
+                if ids[-1] == id:
+                    ids.pop()
+                else:
+                    ids.remove(id)
+                if not ids:
+                    del self.by_address[address]
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format. The locations of the
+        transactions with 32-byte ids are written as fixed-size records,
+        which are read in bulk, and the transactions of an address as the
+        positions of their locations.
+
+        Args:
+            writer (Writer): The writer to write to
+        """
+        fixed = [x for x in self.locations.items()\
+            if isinstance(x[0], bytes) and len(x[0]) == 32]
+        other = [x for x in self.locations.items()\
+            if not isinstance(x[0], bytes) or len(x[0]) != 32]
+        writer.write_bytes(b"".join(_LOCATION.pack(id, height, position)\
+            for id, (height, position) in fixed))
+        writer.write_varint(len(other))
+        for id, (height, position) in other:
+            writer.write_text(id)
+            writer.write_varint(height)
+            writer.write_varint(position)
+        ordinals = {x[0]: i for i, x in enumerate(fixed + other)}
+        writer.write_varint(len(self.by_address))
+        for address, ids in self.by_address.items():
+            writer.write_text(address)
+            writer.write_bytes(struct.pack(f">{len(ids)}I",\
+                *[ordinals[x] for x in ids]))
+
+    @classmethod
+    def read(cls, reader: Reader) -> "TransactionIndex":
+        """Read object written by `TransactionIndex.write`
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            transaction_index (TransactionIndex): The read object
+        """
+        index = cls()
+        records = list(_LOCATION.iter_unpack(reader.read_bytes()))
+        ids = [x[0] for x in records]
+        index.locations = {x[0]: (x[1], x[2]) for x in records}
+        for _ in range(reader.read_varint()):
+            id = reader.read_text(packed=True)
+            ids.append(id)
+            index.locations[id] = (reader.read_varint(), reader.read_varint())
+        for _ in range(reader.read_varint()):
+            address = intern_text(reader.read_text())
+            ordinals = reader.read_bytes()
+            index.by_address[address] = [ids[x] for x in\
+                struct.unpack(f">{len(ordinals) // 4}I", ordinals)]
+        return index
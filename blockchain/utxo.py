@@ -0,0 +1,247 @@
+from typing import Dict, Iterator, List, Optional
+
+from .serialization import Reader, Writer
+from .transaction import Transaction, TransactionOutput
+
+
+class UTXOSet:
+    """UTXOSet: The unspent transaction outputs of every address. Outputs
+    are indexed by their id, and also grouped by address along with a cached
+    balance per address, so that spending, inserting and computing a balance
+    do not depend on the number of outputs.
+    """
+
+    def __init__(self):
+        """Initialize an empty UTXOSet
+        """
+        self.outputs: Dict[str, TransactionOutput] = {}
+        # address -> {output id -> output}, in insertion order, so that the
+        # oldest outputs of an address are spent first
+        self.by_address: Dict[str, Dict[str, TransactionOutput]] = {}
+        self.balances: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.outputs)
+
+    def __contains__(self, output_id: str) -> bool:
+        return output_id in self.outputs
+
+    def __iter__(self) -> Iterator[TransactionOutput]:
+        return iter(self.outputs.values())
+
+    def add(self, output: TransactionOutput) -> None:
+        """Insert an unspent output. Outputs of zero amount are not kept,
+        since they can never be spent.
+
+        Args:
+            output (TransactionOutput): The output to be inserted
+        """
+        if output.amount == 0 or output.id in self.outputs:
+            return
+        self.outputs[output.id] = output
+        self.by_address.setdefault(output.recipient_address, {})\
+            [output.id] = output
+        self.balances[output.recipient_address] =\
+            self.balances.get(output.recipient_address, 0) + output.amount
+
+    def spend(self, output_id: str) -> Optional[TransactionOutput]:
+        """Remove an output from the set
+
+        Args:
+            output_id (str): The id of the output to be spent
+
+        Returns:
+            output (TransactionOutput): The removed output, or None if it was
+                                        not in the set
+        """
+        output = self.outputs.pop(output_id, None)
+        if output is None:
+            return None
+        address_outputs = self.by_address[output.recipient_address]
+        del address_outputs[output_id]
+        if not address_outputs:
+            del self.by_address[output.recipient_address]
+        self.balances[output.recipient_address] -= output.amount
+        return output
+
+    def get_outputs(self, address: str) -> List[TransactionOutput]:
+        """Get the unspent outputs of an address
+
+        Args:
+            address (str): The address
+
+        Returns:
+            outputs (List[TransactionOutput]): The address' unspent outputs,
+                                               oldest first
+        """
+        return list(self.by_address.get(address, {}).values())
+
+    def balance(self, address: str) -> int:
+        """Get the balance of an address
+
+        Args:
+            address (str): The address
+
+        Returns:
+            balance (int): The sum of the address' unspent outputs
+        """
+        return self.balances.get(address, 0)
+
+    def select_inputs(self, address: str, amount: int)\
+            -> Optional[List[TransactionOutput]]:
+        """Select the oldest unspent outputs of an address that are enough
+        to pay the given amount.
+
+        Args:
+            address (str): The address of the payer
+            amount (int): The amount to be paid
+
+        Returns:
+            inputs (List[TransactionOutput]): The selected outputs, or None if
+                                              the balance is not enough
+        """
+        if self.balance(address) < amount:
+            return None
+        inputs = []
+        total = 0
+        for output in self.by_address.get(address, {}).values():
+            inputs.append(output)
+            total += output.amount
+            if total >= amount:
+                break
+        return inputs
+
+    def can_apply(self, transaction: Transaction) -> bool:
+        """Check that a transaction spends unspent outputs of its sender that
+        cover its amount, given as they are in the set (i.e. with the same id,
+        recipient and amount), and that its outputs pay the amount to the receiver
+        and the change back to the sender. The outputs' ids must not be in
+        the set already, since `add` would skip them and their amount would
+        be lost.
+
+        Args:
+            transaction (Transaction): The transaction to be checked
+
+        Returns:
+            bool: True if the transaction can be applied else False
+        """
+        input_ids = set()
+        total = 0
+        for transaction_input in transaction.transaction_inputs:
+            output = self.outputs.get(transaction_input.id)
+            if (output is None or output.id in input_ids or
+                    output.recipient_address != transaction.sender_address or
+                    transaction_input.recipient_address !=
+                        output.recipient_address or
+                    transaction_input.amount != output.amount):
+                return False
+            input_ids.add(output.id)
+            total += output.amount
+
+        if (transaction.amount <= 0 or total < transaction.amount or
+                len(transaction.transaction_outputs) != 2):
+            return False
+        receiver_output, sender_output = transaction.transaction_outputs
+        if (receiver_output.id == sender_output.id or
+                receiver_output.id in self.outputs or
+                sender_output.id in self.outputs):
+            return False
+        return (receiver_output.recipient_address ==
+                    transaction.receiver_address and
+                receiver_output.amount == transaction.amount and
+                sender_output.recipient_address ==
+                    transaction.sender_address and
+                sender_output.amount == total - transaction.amount)
+
+    def apply_transaction(self, transaction: Transaction,\
+            spent: Optional[List[TransactionOutput]] = None) -> bool:
+        """Spend a transaction's inputs and insert its outputs. Either the
+        whole transaction is applied or the set is left unchanged.
+
+        Args:
+            transaction (Transaction): The transaction to be applied
+            spent (List[TransactionOutput]): If given, the outputs removed
+                                             from the set are appended to
+                                             it, so that the transaction can
+                                             be rolled back
+
+        Returns:
+            bool: True if the transaction was applied else False
+        """
+        if not self.can_apply(transaction):
+            return False
+        for transaction_input in transaction.transaction_inputs:
+            output = self.spend(transaction_input.id)
+            if spent is not None:
+                spent.append(output)
+        for transaction_output in transaction.transaction_outputs:
+            self.add(transaction_output)
+        return True
+
+    def rollback_transaction(self, transaction: Transaction,\
+            spent: List[TransactionOutput]) -> None:
+        """Undo `apply_transaction`: remove the transaction's outputs and
+        restore the outputs it removed from the set, rather than the inputs
+        the sender supplied. The restored outputs are selected after the
+        ones already in the set, see `select_inputs`.
+
+        Args:
+            transaction (Transaction): The transaction to be rolled back
+            spent (List[TransactionOutput]): The outputs `apply_transaction`
+                                             removed
+        """
+        for transaction_output in transaction.transaction_outputs:
+            self.spend(transaction_output.id)
+        for output in spent:
+            self.add(output)
+
+    def to_dict(self) -> dict:
+        """Convert object to dict
+
+        Args:
+            None
+
+        Returns:
+            dict (dict): Object's dict
+        """
+        return {
+            "outputs": [x.to_dict() for x in self.outputs.values()]
+        }
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> "UTXOSet":
+        """Convert dictionary to object
+
+        Args:
+            dictionary (dict): The dictionary to be parsed
+
+        Returns:
+            utxos (UTXOSet): The parsed object
+        """
+        utxos = cls()
+        for x in dictionary["outputs"]:
+            utxos.add(TransactionOutput.from_dict(x))
+        return utxos
+
+    def write(self, writer: Writer) -> None:
+        """Write object in the canonical binary format
+
+        Args:
+            writer (Writer): The writer to write to
+        """
+        writer.write_list(list(self.outputs.values()))
+
+    @classmethod
+    def read(cls, reader: Reader) -> "UTXOSet":
+        """Read object written by `UTXOSet.write`
+
+        Args:
+            reader (Reader): The reader to read from
+
+        Returns:
+            utxos (UTXOSet): The read object
+        """
+        utxos = cls()
+        for output in reader.read_list(TransactionOutput.read):
+            utxos.add(output)
+        return utxos
@@ -0,0 +1,270 @@
+from typing import Container, Dict, List, Optional, Sequence, Tuple
+
+from .block import Block
+from .transaction import Transaction, TransactionOutput
+from .transaction_index import TransactionIndex
+from .utxo import UTXOSet
+from .verification import SignatureVerifier
+
+# The previous hash of the genesis block
+GENESIS_PREVIOUS_HASH = "1"
+
+
+class ChainValidator:
+    """ChainValidator: Validates the blocks a node receives from its peers.
+    The checks split in two parts:
+    - `check_blocks` checks what depends only on the blocks: their linkage,
+      their recomputed hashes and proof-of-work, their Merkle roots, the ids
+      and the senders of their transactions and, across the verifier's
+      process pool, their signatures. It needs no lock, so it runs before
+      the blockchain is locked.
+    - `replay` checks the transactions against the blockchain and the UTXO
+      set, in order, and applies the ones the node has not seen yet. Its
+      cost depends only on the number of new blocks.
+    """
+
+    def __init__(self, difficulty: int, capacity: int,\
+            verifier: SignatureVerifier,\
+            checkpoint: Optional[Tuple[int, str]] = None):
+        """Initialize the ChainValidator
+
+        Args:
+            difficulty (int): The number of zeros a block's hash starts with
+            capacity (int): The maximum number of transactions of a block
+            verifier (SignatureVerifier): Verifies the transactions'
+                                          signatures
+            checkpoint (Tuple[int, str]): The height and the hash of a
+                trusted block. The signatures of the blocks up to it are not
+                verified by `validate_chain`.
+        """
+        self.difficulty = difficulty
+        self.capacity = capacity
+        self.verifier = verifier
+        self.checkpoint = checkpoint
+
+    def check_header(self, block: Block, previous: Optional[Block] = None)\
+            -> Optional[str]:
+        """Check a block without its signatures: that it follows the
+        previous block, that its hash is the hash of its header and meets
+        the difficulty, that its Merkle root is the root of its transactions
+        and that their ids are the hashes of their contents.
+
+        Args:
+            block (Block): The block
+            previous (Block): The block it should follow, if known
+
+        Returns:
+            reason (str): Why the block is invalid, or None if it is valid
+        """
+        if previous is not None and (block.index != previous.index + 1 or\
+                block.previous_hash != previous.hash):
+            return f"Block {block.index} does not follow block "\
+                f"{previous.index}"
+        if not block.validate_block(block.hash):
+            return f"Block {block.index} has a wrong hash"
+        if not block.hash.startswith("0" * self.difficulty):
+            return f"Block {block.index} does not meet the difficulty"
+        if not 0 < len(block.list_of_transactions) <= self.capacity:
+            return f"Block {block.index} has "\
+                f"{len(block.list_of_transactions)} transactions"
+        if not block.validate_merkle_root():
+            return f"Block {block.index} has a wrong Merkle root"
+        for transaction in block.list_of_transactions:
+            if not transaction.validate_ids():
+                return f"Transaction {transaction.transaction_id} has wrong "\
+                    "ids"
+        return None
+
+    def check_blocks(self, blocks: Sequence[Block],\
+            previous: Optional[Block] = None,\
+            senders: Optional[Dict[str, str]] = None,\
+            signatures: bool = True) -> Optional[str]:
+        """Check consecutive blocks as described in `check_header`, along
+        with the senders and the signatures of their transactions. The
+        signatures are verified as a single batch, so that a large batch is
+        spread across the verifier's process pool, and the ones the node has
+        already verified (e.g. when the transaction was broadcasted) are not
+        verified again.
+
+        Args:
+            blocks (Sequence[Block]): The blocks, oldest first
+            previous (Block): The block the first block should follow, if
+                              known
+            senders (Dict[str, str]): The address of each public key of the
+                                      ring. If given, the senders and the
+                                      receivers must be nodes of the ring.
+            signatures (bool): Whether to verify the signatures
+
+        Returns:
+            reason (str): Why the blocks are invalid, or None if they are
+                          valid
+        """
+        for block in blocks:
+            reason = self.check_header(block, previous)
+            if reason is not None:
+                return reason
+            previous = block
+
+        return self.check_transactions([x for block in blocks\
+            for x in block.list_of_transactions], senders, signatures)
+
+    def check_transactions(self, transactions: Sequence[Transaction],\
+            senders: Optional[Dict[str, str]] = None,\
+            signatures: bool = True) -> Optional[str]:
+        """Check the senders and the signatures of transactions, as a single
+        batch, see `check_blocks`
+
+        Args:
+            transactions (Sequence[Transaction]): The transactions
+            senders (Dict[str, str]): See `check_blocks`
+            signatures (bool): Whether to verify the signatures
+
+        Returns:
+            reason (str): Why the transactions are invalid, or None if they
+                          are valid
+        """
+        if senders is not None:
+            receivers = set(senders.values())
+            for transaction in transactions:
+                if senders.get(transaction.sender_public_key) !=\
+                        transaction.sender_address or\
+                        transaction.receiver_address not in receivers:
+                    return f"Transaction {transaction.transaction_id} is "\
+                        "not between nodes of the ring"
+        if signatures:
+            verified = self.verifier.verify_many(transactions)
+            for transaction, valid in zip(transactions, verified):
+                if not valid:
+                    return f"Transaction {transaction.transaction_id} has "\
+                        "an invalid signature"
+        return None
+
+    def replay(self, ancestor: Block, blocks: Sequence[Block],\
+            utxos: UTXOSet, transaction_index: TransactionIndex,\
+            known: Container[str] = ()) -> Optional[str]:
+        """Check the transactions of the blocks that follow a block of the
+        main chain against the blockchain, in order, and apply the ones whose
+        effects are not in the UTXO set yet. A transaction must not be on the
+        main chain up to the ancestor nor twice in the blocks, and may only
+        spend the outputs of earlier transactions. The effects of the
+        transactions on the main chain after the ancestor and of the `known`
+        transactions (e.g. the mempool) are already in the UTXO set, since
+        every transaction is applied when it is validated, so only the other
+        ones are applied. If a check fails, the UTXO set is left unchanged.
+
+        Args:
+            ancestor (Block): The block of the main chain the blocks follow
+            blocks (Sequence[Block]): The blocks, oldest first
+            utxos (UTXOSet): The UTXO set
+            transaction_index (TransactionIndex): The main chain's
+                                                  transaction index
+            known (Container[str]): The ids of other transactions whose
+                                    effects are in the UTXO set
+
+        Returns:
+            reason (str): Why the blocks are invalid, or None if they are
+                          valid
+        """
+        # id -> position of each transaction in the blocks
+        positions: Dict[str, int] = {}
+        for block in blocks:
+            for transaction in block.list_of_transactions:
+                id = transaction.transaction_id
+                location = transaction_index.locate(id)
+                if id in positions or location is not None and\
+                        location[0] <= ancestor.index:
+                    return f"Transaction {id} is included twice"
+                positions[id] = len(positions)
+
+        # each applied transaction, along with the outputs it spent
+        applied: List[Tuple[Transaction, List[TransactionOutput]]] = []
+        for transaction in [x for block in blocks\
+                for x in block.list_of_transactions]:
+            id = transaction.transaction_id
+            if any(positions.get(x.transaction_id, -1) >= positions[id]\
+                    for x in transaction.transaction_inputs):
+                reason = f"Transaction {id} spends a later output"
+            elif id in known or id in transaction_index:
+                continue
+            else:
+                spent: List[TransactionOutput] = []
+                if utxos.apply_transaction(transaction, spent):
+                    applied.append((transaction, spent))
+                    continue
+                reason = f"Transaction {id} spends unavailable outputs"
+            for transaction, spent in reversed(applied):
+                utxos.rollback_transaction(transaction, spent)
+            return reason
+        return None
+
+    def validate_chain(self, blocks: Sequence[Block],\
+            senders: Optional[Dict[str, str]] = None,\
+            transactions: Sequence[Transaction] = (),\
+            utxos: Optional[UTXOSet] = None) -> Optional[str]:
+        """Validate a whole blockchain, e.g. the one a new node receives from
+        the bootstrap node: its genesis block, every following block as in
+        `check_blocks`, and its transactions, replayed in order from an empty
+        UTXO set, followed by its pending transactions. The blocks up to the
+        checkpoint, if it is given and the blockchain reaches it, are trusted
+        once they lead to its hash: their signatures are not verified.
+
+        Args:
+            blocks (Sequence[Block]): The blockchain's blocks, by height
+            senders (Dict[str, str]): See `check_blocks`
+            transactions (Sequence[Transaction]): The blockchain's pending
+                                                  transactions, e.g. its
+                                                  mempool
+            utxos (UTXOSet): An empty UTXO set, into which the transactions
+                             are replayed, so that the caller can keep it
+
+        Returns:
+            reason (str): Why the blockchain is invalid, or None if it is
+                          valid
+        """
+        if not blocks:
+            return "The blockchain is empty"
+        genesis = blocks[0]
+        genesis_transactions = genesis.list_of_transactions
+        if genesis.index != 0 or\
+                genesis.previous_hash != GENESIS_PREVIOUS_HASH or\
+                not genesis.validate_block(genesis.hash) or\
+                not genesis.validate_merkle_root() or\
+                len(genesis_transactions) != 1 or\
+                genesis_transactions[0].transaction_inputs or\
+                not genesis_transactions[0].validate_ids():
+            return "Invalid genesis block"
+
+        trusted = 0
+        if self.checkpoint is not None and self.checkpoint[0] < len(blocks):
+            trusted, hash = self.checkpoint
+            reason = self.check_blocks(blocks[1:trusted + 1], genesis,\
+                senders, signatures=False)
+            if reason is not None:
+                return reason
+            if blocks[trusted].hash != hash:
+                return f"Block {trusted} does not match the checkpoint"
+        reason = self.check_blocks(blocks[trusted + 1:], blocks[trusted],\
+            senders)
+        if reason is not None:
+            return reason
+
+        if utxos is None:
+            utxos = UTXOSet()
+        for output in genesis_transactions[0].transaction_outputs:
+            utxos.add(output)
+        reason = self.replay(genesis, blocks[1:], utxos, TransactionIndex())
+        if reason is not None:
+            return reason
+
+        for transaction in transactions:
+            if not transaction.validate_ids():
+                return f"Transaction {transaction.transaction_id} has wrong "\
+                    "ids"
+        reason = self.check_transactions(transactions, senders)
+        if reason is not None:
+            return reason
+        for transaction in transactions:
+            if not utxos.apply_transaction(transaction):
+                return f"Transaction {transaction.transaction_id} spends "\
+                    "unavailable outputs"
+        return None
@@ -0,0 +1,193 @@
+import binascii
+from binascii import unhexlify
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import hashlib
+import multiprocessing
+import os
+import threading
+from time import perf_counter
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+from Crypto.Hash import SHA
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+
+from .metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from .transaction import Transaction
+
+# Number of parsed public keys kept by load_public_key
+KEY_CACHE_SIZE = 1024
+
+VERIFY_SECONDS = REGISTRY.histogram("noobcash_verify_transactions_seconds",\
+    "Seconds spent verifying a batch of signatures")
+VERIFIED_SIGNATURES = REGISTRY.counter("noobcash_verified_signatures_total",\
+    "Signatures verified, excluding the ones found in the cache")
+
+# Batches smaller than this are verified in the calling process, since
+# shipping them to the process pool costs more than verifying them
+MIN_PARALLEL_BATCH = 64
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def load_public_key(public_key: str) -> RSA.RsaKey:
+    """Parse a public key given as hex DER. The parsed keys are cached, since
+    the ring has few senders that sign many transactions.
+
+    Args:
+        public_key (str): The public key in hex DER
+
+    Returns:
+        key (RSA.RsaKey): The parsed public key
+    """
+    return RSA.importKey(unhexlify(public_key))
+
+
+def verify_signature(public_key: str, payload: bytes, signature: str)\
+        -> bool:
+    """Verify a PKCS#1 v1.5 signature of a payload.
+
+    Args:
+        public_key (str): The signer's public key in hex DER
+        payload (bytes): The signed payload
+        signature (str): The signature in hex
+
+    Returns:
+        bool: True if the signature is valid else False
+    """
+    try:
+        verifier = PKCS1_v1_5.new(load_public_key(public_key))
+        return bool(verifier.verify(SHA.new(payload), unhexlify(signature)))
+    except (ValueError, TypeError, IndexError, binascii.Error):
+        return False
+
+
+def _verify_job(job: Tuple[str, bytes, str]) -> bool:
+    """Signature verification executed by the SignatureVerifier worker
+    processes.
+    """
+    return verify_signature(*job)
+
+
+class SignatureVerifier:
+    """SignatureVerifier: Verifies transaction signatures and remembers the
+    transactions it has already verified, so that a transaction seen again
+    (e.g. while resolving conflicts) is not verified twice. Large batches are
+    verified across a process pool.
+    """
+
+    def __init__(self, cache_size: int = 100000,\
+            processes: Optional[int] = None):
+        """Initialize the SignatureVerifier. The process pool is created on
+        the first large batch.
+
+        Args:
+            cache_size (int): Maximum number of verified transactions kept
+            processes (int): The number of verification processes. Defaults
+                             to the number of available cores.
+        """
+        self.cache_size = cache_size
+        self.processes = processes or os.cpu_count() or 1
+        # transaction_id -> digest of the verified payload and signature, in
+        # least recently used order
+        self.verified: "OrderedDict[str, bytes]" = OrderedDict()
+        self.lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def _fingerprint(transaction: "Transaction", payload: bytes) -> bytes:
+        """Digest of everything a signature check depends on. A cached
+        verification is only reused for a transaction with the same id and
+        the same fingerprint.
+        """
+        return hashlib.sha256(payload + transaction.sender_public_key\
+            .encode('ascii') + str(transaction.signature).encode('ascii'))\
+            .digest()
+
+    def _lookup(self, transaction: "Transaction", fingerprint: bytes) -> bool:
+        """Check whether a transaction has already been verified.
+        """
+        with self.lock:
+            if self.verified.get(transaction.transaction_id) != fingerprint:
+                return False
+            self.verified.move_to_end(transaction.transaction_id)
+            return True
+
+    def _remember(self, transaction: "Transaction", fingerprint: bytes)\
+            -> None:
+        """Remember a verified transaction, evicting the least recently used
+        one if the cache is full.
+        """
+        with self.lock:
+            self.verified[transaction.transaction_id] = fingerprint
+            self.verified.move_to_end(transaction.transaction_id)
+            if len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the process pool, if it does not exist yet.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(\
+                max_workers=self.processes,\
+                mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def verify(self, transaction: "Transaction") -> bool:
+        """Verify a transaction's signature.
+
+        Args:
+            transaction (Transaction): The transaction to be verified
+
+        Returns:
+            bool: True if the signature is valid else False
+        """
+        return self.verify_many([transaction])[0]
+
+    def verify_many(self, transactions: List["Transaction"]) -> List[bool]:
+        """Verify the signatures of a batch of transactions. Transactions
+        that were verified before are not verified again, and the rest are
+        spread across the process pool if there are enough of them.
+
+        Args:
+            transactions (List["Transaction"]): The transactions to be verified
+
+        Returns:
+            verified (List[bool]): For each transaction, True if its
+                                   signature is valid else False
+        """
+        start = perf_counter()
+        results = [True] * len(transactions)
+        pending = []
+        for i, transaction in enumerate(transactions):
+            payload = transaction.signing_payload()
+            fingerprint = self._fingerprint(transaction, payload)
+            if not self._lookup(transaction, fingerprint):
+                pending.append((i, fingerprint, (transaction.\
+                    sender_public_key, payload, transaction.signature)))
+
+        jobs = [x[2] for x in pending]
+        if self.processes > 1 and len(jobs) >= MIN_PARALLEL_BATCH:
+            chunksize = max(1, len(jobs) // (4 * self.processes))
+            verified = list(self._get_executor().map(_verify_job, jobs,\
+                chunksize=chunksize))
+        else:
+            verified = [_verify_job(x) for x in jobs]
+
+        for (i, fingerprint, _), valid in zip(pending, verified):
+            results[i] = valid
+            if valid:
+                self._remember(transactions[i], fingerprint)
+        VERIFIED_SIGNATURES.inc(len(jobs))
+        VERIFY_SECONDS.observe(perf_counter() - start)
+        return results
+
+    def shutdown(self) -> None:
+        """Release the process pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -7,6 +7,7 @@ from Crypto.Signature import PKCS1_v1_5
 import hashlib
 import json
 from time import time
+from typing import Optional
 from urllib.parse import urlparse
 from uuid import uuid4
 
@@ -14,15 +15,23 @@ from .transaction import TransactionOutput
 
 
 class Wallet:
-    """Wallet: Wallet class that contains node's private and public key,
-    as well as a list with unspent transactions.
+    """Wallet: Wallet class that contains node's private and public key. The
+    node's unspent transactions are kept in the node's UTXO set.
     """
     
-    def __init__(self):
+    def __init__(self, public_key: Optional[str] = None,\
+            private_key: Optional[str] = None):
         """Initialize the Wallet
+
+        Args:
+            public_key (str): Wallet's public key and
+            private_key (str): Wallet's private key, which are given if the
+                               wallet is restored. Otherwise new keys are
+                               generated.
         """
-        self.public_key, self.private_key = self.generateKeys()
-        self.unspent_transactions = []
+        if public_key is None or private_key is None:
+            public_key, private_key = self.generateKeys()
+        self.public_key, self.private_key = public_key, private_key
     
     def generateKeys(self):
         """Generate public and private key.
@@ -41,11 +50,3 @@ class Wallet:
             decode('ascii')
         
         return public_key, private_key
-    
-    def balance(self):
-        """Compute wallet's balance.
-
-        Returns:
-            balance (int): Wallet's total balance
-        """
-        return sum([x.amount for x in self.unspent_transactions])
@@ -0,0 +1,161 @@
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import threading
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Union
+
+import requests
+
+from blockchain.metrics import REGISTRY
+from blockchain.profiler import SPANS
+from blockchain.serialization import CONTENT_TYPE
+from peers import PeerRegistry
+
+
+BROADCAST_SECONDS = REGISTRY.histogram("noobcash_broadcast_seconds",\
+    "Seconds until a peer answers a broadcasted request, by peer",\
+    ("peer",))
+BROADCAST_FAILURES = REGISTRY.counter("noobcash_broadcast_failures_total",\
+    "Broadcasted requests a peer did not accept, by peer", ("peer",))
+
+# The JSON body of a request, or a function that builds it, so that it is
+# only built if a peer does not accept the binary format
+Payload = Union[dict, Callable[[], dict]]
+
+
+class Broadcaster:
+    """Broadcaster: Sends a request to every peer in parallel. Each peer has
+    its own single-worker queue, so the requests to a peer are delivered in
+    the order they were broadcast (e.g. a transaction reaches a peer before
+    the block that contains it), while different peers are served
+    concurrently and a slow peer only delays its own queue.
+    """
+
+    # Quorum semantics of a broadcast:
+    # ALL: succeeds if every peer accepts the request
+    # MAJORITY: succeeds if more than half of the peers accept the request
+    # NONE: fire-and-forget, returns without waiting for any peer
+    ALL = "all"
+    MAJORITY = "majority"
+    NONE = "none"
+    QUORUMS = (ALL, MAJORITY, NONE)
+
+    def __init__(self, peers: PeerRegistry, quorum: str = ALL):
+        """Initialize the Broadcaster
+
+        Args:
+            peers (PeerRegistry): The clients used to reach the peers
+            quorum (str): The default quorum of the broadcasts, one of
+                          Broadcaster.QUORUMS
+        """
+        self.peers = peers
+        self.quorum = quorum
+        self.executors: Dict[str, ThreadPoolExecutor] = {}
+        self.lock = threading.Lock()
+
+    def _executor(self, address: str) -> ThreadPoolExecutor:
+        """Get the request queue of a peer, creating it if needed.
+
+        Args:
+            address (str): The peer's address
+
+        Returns:
+            executor (ThreadPoolExecutor): The peer's single-worker executor
+        """
+        with self.lock:
+            if address not in self.executors:
+                self.executors[address] = ThreadPoolExecutor(max_workers=1,\
+                    thread_name_prefix=f"broadcast-{address}")
+            return self.executors[address]
+
+    def post(self, address: str, endpoint: str, payload: Payload,\
+            data: Optional[bytes] = None) -> bool:
+        """Send a request to a single peer. If a binary body is given and the
+        peer accepts the binary format, the binary body is sent, else the JSON
+        body.
+
+        Args:
+            address (str): The peer's address
+            endpoint (str): The endpoint to hit, e.g. "/found_nonce"
+            payload (Payload): The request's JSON body
+            data (bytes): The request's body in the binary format
+
+        Returns:
+            bool: True if the peer responded with 200 else False
+        """
+        client = self.peers.get(address)
+        start = perf_counter()
+        try:
+            r = None
+            if data is not None and client.binary:
+                r = client.post(endpoint, data=data,\
+                    headers={"Content-Type": CONTENT_TYPE})
+                if r.status_code == 415:
+                    client.binary = False
+                    r = None
+            if r is None:
+                r = client.post(endpoint,\
+                    json=payload() if callable(payload) else payload)
+        except requests.exceptions.RequestException as e:
+            print(f"Request to {address}{endpoint} failed:", e)
+            BROADCAST_FAILURES.labels(address).inc()
+            return False
+        BROADCAST_SECONDS.labels(address).observe(perf_counter() - start)
+        if r.status_code != 200:
+            BROADCAST_FAILURES.labels(address).inc()
+        return r.status_code == 200
+
+    def submit(self, address: str, endpoint: str, payload: Payload,\
+            data: Optional[bytes] = None) -> Future:
+        """Queue a request to a peer.
+
+        Args:
+            address (str): The peer's address
+            endpoint (str): The endpoint to hit
+            payload (Payload): The request's JSON body
+            data (bytes): The request's body in the binary format
+
+        Returns:
+            future (Future): Resolves to True if the peer accepted the request
+        """
+        return self._executor(address).submit(self.post, address, endpoint,\
+            payload, data)
+
+    def broadcast(self, addresses: List[str], endpoint: str,\
+            payload: Payload, quorum: Optional[str] = None,\
+            data: Optional[bytes] = None) -> bool:
+        """Send a request to every given peer at once, and wait until the
+        quorum is reached or can no longer be reached.
+
+        Args:
+            addresses (List[str]): The peers' addresses
+            endpoint (str): The endpoint to hit
+            payload (Payload): The request's JSON body
+            quorum (str): The quorum of this broadcast. Defaults to the
+                          broadcaster's quorum.
+            data (bytes): The request's body in the binary format, sent to
+                          the peers that accept it
+
+        Returns:
+            bool: True if the quorum was reached else False
+        """
+        quorum = quorum or self.quorum
+        with SPANS.span("broadcast"):
+            futures = [self.submit(x, endpoint, payload, data)\
+                for x in addresses]
+            if quorum == self.NONE or not futures:
+                return True
+
+            required = len(futures) if quorum == self.ALL\
+                else len(futures) // 2 + 1
+            succeeded = 0
+            failed = 0
+            for future in as_completed(futures):
+                if future.result():
+                    succeeded += 1
+                else:
+                    failed += 1
+                if succeeded >= required:
+                    return True
+                if failed > len(futures) - required:
+                    return False
+            return False
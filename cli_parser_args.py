@@ -1,4 +1,20 @@
 import argparse
+from typing import Tuple
+
+
+def checkpoint(value: str) -> Tuple[int, str]:
+    """Parse a checkpoint given as <height>:<hash>
+
+    Args:
+        value (str): The checkpoint
+
+    Returns:
+        checkpoint (Tuple[int, str]): The height and the hash of the block
+    """
+    height, _, hash = value.partition(":")
+    if not height.isdigit() or not hash:
+        raise argparse.ArgumentTypeError("expected <height>:<hash>")
+    return int(height), hash
 
 
 def add_arguments(parser: argparse.ArgumentParser):
@@ -21,6 +37,45 @@ def add_arguments(parser: argparse.ArgumentParser):
                                  help='Blockchain difficulty')
     parser_add_node.add_argument('-n', '--number_nodes', default=-1, type=int,
                                  help='The total number of nodes')
+    parser_add_node.add_argument('-w', '--mining_processes', default=0,
+                                 type=int, help='Number of processes used\
+                                     for mining (0 uses all cores)')
+    parser_add_node.add_argument('-v', '--verification_processes',
+                                 default=0, type=int, help='Number of\
+                                     processes used for signature\
+                                     verification (0 uses all cores)')
+    parser_add_node.add_argument('--data_dir', default=None, type=str,
+                                 help='Directory where the node keeps its\
+                                     blockchain, so that it can be\
+                                     restarted (not kept if omitted)')
+    parser_add_node.add_argument('--snapshot_interval', default=100,
+                                 type=int, help='Number of blocks between\
+                                     two snapshots of the UTXO set in the\
+                                     data directory')
+    parser_add_node.add_argument('--checkpoint', default=None,
+                                 type=checkpoint, help='Trusted block, as\
+                                     <height>:<hash>, up to which the\
+                                     signatures of a received blockchain\
+                                     are not verified')
+    parser_add_node.add_argument('--spans', action='store_true',
+                                 help='Time the phases of each request\
+                                     (can be switched at runtime through\
+                                     /debug/spans)')
+    parser_add_node.add_argument('--quorum', default='all',
+                                 choices=['all', 'majority', 'none'],
+                                 help='Number of peers that must validate a\
+                                     broadcasted transaction')
+    parser_add_node.add_argument('--peer_timeout', default=5.0, type=float,
+                                 help='Seconds to wait for a peer\'s\
+                                     response')
+    parser_add_node.add_argument('--pool_size', default=10, type=int,
+                                 help='Kept-alive connections per peer')
+    parser_add_node.add_argument('--retries', default=3, type=int,
+                                 help='Retries when a peer cannot be\
+                                     reached')
+    parser_add_node.add_argument('--backoff', default=0.1, type=float,
+                                 help='Backoff factor between retries, in\
+                                     seconds')
 
     parser_transaction = sub.add_parser('add_transaction',
                                         help='Add transaction to blockchain')
@@ -1,8 +1,8 @@
-import requests
 import sys
 
 from node_script import addresses
 from blockchain import Node, RingNode, Block, Transaction, TransactionOutput
+from peers import PeerRegistry
 
 
 def do_variable_checks(args):
@@ -34,6 +34,25 @@ def do_variable_checks(args):
         if args.index == 0 and args.number_nodes == -1:
             print("Please provide number of nodes in the bootstrap node")
             sys.exit(1)
+        if args.mining_processes < 0:
+            print("Please provide a non negative number of mining processes")
+            sys.exit(1)
+        if args.verification_processes < 0:
+            print("Please provide a non negative number of verification "
+                  "processes")
+            sys.exit(1)
+        if args.snapshot_interval <= 0:
+            print("Please provide a positive snapshot interval")
+            sys.exit(1)
+        if args.peer_timeout <= 0:
+            print("Please provide a positive peer timeout")
+            sys.exit(1)
+        if args.pool_size <= 0:
+            print("Please provide a positive connection pool size")
+            sys.exit(1)
+        if args.retries < 0 or args.backoff < 0:
+            print("Please provide non negative retries and backoff")
+            sys.exit(1)
     elif args.which == "transaction":
         if args.recipient == -1:
             print("Please provide recipient node")
@@ -54,18 +73,19 @@ def do_variable_checks(args):
             sys.exit(1)
 
 
-def non_bootstrap_node(node: Node, port: str):
+def non_bootstrap_node(node: Node, port: str, peers: PeerRegistry):
     """Initialization of a non bootstrap node. Sends the node's information
     to the bootstrap node.
 
     Args:
         node (Node): The node to be initialized
         port (str): The port of the node
+        peers (PeerRegistry): The clients used to reach the other nodes
     """
-    requests.post(f"http://{addresses['0']}/add_node", json={
+    peers.get(addresses['0']).post("/add_node", json={
         "index": node.index,
         "address": addresses[str(node.index)],
-        "public_key": addresses[str(node.index)]
+        "public_key": node.wallet.public_key
     })
 
 def bootstrap_node(node: Node, number_of_nodes: str):
@@ -77,12 +97,12 @@ def bootstrap_node(node: Node, number_of_nodes: str):
         node (Node): The bootstrap node to be initialized
         number_of_nodes (int): The number of the nodes of the system
     """
-    new_node = RingNode(0, addresses['0'], addresses['0'], [])
+    new_node = RingNode(0, addresses['0'], node.wallet.public_key)
     node.register_node_to_ring(new_node)
-    node.blockchain.last_block = Block(0, 0, "1")
+    genesis = Block(0, 0, "1")
     transaction = Transaction(0, 0, addresses['0'], 100*number_of_nodes,\
         [], "00")
-    node.ring[0].utxos.append(transaction.transaction_outputs[0])
-    node.wallet.unspent_transactions = node.ring[0].utxos
-    node.blockchain.last_block.add_transactions_to_block([transaction])
+    node.utxos.add(transaction.transaction_outputs[0])
+    genesis.add_transactions_to_block([transaction])
+    node.blockchain.add_new_block(genesis)
     pass
@@ -0,0 +1,94 @@
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from blockchain import Block, Transaction, TransactionOutput, Wallet
+
+
+def create_transactions(number_of_transactions: int, number_of_nodes: int)\
+        -> list:
+    """Create signed transactions between the wallets of a ring, the way a
+    node creates them, and return them as received from a peer, i.e. as
+    parsed JSON.
+
+    Args:
+        number_of_transactions (int): The number of transactions
+        number_of_nodes (int): The number of nodes, i.e. distinct senders
+
+    Returns:
+        transactions (list): The transactions' dicts
+    """
+    wallets = [Wallet() for _ in range(number_of_nodes)]
+    addresses = [f"127.0.0.1:{5000 + i}" for i in range(number_of_nodes)]
+    transactions = []
+    for _ in range(number_of_transactions):
+        sender, receiver = random.sample(range(number_of_nodes), 2)
+        transaction_input = TransactionOutput(\
+            "%064x" % random.getrandbits(256), addresses[sender], 100)
+        transaction = Transaction(addresses[sender],\
+            wallets[sender].public_key, addresses[receiver], 1,\
+            [transaction_input])
+        transaction.sign_transaction(wallets[sender].private_key)
+        transactions.append(transaction.to_dict())
+    return json.loads(json.dumps(transactions))
+
+
+def footprint(payload: str, capacity: int) -> int:
+    """Memory kept by the blocks parsed from a JSON payload of transactions,
+    after the payload itself is released.
+
+    Args:
+        payload (str): The transactions in JSON
+        capacity (int): The number of transactions per block
+
+    Returns:
+        size (int): The retained memory in bytes
+    """
+    gc.collect()
+    tracemalloc.start()
+    transactions = json.loads(payload)
+    blocks = []
+    for i in range(0, len(transactions), capacity):
+        block = Block.from_dict({
+            "index": len(blocks),
+            "timestamp": 0.0,
+            "list_of_transactions": transactions[i:i + capacity],
+            "merkle_root": "%064x" % random.getrandbits(256),
+            "nonce": 0,
+            "previous_hash": "%064x" % random.getrandbits(256),
+            "hash": "%064x" % random.getrandbits(256)
+        })
+        blocks.append(block)
+    del transactions
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+if __name__ == "__main__":
+    """Measure the memory a node needs to keep a replayed blockchain: the
+    transactions of the blocks are parsed from JSON, as in a /blockchain
+    response, and the memory kept by the parsed blocks is reported per
+    transaction.
+    """
+
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print(f"""To run the script execute the following command:
+              python3 {sys.argv[0]} [number_of_transactions] \
+[number_of_nodes] [capacity]""")
+        sys.exit(1)
+
+    number_of_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    number_of_nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    random.seed(0)
+    payload = json.dumps(create_transactions(number_of_transactions,\
+        number_of_nodes))
+    size = footprint(payload, capacity)
+    print("Transactions:", number_of_transactions)
+    print("Retained memory:", size, "bytes")
+    print("Per transaction:", round(size / number_of_transactions), "bytes")
@@ -0,0 +1,133 @@
+import os
+import random
+import sys
+import threading
+from time import perf_counter
+
+from blockchain import Block, Transaction, TransactionOutput, create_miner
+from blockchain.miner import search_nonces
+
+CAPACITIES = [1, 5, 10]
+DIFFICULTIES = [2, 3, 4]
+NUMBER_OF_BLOCKS = 5
+# Seconds during which the raw hashing speed is measured
+HASHING_DURATION = 2.0
+
+
+def create_block(capacity: int) -> Block:
+    """Create a block with a number of transactions, the way the block
+    producer creates it. The transactions are not signed, since mining does
+    not verify them.
+
+    Args:
+        capacity (int): The number of transactions of the block
+
+    Returns:
+        block (Block): The block, ready to be mined
+    """
+    addresses = [f"127.0.0.1:{5000 + i}" for i in range(2)]
+    transactions = []
+    for _ in range(capacity):
+        transaction_input = TransactionOutput(\
+            "%064x" % random.getrandbits(256), addresses[0], 100)
+        transactions.append(Transaction(addresses[0], "00", addresses[1], 1,\
+            [transaction_input], "00" * 128))
+    block = Block(1, 0, "%064x" % random.getrandbits(256))
+    block.add_transactions_to_block(transactions)
+    return block
+
+
+def hashing_speed(block: Block, duration: float) -> float:
+    """Hash nonces of a block in the calling thread for a while, with a
+    difficulty that is never met
+
+    Args:
+        block (Block): The block
+        duration (float): The seconds to hash for
+
+    Returns:
+        hashrate (float): The hashed nonces per second
+    """
+    stop_event = threading.Event()
+    timer = threading.Timer(duration, stop_event.set)
+    start = perf_counter()
+    timer.start()
+    try:
+        _, attempts = search_nonces(block.header_prefix(), 0, 1, 65,\
+            stop_event)
+        return attempts / (perf_counter() - start)
+    finally:
+        timer.cancel()
+        timer.join()
+
+
+def mining_speed(miner, capacity: int, difficulty: int,\
+        number_of_blocks: int) -> tuple:
+    """Mine new blocks with a miner, the way `Node.mine_block` mines them
+
+    Args:
+        miner (Miner): The mining engine
+        capacity (int): The number of transactions of each block
+        difficulty (int): The number of zeros a block's hash starts with
+        number_of_blocks (int): The number of blocks to mine
+
+    Returns:
+        block_time, attempts, hashrate (float, float, float): The mean
+            seconds and hashed nonces per block, and the hashed nonces per
+            second
+    """
+    elapsed = 0.0
+    attempts = 0
+    for _ in range(number_of_blocks):
+        block = create_block(capacity)
+        start = perf_counter()
+        block.set_nonce(miner.mine(block, difficulty))
+        elapsed += perf_counter() - start
+        attempts += miner.attempts
+        assert block.hash.startswith("0" * difficulty)
+    return elapsed / number_of_blocks, attempts / number_of_blocks,\
+        attempts / elapsed
+
+
+if __name__ == "__main__":
+    """Measure the speed of the mining path: the raw hashing speed of one
+    core, and the speed of a miner with the given number of processes for
+    each capacity and difficulty. The expected number of hashed nonces per
+    block is 16^difficulty.
+    """
+
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print(f"""To run the script execute the following command:
+              python3 {sys.argv[0]} [mining_processes] [number_of_blocks]""")
+        sys.exit(1)
+
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    number_of_blocks = int(sys.argv[2]) if len(sys.argv) > 2\
+        else NUMBER_OF_BLOCKS
+    random.seed(0)
+    miner = create_miner(processes)
+    cores = processes or os.cpu_count() or 1
+
+    print("Hashing, single core")
+    print(f"{'capacity':>10}{'prefix us':>12}{'hashes/s':>14}")
+    for capacity in CAPACITIES:
+        block = create_block(capacity)
+        start = perf_counter()
+        block.header_prefix()
+        prefix_time = perf_counter() - start
+        print(f"{capacity:>10}{1e6 * prefix_time:>12.1f}"\
+            f"{hashing_speed(block, HASHING_DURATION):>14.0f}")
+
+    print("Mining,", type(miner).__name__, "with", cores, "processes")
+    print(f"{'capacity':>10}{'difficulty':>12}{'block s':>10}"\
+        f"{'attempts':>12}{'hashes/s':>14}{'per core':>12}")
+    try:
+        for capacity in CAPACITIES:
+            for difficulty in DIFFICULTIES:
+                block_time, attempts, hashrate = mining_speed(miner,\
+                    capacity, difficulty, number_of_blocks)
+                print(f"{capacity:>10}{difficulty:>12}{block_time:>10.3f}"\
+                    f"{attempts:>12.0f}{hashrate:>14.0f}"\
+                    f"{hashrate / cores:>12.0f}")
+    finally:
+        miner.shutdown()
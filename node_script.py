@@ -1,11 +1,13 @@
 from ctypes import addressof
 import json
+import os
 import requests
 import sys
 from time import sleep, time
 
 
-with open('addresses.json') as json_file:
+with open(os.environ.get("NOOBCASH_ADDRESSES", "addresses.json"))\
+        as json_file:
     addresses = json.load(json_file)
 
 
@@ -13,14 +15,19 @@ if __name__ == "__main__":
     """This script will be executed in each one of the nodes. It executes the
     following:
     1) Read transactions from given file for a specific node
-    2) Execute the transactions by sending relevant requests to the recipients
+    2) Execute the transactions by sending relevant requests to the recipients.
+       If a batch size is given, the transactions are sent in batches of that
+       size to the /new_transactions endpoint.
     """
 
     if len(sys.argv) == 1:
         print(f"""To run the script execute the following command:
-              python3 {sys.argv[0]} <path_to_file_with_transactions>""")
+              python3 {sys.argv[0]} <path_to_file_with_transactions> \
+[batch_size]""")
         sys.exit(1)
 
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
     print("Reading file:", sys.argv[1])
     from_wallet = int(sys.argv[1].split(".txt")[0][-1])
     print(f"Transactions for node:", from_wallet)
@@ -35,17 +42,34 @@ if __name__ == "__main__":
 
     start_time = time()
 
-    for transaction in transactions:
-        from_wallet, to_wallet, amount = transaction
+    if batch_size > 0:
+        for i in range(0, len(transactions), batch_size):
+            batch = transactions[i:i+batch_size]
+
+            r = requests.post(\
+                f"http://{addresses[str(from_wallet)]}/new_transactions",\
+                json={
+                "transactions": [{
+                    "receiver": addresses[str(to_wallet)],
+                    "amount": amount
+                } for _, to_wallet, amount in batch]
+            })
+
+            print(f"Sent batch of {len(batch)} transactions")
+            print("Request content", r.content)
+    else:
+        for transaction in transactions:
+            from_wallet, to_wallet, amount = transaction
 
-        r = requests.post(\
-            f"http://{addresses[str(from_wallet)]}/new_transaction", json={
-            "receiver": addresses[str(to_wallet)],
-            "amount": amount
-        })
+            r = requests.post(\
+                f"http://{addresses[str(from_wallet)]}/new_transaction",\
+                json={
+                "receiver": addresses[str(to_wallet)],
+                "amount": amount
+            })
 
-        print(f"Sent request to {to_wallet} with amount = {amount}")
-        print("Request content", r.content)
+            print(f"Sent request to {to_wallet} with amount = {amount}")
+            print("Request content", r.content)
 
     print("Execution time:", time()-start_time)
 
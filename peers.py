@@ -0,0 +1,223 @@
+import io
+import threading
+from time import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PeerClient:
+    """PeerClient: HTTP client of a single peer. Keeps a pooled Session, so
+    that consecutive requests to the peer reuse keep-alive connections
+    instead of opening a new TCP connection each time, and records the
+    peer's connection statistics.
+    """
+
+    def __init__(self, address: str, pool_maxsize: int = 10,\
+            retries: int = 3, backoff_factor: float = 0.1,\
+            timeout: float = 5.0):
+        """Initialize the PeerClient
+
+        Args:
+            address (str): The peer's address (host:port)
+            pool_maxsize (int): Maximum number of kept-alive connections to
+                                the peer
+            retries (int): Number of retries when a connection to the peer
+                           cannot be established. Requests that reached the
+                           peer are never retried, since they may not be
+                           idempotent.
+            backoff_factor (float): Backoff factor between retries, in
+                                    seconds
+            timeout (float): Default seconds to wait for the peer's response
+        """
+        self.address = address
+        self.timeout = timeout
+        self.adapter = HTTPAdapter(pool_connections=1,\
+            pool_maxsize=pool_maxsize,\
+            max_retries=Retry(total=retries, connect=retries, read=0,\
+                status=0, backoff_factor=backoff_factor))
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        # Whether the peer accepts the binary format. Cleared when the peer
+        # answers a binary request with 415 (Unsupported Media Type).
+        self.binary = True
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def request(self, method: str, endpoint: str, **kwargs)\
+            -> requests.Response:
+        """Send a request to the peer. If the request is sent with
+        `stream=True`, the response's body is not read, see
+        `PeerClient.body`.
+
+        Args:
+            method (str): The HTTP method
+            endpoint (str): The endpoint to hit, e.g. "/blockchain_len"
+            **kwargs: Passed to `requests.Session.request`
+
+        Returns:
+            response (requests.Response): The peer's response
+
+        Raises:
+            requests.exceptions.RequestException: If the request failed
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        start_time = time()
+        try:
+            response = self.session.request(method,\
+                f"http://{self.address}{endpoint}", **kwargs)
+        except requests.exceptions.RequestException:
+            with self.lock:
+                self.requests += 1
+                self.failures += 1
+                self.total_time += time() - start_time
+            raise
+
+        with self.lock:
+            self.requests += 1
+            self.total_time += time() - start_time
+            body = response.request.body
+            self.bytes_sent += len(body) if body else 0
+            if not kwargs.get("stream"):
+                self.bytes_received += len(response.content)
+        return response
+
+    def body(self, response: requests.Response) -> io.BufferedReader:
+        """The body of a response to a request sent with `stream=True`, as a
+        file that reads it from the connection as needed, so that it can be
+        parsed incrementally instead of being held in memory as a whole
+
+        Args:
+            response (requests.Response): The peer's streamed response
+
+        Returns:
+            body (io.BufferedReader): The response's body
+        """
+        return io.BufferedReader(ResponseStream(self, response))
+
+    def get(self, endpoint: str, **kwargs) -> requests.Response:
+        """Send a GET request to the peer. See `PeerClient.request`.
+        """
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, **kwargs) -> requests.Response:
+        """Send a POST request to the peer. See `PeerClient.request`.
+        """
+        return self.request("POST", endpoint, **kwargs)
+
+    def connections_opened(self) -> int:
+        """Number of TCP connections opened to the peer so far
+
+        Returns:
+            connections (int): The number of opened connections
+        """
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def statistics(self) -> dict:
+        """Connection statistics of the peer
+
+        Returns:
+            statistics (dict): Number of requests, failed requests and opened
+                               connections, mean request time in seconds and
+                               bytes sent and received
+        """
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "connections_opened": self.connections_opened(),
+                "mean_request_time": self.total_time / self.requests\
+                    if self.requests else 0.0,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received
+            }
+
+    def close(self) -> None:
+        """Close the peer's kept-alive connections.
+        """
+        self.session.close()
+
+
+class ResponseStream(io.RawIOBase):
+    """ResponseStream: The body of a streamed response, as a raw file. The
+    bytes read are added to the peer's statistics.
+    """
+
+    def __init__(self, client: PeerClient, response: requests.Response):
+        """Initialize the ResponseStream
+
+        Args:
+            client (PeerClient): The client of the peer that sent the response
+            response (requests.Response): The response, sent with
+                                          `stream=True`
+        """
+        self.client = client
+        self.raw = response.raw
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.raw.read(len(buffer), decode_content=True)
+        buffer[:len(data)] = data
+        with self.client.lock:
+            self.client.bytes_received += len(data)
+        return len(data)
+
+
+class PeerRegistry:
+    """PeerRegistry: Keeps one PeerClient per peer, created on first use.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, retries: int = 3,\
+            backoff_factor: float = 0.1, timeout: float = 5.0):
+        """Initialize the PeerRegistry. The arguments are passed to every
+        PeerClient.
+
+        Args:
+            pool_maxsize (int): Maximum number of kept-alive connections per
+                                peer
+            retries (int): Number of connection retries
+            backoff_factor (float): Backoff factor between retries
+            timeout (float): Default seconds to wait for a peer's response
+        """
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.clients: Dict[str, PeerClient] = {}
+        self.lock = threading.Lock()
+
+    def get(self, address: str) -> PeerClient:
+        """Get the client of a peer, creating it if needed.
+
+        Args:
+            address (str): The peer's address
+
+        Returns:
+            client (PeerClient): The peer's client
+        """
+        with self.lock:
+            if address not in self.clients:
+                self.clients[address] = PeerClient(address,\
+                    self.pool_maxsize, self.retries, self.backoff_factor,\
+                    self.timeout)
+            return self.clients[address]
+
+    def statistics(self) -> Dict[str, dict]:
+        """Connection statistics of every peer
+
+        Returns:
+            statistics (Dict[str, dict]): The statistics by peer address
+        """
+        with self.lock:
+            clients = list(self.clients.values())
+        return {x.address: x.statistics() for x in clients}
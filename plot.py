@@ -172,3 +172,41 @@ plt.legend()
 plt.savefig('plots/scalability_throughput5d.png', bbox_inches='tight')
 
 
+# ------------ Commit latency ------------ #
+# measured by benchmark.py, so older results may lack it
+
+if all("p95_commit_latency" in x for x in results.values()):
+    latency5n4d = []
+    latency5n5d = []
+    latency10n4d = []
+    latency10n5d = []
+
+    for i in capacity:
+        latency5n4d.append(results[f"5_nodes_4_difficulty_{i}_capacity"]["p95_commit_latency"])
+        latency5n5d.append(results[f"5_nodes_5_difficulty_{i}_capacity"]["p95_commit_latency"])
+        latency10n4d.append(results[f"10_nodes_4_difficulty_{i}_capacity"]["p95_commit_latency"])
+        latency10n5d.append(results[f"10_nodes_5_difficulty_{i}_capacity"]["p95_commit_latency"])
+
+    plt.clf()
+
+    plt.figure()
+    plt.title('p95 Commit Latency (5 nodes)')
+    plt.plot(latency5n4d, marker="o", label='5 nodes, 4 difficulty', color="limegreen")
+    plt.plot(latency5n5d, marker=".", label='5 nodes, 5 difficulty', color="royalblue")
+    plt.ylabel('p95 Commit Latency (sec)')
+    plt.xlabel('Capacity')
+    plt.xticks(range(len(capacity)), capacity)
+    plt.legend()
+    plt.savefig('plots/commit_latency5n.png', bbox_inches='tight')
+
+    plt.clf()
+
+    plt.figure()
+    plt.title('p95 Commit Latency (10 nodes)')
+    plt.plot(latency10n4d, marker="v", label='10 nodes, 4 difficulty', color="tomato")
+    plt.plot(latency10n5d, marker="^", label='10 nodes, 5 difficulty', color="orange")
+    plt.ylabel('p95 Commit Latency (sec)')
+    plt.xlabel('Capacity')
+    plt.xticks(range(len(capacity)), capacity)
+    plt.legend()
+    plt.savefig('plots/commit_latency10n.png', bbox_inches='tight')
@@ -1,101 +1,370 @@
 import argparse
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, abort, jsonify, request,\
+    render_template
 from flask_cors import CORS
 import json
+import os
 import requests
 import threading
 from time import sleep
-
-from blockchain import Node, RingNode, Block, Blockchain, Transaction
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from blockchain import Node, RingNode, Block, Blockchain, BlockStore,\
+    ChainSnapshot, Transaction, UTXOSet, SignatureVerifier, RWLock,\
+    create_miner
+from blockchain import metrics, serialization
+from blockchain.metrics import REGISTRY
+from blockchain.profiler import SPANS, collapse, sample_stacks
+from blockchain.serialization import CONTENT_TYPE, NDJSON_CONTENT_TYPE
+from broadcast import Broadcaster
+from peers import PeerRegistry
 from helper import non_bootstrap_node, bootstrap_node, do_variable_checks
 from cli_parser_args import add_arguments
 
 
 this_node = None
 number_nodes = None
-
-# Used when critical section is accessed
-found_nonce_thread = threading.Lock()
-
-with open('addresses.json') as json_file:
+peers = None
+broadcaster = None
+# The store of the node's blockchain, if it is persisted
+store = None
+
+# Guards the node's blockchain: held for writing when a block is appended or
+# the blockchain is replaced, and for reading otherwise. See `Node` for the
+# locks that guard the mempool and the UTXO set.
+chain_lock = RWLock("chain")
+
+# Gauges of the node's state, computed when the metrics are collected
+MEMPOOL_TRANSACTIONS = REGISTRY.gauge("noobcash_mempool_transactions",\
+    "Transactions that are not in the blockchain yet")
+BLOCKCHAIN_HEIGHT = REGISTRY.gauge("noobcash_blockchain_height",\
+    "Index of the last block of the blockchain")
+
+# Only one profile is taken at a time, for at most this many seconds
+profile_lock = threading.Lock()
+MAX_PROFILE_SECONDS = 60
+
+with open(os.environ.get("NOOBCASH_ADDRESSES", "addresses.json"))\
+        as json_file:
     addresses = json.load(json_file)
 
 app = Flask(__name__)
 CORS(app)
 
 
+@app.before_request
+def begin_spans():
+    """Start timing the request, if spans are enabled
+    """
+    SPANS.begin(request.endpoint or request.path)
+
+
+@app.after_request
+def end_spans(response: Response) -> Response:
+    """Record the phases of a timed request, and report them to the client
+    in the Server-Timing header
+
+    Args:
+        response (Response): The response
+
+    Returns:
+        Response: The response
+    """
+    phases = SPANS.end()
+    if phases is not None:
+        response.headers["Server-Timing"] = ", ".join(\
+            f"{phase};dur={1000 * seconds:.3f}" for phase, seconds in phases)
+    return response
+
+
+def peer_addresses() -> List[str]:
+    """Addresses of every node of the ring except this one
+
+    Returns:
+        addresses (List[str]): The peers' addresses
+    """
+    return [x.address for x in this_node.ring if x.index != this_node.index]
+
+
+def broadcast_block(block: Block) -> None:
+    """Broadcast a block mined by this node to every other node, by hitting
+    the /found_nonce endpoint. The broadcast does not wait for the peers.
+
+    Args:
+        block (Block): The mined block
+    """
+    broadcaster.broadcast(peer_addresses(), "/found_nonce",\
+        lambda: {"last_block": block.to_dict()}, Broadcaster.NONE,\
+        serialization.dumps(block))
+
+
+def binary_request() -> bool:
+    """Check the format of the request's body. Aborts with 415 if the body
+    is neither in the binary format nor JSON, so that the peer falls back to
+    JSON.
+
+    Returns:
+        bool: True if the body is in the binary format, False if it is JSON
+    """
+    if request.mimetype == CONTENT_TYPE:
+        return True
+    if not request.is_json:
+        abort(415)
+    return False
+
+
+def load_request(cls: type, many: bool = False):
+    """Deserialize the request's body from the binary format. Aborts with 400
+    if the body is malformed.
+
+    Args:
+        cls (type): The class of the object(s) in the body
+        many (bool): Whether the body holds a list of objects
+
+    Returns:
+        The object, or the list of objects
+    """
+    try:
+        return serialization.loads(request.get_data(), cls, many)
+    except ValueError:
+        abort(400)
+
+
+def preferred_mimetype() -> str:
+    """The format of the response the client prefers, according to the
+    request's Accept header. Defaults to JSON.
+
+    Returns:
+        mimetype (str): The binary format, newline-delimited JSON or JSON
+    """
+    return request.accept_mimetypes.best_match(["application/json",\
+        NDJSON_CONTENT_TYPE, CONTENT_TYPE]) or "application/json"
+
+
+def json_blocks(blocks: Iterator[Block]) -> Iterator[bytes]:
+    """Serialize blocks to the JSON object `{"blocks": [...]}`, one block at
+    a time
+
+    Args:
+        blocks (Iterator[Block]): The blocks
+
+    Returns:
+        chunks (Iterator[bytes]): The JSON text, in chunks
+    """
+    yield b'{"blocks": ['
+    for i, block in enumerate(blocks):
+        yield (b", " if i else b"") +\
+            json.dumps(block.to_dict()).encode('utf8')
+    yield b"]}"
+
+
+def json_blockchain(snapshot: ChainSnapshot) -> Iterator[bytes]:
+    """Serialize a blockchain to the JSON object `{"blockchain": {...}}`,
+    one block at a time
+
+    Args:
+        snapshot (ChainSnapshot): The snapshot of the blockchain
+
+    Returns:
+        chunks (Iterator[bytes]): The JSON text, in chunks
+    """
+    yield b'{"blockchain": '
+    yield from snapshot.iter_json()
+    yield b"}"
+
+
+def longest_peer(length: int) -> Optional[str]:
+    """Ask every peer for the length of its blockchain, in parallel, and
+    find the peer with the longest one.
+
+    Args:
+        length (int): The length a peer's blockchain must exceed
+
+    Returns:
+        address (str): The address of the peer with the longest blockchain,
+                       or None if no peer has a longer blockchain
+    """
+    def blockchain_len(address: str) -> int:
+        try:
+            return int(peers.get(address).get("/blockchain_len")\
+                .json()["blockchain_len"])
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return -1
+
+    addresses = peer_addresses()
+    if not addresses:
+        return None
+    with ThreadPoolExecutor(max_workers=len(addresses)) as executor:
+        lengths = list(executor.map(blockchain_len, addresses))
+    longest = max(zip(lengths, addresses))
+    return longest[1] if longest[0] > length else None
+
+
+def fetch_blocks(address: str, locator: List[str]) -> Optional[List[Block]]:
+    """Download from a peer the blocks that follow the last block its
+    blockchain shares with this node's blockchain.
+
+    Args:
+        address (str): The peer's address
+        locator (List[str]): This node's blockchain locator, see
+                             `Blockchain.locator`
+
+    Returns:
+        blocks (List[Block]): The peer's blocks after the last common block,
+                              oldest first, or None if the peer shares no
+                              block or could not be reached
+    """
+    client = peers.get(address)
+    try:
+        r = client.get("/blocks", params={"since": locator},\
+            headers={"Accept": f"{CONTENT_TYPE}, "\
+                f"{NDJSON_CONTENT_TYPE};q=0.8, application/json;q=0.5"},\
+            stream=True)
+    except requests.exceptions.RequestException:
+        return None
+    with r:
+        if r.status_code != 200:
+            return None
+        # the blocks are parsed as they arrive, so the response is never
+        # held in memory as a whole
+        content_type = r.headers.get("Content-Type", "")
+        try:
+            if content_type.startswith(CONTENT_TYPE):
+                return serialization.load(client.body(r), Block, many=True)
+            if content_type.startswith(NDJSON_CONTENT_TYPE):
+                return [Block.from_dict(json.loads(x))\
+                    for x in client.body(r) if x.strip()]
+            return [Block.from_dict(x)\
+                for x in json.load(client.body(r))["blocks"]]
+        except (requests.exceptions.RequestException, ValueError,\
+                KeyError):
+            return None
+
+
 @app.route('/get_statistics', methods=['GET'])
 def get_statistics():
     """Endpoint that provides statistics regarding this node and its
-    blockchain (e.g. number of transactions in the blockchain, time needed to
-    mine a block)
+    blockchain (e.g. number of transactions in the blockchain, time needed and
+    nonces hashed to mine a block, hashrate). The blockchain is streamed from
+    a snapshot, so the lock is held only while the snapshot is taken.
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    found_nonce_thread.acquire()
-    blockchain = this_node.blockchain.to_dict()
-    found_nonce_thread.release()
-    return jsonify({
-        "blockchain": blockchain,
-        "number_of_transactions": this_node.blockchain.number_of_transactions,
-        "mining_times": this_node.mining_times,
-        "number_of_blocks": len(this_node.blockchain.blockchain.keys())
-        }), 200
+    with chain_lock.read():
+        snapshot = this_node.snapshot()
+    statistics = json.dumps({
+        "number_of_transactions": snapshot.number_of_transactions,
+        "mining_times": list(this_node.mining_times),
+        "mining_attempts": list(this_node.mining_attempts),
+        "hashrate": this_node.hashrate(),
+        "number_of_blocks": max(len(snapshot.blocks) - 1, 0),
+        "peers": peers.statistics()
+        })
+
+    def chunks():
+        yield statistics[:-1].encode('utf8') + b', "blockchain": '
+        yield from snapshot.iter_json()
+        yield b"}"
+    return Response(chunks(), mimetype="application/json"), 200
 
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
-    """Endpoint to get last valid block's transactions.
+    """Endpoint to get last valid block's transactions, or the transactions
+    of the block at a given height (`height`).
 
     Returns:
         Response, int: The response with the list of transactions, along with
         the HTTP status
     """
+    height = request.args.get("height", type=int)
+    with chain_lock.read():
+        if height is None:
+            block = this_node.blockchain.last_block
+        else:
+            block = this_node.blockchain.get_block_at(height)
+    if block is None:
+        return jsonify({'error': 'Block not found'}), 404
     response = {'transactions':\
-                    [x.to_dict() for x in\
-                    this_node.blockchain.last_block.list_of_transactions]
+                    [x.to_dict() for x in block.list_of_transactions]
                 }
     return jsonify(response), 200
 
 @app.route('/new_transaction', methods=['POST'])
 def add_transaction():
-    """Endpoint to create a new transaction by a node. Checks if the node
-    has enough coins to make the transaction, and if it does the function
-    also broadcasts the transaction to every other node by hitting the
-    /add_broadcasted_transaction endpoint.
+    """Endpoint to create a new transaction by a node. Checks that the
+    receiver is a node of the ring and that the node has enough coins to make
+    the transaction, and if it does the function also broadcasts the
+    transaction to every other node by hitting the
+    /add_broadcasted_transaction endpoint. The peers are hit in parallel, and
+    the broadcast succeeds when the configured quorum of peers validates the
+    transaction.
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    new_transaction = request.json
-    receiver = new_transaction["receiver"]
-    amount = new_transaction["amount"]
-    transaction = this_node.create_transaction(receiver, amount)
+    with SPANS.span("parse"):
+        new_transaction = request.get_json(silent=True)
+        if not isinstance(new_transaction, dict):
+            new_transaction = {}
+        receiver = new_transaction.get("receiver")
+        amount = new_transaction.get("amount")
+    if not isinstance(receiver, str) or not isinstance(amount, int) or\
+            isinstance(amount, bool):
+        return jsonify({'error': 'Invalid receiver or amount'}), 400
+    # the ring only grows, so the receiver is still a node of the ring when
+    # the transaction is created
+    if this_node.find_node_from_address(receiver) is None:
+        return jsonify({'error': 'Receiver is not a node of the ring'}), 400
+    with SPANS.span("create"):
+        transaction = this_node.create_transaction(receiver, amount)
     if transaction == None:
-        return jsonify({'error': 'Not enough coins to make transaction'}), 501
-
-    for node in this_node.ring:
-        if node.index != this_node.index:
-            r = requests.post(f"http://{node.address}" +
-                "/add_broadcasted_transaction",\
-                json={
-                    "transaction": transaction.to_dict()
-                })
-            if r.status_code != 200:
-                return jsonify({'error': 'Transaction not validated'}), 503
-
-    found_nonce_thread.acquire()
-    nonce = this_node.add_transaction(transaction)
-    found_nonce_thread.release()
-    if nonce != -1:
-        for ring_node in this_node.ring:
-            if ring_node.index != this_node.index:
-                requests.post(f"http://{ring_node.address}/found_nonce",\
-                    json={
-                        "last_block":
-                        this_node.blockchain.last_block.to_dict()
-                    })
-    return jsonify({}), 200
+        return jsonify({'error': 'Not enough coins to make transaction'}), 400
+
+    broadcasted = broadcaster.broadcast(peer_addresses(),\
+        "/add_broadcasted_transaction",\
+        lambda: {"transaction": transaction.to_dict()},\
+        data=serialization.dumps(transaction))
+
+    # the transaction stays in the node's mempool either way, since the peers
+    # that validated it may include it in a block
+    if not broadcasted:
+        return jsonify({'error': 'Transaction not validated',
+                        'transaction_id': transaction.transaction_id}), 503
+    return jsonify({'transaction_id': transaction.transaction_id}), 200
+
+@app.route('/new_transactions', methods=['POST'])
+def add_transactions():
+    """Endpoint to create a batch of transactions by a node. The transactions
+    are created and signed under a single lock acquisition, and broadcasted to
+    every other node as a single payload, by hitting the
+    /add_broadcasted_transactions endpoint.
+
+    Returns:
+        Response, int: The response with the result of each transaction,
+        along with the HTTP status
+    """
+    with SPANS.span("parse"):
+        transfers = [(x["receiver"], x["amount"])\
+            for x in request.json["transactions"]]
+    with SPANS.span("create"):
+        transactions = this_node.create_transactions(transfers)
+    created = [x for x in transactions if x is not None]
+
+    broadcasted = not created or broadcaster.broadcast(peer_addresses(),\
+        "/add_broadcasted_transactions",\
+        lambda: {"transactions": [x.to_dict() for x in created]},\
+        data=serialization.dumps(created))
+    results = []
+    for transaction in transactions:
+        if transaction is None:
+            results.append({'error': 'Transaction could not be made'})
+        elif not broadcasted:
+            results.append({'error': 'Transaction not validated'})
+        else:
+            results.append({'transaction_id': transaction.transaction_id})
+    return jsonify({'results': results}), 200
 
 @app.route('/add_node', methods=['POST'])
 def add_node():
@@ -111,35 +380,39 @@ def add_node():
     print("add_node", new_node)
     new_node = RingNode(new_node["index"],
                     new_node["address"],
-                    new_node["public_key"],
-                    [])
+                    new_node["public_key"])
     this_node.register_node_to_ring(new_node)
-    transaction = this_node.create_transaction(new_node.address, 100)
-    found_nonce_thread.acquire()
-    this_node.add_transaction(transaction)
-    found_nonce_thread.release()
+    this_node.create_transaction(new_node.address, 100)
 
     return jsonify({}), 200
 
 @app.route('/receive_blockchain_and_ring', methods=['POST'])
 def receive_blockchain_and_ring():
     """Endpoint to add broadcasted by the bootstrap node blockchain and ring,
-    when all of the nodes are inserted to the system.
+    when all of the nodes are inserted to the system. The blockchain and its
+    mempool are validated first, see `ChainValidator.validate_chain`, and the
+    node keeps the UTXO set they were replayed into.
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    blockchain = Blockchain(0, 0)
-    blockchain.parser(request.json["blockchain"])
-    ring = []
-    for node in request.json["ring"]:
-        ring_node = RingNode(0, "", "", [])
-        ring_node.parser(node)
-        ring.append(ring_node)
-    this_node.blockchain = blockchain
-    this_node.ring = ring
-    this_node.wallet.unspent_transactions =\
-        this_node.ring[this_node.index].utxos
+    blockchain = Blockchain.from_dict(request.json["blockchain"])
+    ring = [RingNode.from_dict(x) for x in request.json["ring"]]
+    utxos = UTXOSet()
+    reason = this_node.validator.validate_chain(blockchain.blocks,\
+        {x.public_key: x.address for x in ring},\
+        list(blockchain.transactions), utxos)
+    if reason is not None:
+        print("Invalid blockchain:", reason)
+        return jsonify({'error': 'Blockchain not valid'}), 400
+    with chain_lock.write():
+        with this_node.mempool_lock, this_node.utxo_lock:
+            this_node.blockchain = blockchain
+            this_node.set_ring(ring)
+            this_node.utxos = utxos
+        if store is not None:
+            this_node.attach_store(store)
+    this_node.wake_producer()
     return jsonify({}), 200
 
 
@@ -152,17 +425,17 @@ def broadcast_nodes():
         Response, int: The response, along with the HTTP status
     """
     if len(this_node.ring) == number_nodes:
-        for node in this_node.ring:
-            if node.index != this_node.index:
-                found_nonce_thread.acquire()
-                blockchain = this_node.blockchain.to_dict()
-                found_nonce_thread.release()
-                requests.post(f"http://{node.address}" +
-                    "/receive_blockchain_and_ring",
-                    json={
-                        "blockchain": blockchain,
-                        "ring": [x.to_dict() for x in this_node.ring]
-                    })
+        # the nodes rebuild the UTXO set by replaying the blockchain and its
+        # mempool, so it is not sent
+        with chain_lock.read():
+            blockchain = this_node.snapshot().to_dict()
+            this_node.save_state()
+        broadcaster.broadcast(peer_addresses(),\
+            "/receive_blockchain_and_ring",
+            {
+                "blockchain": blockchain,
+                "ring": [x.to_dict() for x in this_node.ring]
+            }, Broadcaster.ALL)
 
     return jsonify({}), 200
 
@@ -170,95 +443,320 @@ def broadcast_nodes():
 def add_broadcasted_transaction():
     """Endpoint to add a broadcasted transaction made by another node.
     Validates the transaction, using the validate_transaction function of the
-    node class, and adds it to the blockchain. If the node starts mining and
-    finds a nonce, before the /found_nonce endpoint is hit by another node
-    the found nonce is broadcasted to the other nodes.
+    node class, and adds it to the mempool. Once the mempool holds `capacity`
+    transactions, the block producer mines a new block in the background and
+    broadcasts it to the other nodes. The transaction is sent either in the
+    binary format or in JSON.
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    broadcasted_transaction = Transaction("", "", "", 0, [], "s")
-    broadcasted_transaction.parser(request.json["transaction"])
-    validated = this_node.validate_transaction(broadcasted_transaction)
+    with SPANS.span("parse"):
+        if binary_request():
+            broadcasted_transaction = load_request(Transaction)
+        else:
+            broadcasted_transaction = Transaction.from_dict(\
+                request.json["transaction"])
+    with SPANS.span("validate"):
+        validated = this_node.validate_transaction(broadcasted_transaction)
     if not validated:
         return jsonify({'error': 'Transaction not valid'}), 502
-
-    found_nonce_thread.acquire()
-    nonce = this_node.add_transaction(broadcasted_transaction)
-    found_nonce_thread.release()
-    if nonce != -1:
-        for ring_node in this_node.ring:
-            if ring_node.index != this_node.index:
-                requests.post(f"http://{ring_node.address}/found_nonce",\
-                    json={
-                        "last_block":
-                        this_node.blockchain.last_block.to_dict()
-                    })
     return jsonify({}), 200
 
+@app.route('/add_broadcasted_transactions', methods=['POST'])
+def add_broadcasted_transactions():
+    """Endpoint to add a batch of broadcasted transactions made by another
+    node. Validates the transactions in order and adds the valid ones to the
+    blockchain.
+
+    Returns:
+        Response, int: The response with the result of each transaction,
+        along with the HTTP status
+    """
+    with SPANS.span("parse"):
+        if binary_request():
+            broadcasted_transactions = load_request(Transaction, many=True)
+        else:
+            broadcasted_transactions = [Transaction.from_dict(x)\
+                for x in request.json["transactions"]]
+    with SPANS.span("validate"):
+        validated = this_node.validate_transactions(broadcasted_transactions)
+    return jsonify({'results': [
+        {'transaction_id': transaction.transaction_id, 'validated': valid}\
+        for transaction, valid in zip(broadcasted_transactions, validated)
+        ]}), 200
+
 @app.route('/found_nonce', methods=['POST'])
 def found_nonce():
     """Endpoint to to be hit when a node completes mining and broadcasts its
-    blockchain. Sets the found_nonce threading event's flag, to stop any
-    ongoing mining done by the node at the moment. If the broadcasted
-    blockchain is larger, it replaces the node's current blockchain. The
-    threading event's flag is restarted.
+    block. The block is checked (hashes, proof-of-work, signatures) before
+    the lock is acquired. If the block extends the node's last block, any
+    ongoing mining of a block with the same parent is cancelled, its
+    transactions go back to the mempool, and the broadcasted block is added
+    to the blockchain once its transactions are replayed.
+    Otherwise the block is kept as a side branch and, if a peer has a larger
+    blockchain, it replaces the node's current blockchain. The peers are
+    asked without holding the blockchain lock, so that the node keeps
+    serving reads and transactions meanwhile, but it does not mine. The block
+    is sent either in the binary format or in JSON.
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    block = Block(0, 0, "")
-    block.parser(request.json["last_block"])
-    found_nonce_thread.acquire()
-    if block.previous_hash != this_node.blockchain.last_block.hash:
-        longest_blockchain = len(this_node.blockchain.blockchain)
-        longest_blockchain_addr = ""
-        for ring_node in this_node.ring:
-            if ring_node.index != this_node.index:
-                r = requests.get(f"http://{ring_node.address}/blockchain_len")
-                r = r.json()
-                if int(r["blockchain_len"]) > longest_blockchain:
-                    longest_blockchain = int(r["blockchain_len"])
-                    longest_blockchain_addr = ring_node.address
-
-        if longest_blockchain_addr != "":
-            r = requests.get(f"http://{longest_blockchain_addr}/blockchain")
-
-            blockchain = Blockchain(0, 0)
-            r = r.json()
-            blockchain.parser(r["blockchain"])
-
-            this_node.resolve_conflicts(blockchain)
+    with SPANS.span("parse"):
+        if binary_request():
+            block = load_request(Block)
+        else:
+            block = Block.from_dict(request.json["last_block"])
+    # the blockchain has not been received from the bootstrap node yet
+    if this_node.blockchain.last_block is None:
+        return jsonify({}), 200
+    with SPANS.span("validate"):
+        if not this_node.check_blocks([block]):
+            return jsonify({'error': 'Block not valid'}), 400
+    with chain_lock.write():
+        if block.previous_hash == this_node.blockchain.last_block.hash:
+            added = this_node.add_received_block(block)
+            this_node.wake_producer()
+            if not added:
+                return jsonify({'error': 'Block not valid'}), 400
+            return jsonify({}), 200
+
+        this_node.blockchain.add_side_block(block)
+        # a block that does not extend a longer blockchain than this node's
+        # cannot make the node switch branch
+        if block.index <= this_node.blockchain.last_block.index:
+            return jsonify({}), 200
+        length = this_node.blockchain.last_block.index
+        locator = this_node.blockchain.locator()
+        this_node.begin_sync()
+
+    # the peers are asked without holding the lock, and the branch is
+    # checked again against the blockchain when it is received
+    try:
+        address = longest_peer(length)
+        if address is not None:
+            with SPANS.span("fetch"):
+                blocks = fetch_blocks(address, locator)
+            if blocks is not None and this_node.check_blocks(blocks):
+                with chain_lock.write():
+                    this_node.resolve_conflicts(blocks)
+    finally:
+        this_node.end_sync()
+    return jsonify({}), 200
 
-    else:
-        this_node.delete_duplicate_transactions(block)
-        this_node.blockchain.add_new_block(block)
+@app.route('/blocks', methods=['GET'])
+def blocks():
+    """Return the blocks that follow a given block, so that a node that
+    forked can download only the blocks it is missing. The block is given
+    either by its height (`height`) or by one or more hashes (`since`), newest
+    first, in which case the first hash that is in this node's blockchain is
+    used (see `Blockchain.locator`). The blocks are streamed oldest first from
+    a snapshot of the blockchain, in the binary format, as newline-delimited
+    JSON or as JSON, whichever the client prefers.
 
-    found_nonce_thread.release()
-    return jsonify({}), 200
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    mimetype = preferred_mimetype()
+    height = request.args.get("height", type=int)
+    hashes = request.args.getlist("since")
+    with chain_lock.read():
+        chain = this_node.blockchain
+        start = None
+        if height is not None:
+            start = min(max(height + 1, 0), len(chain))
+        else:
+            for hash in hashes:
+                found = chain.chain_index.height_of(hash)
+                if found is not None:
+                    start = found + 1
+                    break
+        snapshot = this_node.snapshot() if start is not None else None
+
+    if snapshot is None:
+        return jsonify({'error': 'No common block'}), 404
+    blocks = (snapshot.blocks[x] for x in range(start, len(snapshot.blocks)))
+    if mimetype == CONTENT_TYPE:
+        chunks = serialization.iter_dumps(blocks, len(snapshot.blocks) - start)
+    elif mimetype == NDJSON_CONTENT_TYPE:
+        chunks = (json.dumps(x.to_dict()).encode('utf8') + b"\n"\
+            for x in blocks)
+    else:
+        chunks = json_blocks(blocks)
+    return Response(chunks, mimetype=mimetype), 200
 
 @app.route('/blockchain_len', methods=['GET'])
 def blockchain_len():
-    """Return length of current node's blockchain
+    """Return length of current node's blockchain, along with the number of
+    transactions that are not in it yet
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
     return jsonify({"blockchain_len":
-                    len(this_node.blockchain.blockchain)
+                    max(len(this_node.blockchain) - 1, 0),
+                    "pending_transactions": this_node.pending_transactions()
                     }), 200
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Return the node's metrics in the Prometheus text format
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    return Response(REGISTRY.render(),\
+                    content_type=metrics.CONTENT_TYPE), 200
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Sample the stacks of all of the node's threads (the Flask workers,
+    the block producer, the broadcasters) for `seconds` seconds, every
+    `interval` milliseconds, and return them as collapsed stacks, which
+    flamegraph tools read. Only one profile is taken at a time.
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    seconds = request.args.get("seconds", default=10.0, type=float)
+    interval = request.args.get("interval", default=10.0, type=float)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or interval < 1:
+        return jsonify({'error': 'Invalid seconds or interval'}), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is being taken'}), 409
+    try:
+        counts = sample_stacks(seconds, interval / 1000)
+    finally:
+        profile_lock.release()
+    return Response(collapse(counts), mimetype="text/plain"), 200
+
+@app.route('/debug/spans', methods=['GET', 'POST'])
+def debug_spans():
+    """Get, or switch on or off (`{"enabled": true}`), the timing spans of
+    requests and produced blocks. While they are on, the phases of each
+    request (e.g. parse, validate, lock_wait, broadcast) and of each block
+    (mine, lock_wait, broadcast) are recorded under the
+    noobcash_request_phase_seconds metric, and each response reports them in
+    its Server-Timing header.
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    if request.method == 'POST':
+        enabled = (request.get_json(silent=True) or {}).get("enabled")
+        if enabled is None:
+            return jsonify({'error': 'Missing enabled'}), 400
+        SPANS.enabled = bool(enabled)
+    return jsonify({"enabled": SPANS.enabled}), 200
+
 @app.route('/blockchain', methods=['GET'])
 def blockchain():
-    """Return current node's blockchain
+    """Return current node's blockchain, streamed from a snapshot so that
+    the lock is held only while the snapshot is taken. The blockchain is sent
+    in the binary format, as newline-delimited JSON or as JSON, whichever the
+    client prefers (see the Accept header).
 
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    found_nonce_thread.acquire()
-    blockchain = this_node.blockchain.to_dict()
-    found_nonce_thread.release()
-    return jsonify({"blockchain": blockchain}), 200
+    mimetype = preferred_mimetype()
+    with chain_lock.read():
+        snapshot = this_node.snapshot()
+    if mimetype == CONTENT_TYPE:
+        chunks = snapshot.iter_binary()
+    elif mimetype == NDJSON_CONTENT_TYPE:
+        chunks = snapshot.iter_ndjson()
+    else:
+        chunks = json_blockchain(snapshot)
+    return Response(chunks, mimetype=mimetype), 200
+
+@app.route('/proof/<transaction_id>', methods=['GET'])
+def proof(transaction_id):
+    """Return the Merkle inclusion proof of a transaction, so that a client
+    can check that the transaction is in a block without downloading the
+    blockchain.
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    with chain_lock.read():
+        found = this_node.blockchain.get_transaction(transaction_id)
+    if found is None:
+        return jsonify({'error': 'Transaction not found'}), 404
+    block, position = found
+    transaction = block.list_of_transactions[position]
+    return jsonify({
+        "transaction": transaction.to_dict(),
+        "leaf": transaction.digest().hex(),
+        "block_index": block.index,
+        "block_hash": block.hash,
+        "merkle_root": block.merkle_root,
+        "proof": block.merkle_tree().proof(position)
+    }), 200
+
+@app.route('/transaction/<transaction_id>', methods=['GET'])
+def get_transaction(transaction_id):
+    """Return a transaction by its id, along with the block that contains
+    it. A transaction that is not in a block yet is returned with a null
+    block.
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    with chain_lock.read():
+        found = this_node.blockchain.get_transaction(transaction_id)
+        with this_node.mempool_lock:
+            pending = this_node.blockchain.transactions.get(transaction_id)
+        height = len(this_node.blockchain)
+    if found is not None:
+        block, position = found
+        return jsonify({
+            "transaction": block.list_of_transactions[position].to_dict(),
+            "block_index": block.index,
+            "block_hash": block.hash,
+            "position": position,
+            "confirmations": height - block.index
+        }), 200
+    if pending is not None:
+        return jsonify({
+            "transaction": pending.to_dict(),
+            "block_index": None,
+            "block_hash": None,
+            "position": None,
+            "confirmations": 0
+        }), 200
+    return jsonify({'error': 'Transaction not found'}), 404
+
+@app.route('/history/<address>', methods=['GET'])
+def history(address):
+    """Return the transactions an address sent or received, newest first,
+    a page at a time: `offset` transactions are skipped and at most `limit`
+    (up to 100) are returned.
+
+    Returns:
+        Response, int: The response, along with the HTTP status
+    """
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 20, type=int)
+    if offset < 0 or not 0 < limit <= 100:
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+    with chain_lock.read():
+        index = this_node.blockchain.transaction_index
+        total = index.count(address)
+        transactions = []
+        for height, position in index.history(address, offset, limit):
+            block = this_node.blockchain.blocks[height]
+            transaction = block.list_of_transactions[position].to_dict()
+            transaction["block_index"] = height
+            transactions.append(transaction)
+    return jsonify({
+        "address": address,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "transactions": transactions
+    }), 200
 
 @app.route('/get_balance', methods=['GET'])
 def get_balance():
@@ -267,7 +765,7 @@ def get_balance():
     Returns:
         Response, int: The response, along with the HTTP status
     """
-    return jsonify({"balance": this_node.wallet.balance()}), 200
+    return jsonify({"balance": this_node.wallet_balance()}), 200
 
 
 
@@ -287,14 +785,43 @@ if __name__ == '__main__':
         capacity = args.capacity
         number_nodes = args.number_nodes
 
-        this_node = Node(index, capacity, difficulty)
+        miner = create_miner(args.mining_processes)
+        verifier = SignatureVerifier(processes=args.verification_processes)
+        if args.data_dir is not None:
+            store = BlockStore(args.data_dir, args.snapshot_interval)
+        # a restarted node is restored from its store, instead of joining
+        # the ring again
+        restored = store is not None and store.load_state() is not None
+        if restored:
+            this_node = Node.restore(store, miner, chain_lock, verifier)
+        else:
+            this_node = Node(index, capacity, difficulty, miner, chain_lock,
+                             verifier)
+        this_node.validator.checkpoint = args.checkpoint
+        SPANS.enabled = args.spans
+        this_node.on_block_mined = broadcast_block
+        MEMPOOL_TRANSACTIONS.set_function(this_node.pending_transactions)
+        BLOCKCHAIN_HEIGHT.set_function(\
+            lambda: max(len(this_node.blockchain) - 1, 0))
+        this_node.start_producer()
+        peers = PeerRegistry(args.pool_size, args.retries, args.backoff,
+                             args.peer_timeout)
+        broadcaster = Broadcaster(peers, args.quorum)
 
         # non-bootstrap nodes execute this
-        if this_node.index != 0:
-            non_bootstrap_node(this_node, port)
+        if restored:
+            print("Restored node", this_node.index, "at block",
+                  this_node.blockchain.last_block.index)
+        elif this_node.index != 0:
+            non_bootstrap_node(this_node, port, peers)
         else:
             bootstrap_node(this_node, number_nodes)
-            port = 5000
+            if store is not None:
+                with chain_lock.write():
+                    this_node.attach_store(store)
+        if this_node.index == 0 and port == -1:
+            # the other nodes reach the bootstrap node at its address
+            port = int(addresses['0'].rsplit(":", 1)[1])
 
         app.run(host=addresses['host'], port=port, threaded=True)
 
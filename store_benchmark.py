@@ -0,0 +1,151 @@
+import random
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+
+from blockchain import Block, BlockStore, Node, RingNode, Transaction,\
+    TransactionIndex, UTXOSet, Wallet
+
+CAPACITY = 2
+DIFFICULTY = 1
+NUMBER_OF_NODES = 5
+SNAPSHOT_INTERVAL = 100
+
+
+def create_store(path: str, number_of_blocks: int) -> None:
+    """Create the store of a node whose blockchain holds a number of blocks,
+    the way `Node.attach_store` and `Node.add_block` create it. The
+    transactions move coins between the nodes of a ring, but they are not
+    signed nor mined, since restoring a node does not verify them.
+
+    Args:
+        path (str): The directory of the store
+        number_of_blocks (int): The number of blocks after the genesis block
+    """
+    random.seed(0)
+    addresses = [f"127.0.0.1:{5000 + i}" for i in range(NUMBER_OF_NODES)]
+    wallet = Wallet("00", "00")
+    store = BlockStore(path, SNAPSHOT_INTERVAL)
+    store.save_state({
+        "index": 0,
+        "public_key": wallet.public_key,
+        "private_key": wallet.private_key,
+        "ring": [RingNode(i, x, "%02x" % i).to_dict()\
+            for i, x in enumerate(addresses)],
+        "capacity": CAPACITY,
+        "difficulty": DIFFICULTY
+    })
+
+    utxos = UTXOSet()
+    transaction_index = TransactionIndex()
+    block = Block(0, 0, "1")
+    genesis = Transaction(0, 0, addresses[0], 100 * NUMBER_OF_NODES, [],\
+        "00")
+    utxos.add(genesis.transaction_outputs[0])
+    block.add_transactions_to_block([genesis])
+    store.append(block)
+    transaction_index.add_block(block)
+
+    signature = "00" * 128
+    for index in range(1, number_of_blocks + 1):
+        transactions = []
+        while len(transactions) < CAPACITY:
+            sender, receiver = random.sample(range(NUMBER_OF_NODES), 2)
+            inputs = utxos.select_inputs(addresses[sender], 1)
+            if inputs is None:
+                continue
+            transaction = Transaction(addresses[sender], "%02x" % sender,\
+                addresses[receiver], 1, inputs, signature)
+            utxos.apply_transaction(transaction)
+            transactions.append(transaction)
+        block = Block(index, 0, block.hash)
+        block.add_transactions_to_block(transactions)
+        store.append(block)
+        transaction_index.add_block(block)
+        # the node's last snapshot is taken at most SNAPSHOT_INTERVAL blocks
+        # before the last block
+        if index == number_of_blocks - SNAPSHOT_INTERVAL // 2:
+            store.save_snapshot(index, utxos, transaction_index)
+    store.close()
+
+
+def full_replay(path: str) -> UTXOSet:
+    """Start a node the way it starts without snapshots: decode every block
+    of the log, and apply and index every transaction.
+
+    Args:
+        path (str): The directory of the store
+
+    Returns:
+        utxos (UTXOSet): The UTXO set of the last block
+    """
+    store = BlockStore(path)
+    utxos = UTXOSet()
+    transaction_index = TransactionIndex()
+    genesis = store.get(0).list_of_transactions[0]
+    utxos.add(genesis.transaction_outputs[0])
+    transaction_index.add_block(store.get(0))
+    for height in range(1, len(store)):
+        block = store.get(height)
+        transaction_index.add_block(block)
+        for transaction in block.list_of_transactions:
+            utxos.apply_transaction(transaction)
+    store.close()
+    return utxos
+
+
+def restore(path: str) -> UTXOSet:
+    """Start a node with `Node.restore`: memory-map the log, load the latest
+    snapshot and replay only the blocks after it.
+
+    Args:
+        path (str): The directory of the store
+
+    Returns:
+        utxos (UTXOSet): The UTXO set of the last block
+    """
+    store = BlockStore(path)
+    node = Node.restore(store)
+    node.verifier.shutdown()
+    store.close()
+    return node.utxos
+
+
+def best_of(function, path: str, repeat: int = 3) -> float:
+    """Run a startup function and return its fastest time, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function(path)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    """Measure how long a node takes to start from its data directory with
+    a blockchain of each given number of blocks, when it replays the whole
+    log and when it is restored from the latest UTXO snapshot.
+    """
+
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print(f"""To run the script execute the following command:
+              python3 {sys.argv[0]} [number_of_blocks ...]""")
+        sys.exit(1)
+
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    for number_of_blocks in sizes:
+        path = tempfile.mkdtemp()
+        try:
+            create_store(path, number_of_blocks)
+            replayed = full_replay(path)
+            restored = restore(path)
+            assert sorted(x.id for x in replayed) ==\
+                sorted(x.id for x in restored)
+            print("Blocks:", number_of_blocks)
+            print("Full replay:", round(best_of(full_replay, path), 3), "s")
+            print("Restore from snapshot:", round(best_of(restore, path), 3),\
+                "s")
+        finally:
+            shutil.rmtree(path)
@@ -0,0 +1,157 @@
+import json
+import os
+import random
+import sys
+import threading
+from time import perf_counter, sleep
+
+import requests
+
+with open(os.environ.get("NOOBCASH_ADDRESSES", "addresses.json"))\
+        as json_file:
+    addresses = json.load(json_file)
+
+NUMBER_OF_CLIENTS = 8
+DURATION = 20.0
+READ_RATIO = 0.7
+
+
+class Client(threading.Thread):
+    """Client: A client that hits the nodes of the ring until a deadline,
+    with a mix of transactions and reads, and records the latency of each
+    request by operation.
+    """
+
+    def __init__(self, seed: int, nodes: list, deadline: float,\
+            read_ratio: float):
+        """Initialize the Client
+
+        Args:
+            seed (int): The seed of the client's random choices
+            nodes (list): The addresses of the nodes of the ring
+            deadline (float): The `perf_counter` time at which the client
+                              stops
+            read_ratio (float): The fraction of the requests that are reads
+        """
+        super().__init__(daemon=True)
+        self.random = random.Random(seed)
+        self.nodes = nodes
+        self.deadline = deadline
+        self.read_ratio = read_ratio
+        self.session = requests.Session()
+        # operation -> latencies in seconds, and number of failed requests
+        self.latencies = {}
+        self.errors = {}
+        self.transaction_ids = []
+
+    def request(self, operation: str, method: str, url: str, **kwargs)\
+            -> requests.Response:
+        """Send a request and record its latency under an operation
+        """
+        start = perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=30,\
+                **kwargs)
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            response, ok = None, False
+        self.latencies.setdefault(operation, []).append(perf_counter() -\
+            start)
+        if not ok:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+        return response
+
+    def run(self) -> None:
+        while perf_counter() < self.deadline:
+            node = self.random.choice(self.nodes)
+            if self.random.random() >= self.read_ratio:
+                receiver = self.random.choice([x for x in self.nodes\
+                    if x != node])
+                self.request("new_transaction", "POST",\
+                    f"http://{node}/new_transaction",\
+                    json={"receiver": receiver, "amount": 1})
+                continue
+            operation = self.random.choice(["history", "transaction",\
+                "blocks", "get_balance"])
+            if operation == "history":
+                address = self.random.choice(self.nodes)
+                r = self.request(operation, "GET",\
+                    f"http://{node}/history/{address}", params={"limit": 20})
+                if r is not None and r.status_code == 200:
+                    self.transaction_ids = [x["transaction_id"]\
+                        for x in r.json()["transactions"]]
+            elif operation == "transaction" and self.transaction_ids:
+                self.request(operation, "GET", f"http://{node}/transaction/"\
+                    f"{self.random.choice(self.transaction_ids)}")
+            elif operation == "blocks":
+                self.request(operation, "GET", f"http://{node}/blocks",\
+                    params={"height": -10**9 if self.random.random() < 0.1\
+                        else 10**9})
+            else:
+                self.request("get_balance", "GET",\
+                    f"http://{node}/get_balance")
+
+
+def percentile(values: list, fraction: float) -> float:
+    """The value below which a fraction of the values fall
+    """
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+if __name__ == "__main__":
+    """Stress the ring's locking with parallel clients: each client sends
+    transactions and reads (transaction histories, transactions, blocks,
+    balances) to random nodes for a while. Prints the throughput and the
+    latencies of each operation, and checks that the nodes agree afterwards.
+    The ring must be up and its nodes must have received the blockchain.
+    """
+
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print(f"""To run the script execute the following command:
+              python3 {sys.argv[0]} [number_of_clients] [duration] \
+[read_ratio]""")
+        sys.exit(1)
+
+    number_of_clients = int(sys.argv[1]) if len(sys.argv) > 1\
+        else NUMBER_OF_CLIENTS
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else DURATION
+    read_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else READ_RATIO
+
+    nodes = [addresses[x] for x in sorted(addresses, key=lambda x:\
+        int(x) if x.isdigit() else -1) if x.isdigit()]
+    start = perf_counter()
+    clients = [Client(i, nodes, start + duration, read_ratio)\
+        for i in range(number_of_clients)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = perf_counter() - start
+
+    print("Clients:", number_of_clients, "Duration:", round(elapsed, 1), "s")
+    print(f"{'operation':<16}{'requests':>10}{'errors':>8}{'per s':>10}"\
+        f"{'mean ms':>10}{'p95 ms':>10}")
+    total = 0
+    for operation in ["new_transaction", "history", "transaction", "blocks",\
+            "get_balance"]:
+        latencies = [x for client in clients\
+            for x in client.latencies.get(operation, [])]
+        if not latencies:
+            continue
+        errors = sum(x.errors.get(operation, 0) for x in clients)
+        total += len(latencies)
+        print(f"{operation:<16}{len(latencies):>10}{errors:>8}"\
+            f"{len(latencies) / elapsed:>10.1f}"\
+            f"{1000 * sum(latencies) / len(latencies):>10.1f}"\
+            f"{1000 * percentile(latencies, 0.95):>10.1f}")
+    print("Throughput:", round(total / elapsed, 1), "requests/s")
+
+    # the last blocks and broadcasts settle before the nodes are compared
+    sleep(5)
+    lengths = [requests.get(f"http://{x}/blockchain_len")\
+        .json()["blockchain_len"] for x in nodes]
+    balances = [requests.get(f"http://{x}/get_balance").json()["balance"]\
+        for x in nodes]
+    print("Blockchain lengths:", lengths)
+    print("Total balance:", sum(balances), "expected:", 100 * len(nodes))
@@ -0,0 +1,55 @@
+"""Builders of blocks and transactions for the tests. The transactions are
+not signed, since the UTXO set and `ChainValidator.replay` do not verify
+signatures.
+"""
+from typing import List, Optional
+
+from blockchain import Block, Transaction, TransactionOutput, UTXOSet
+
+ALICE = "127.0.0.1:5000"
+BOB = "127.0.0.1:5001"
+
+
+def genesis(amount: int = 100, address: str = ALICE) -> Block:
+    """The genesis block, which pays `amount` coins to an address
+    """
+    block = Block(0, 0, "1")
+    block.add_transactions_to_block([Transaction(0, 0, address, amount,\
+        [], "00")])
+    return block
+
+
+def utxos_of(block: Block) -> UTXOSet:
+    """A UTXO set with the outputs of a block's transactions
+    """
+    utxos = UTXOSet()
+    for transaction in block.list_of_transactions:
+        for output in transaction.transaction_outputs:
+            utxos.add(output)
+    return utxos
+
+
+def pay(sender: str, receiver: str, amount: int,\
+        inputs: List[TransactionOutput],\
+        outputs: Optional[List[TransactionOutput]] = None) -> Transaction:
+    """A transaction that spends the given inputs
+    """
+    return Transaction(sender, "00", receiver, amount, inputs,\
+        transaction_outputs=outputs)
+
+
+def block_after(previous: Block, transactions: List[Transaction]) -> Block:
+    """A block with the given transactions that follows a block
+    """
+    block = Block(previous.index + 1, 0, previous.hash)
+    block.add_transactions_to_block(transactions)
+    return block
+
+
+def state(utxos: UTXOSet) -> tuple:
+    """The contents of a UTXO set: its outputs, with their recipients and
+    amounts, the outputs of each address and the balances
+    """
+    return (sorted((x.id, x.recipient_address, x.amount) for x in utxos),\
+        {x: sorted(y) for x, y in utxos.by_address.items()},\
+        {x: y for x, y in utxos.balances.items() if y})
@@ -0,0 +1,110 @@
+import io
+
+import pytest
+
+from blockchain import Block, Transaction, TransactionIndex, UTXOSet,\
+    serialization
+
+from helpers import ALICE, BOB, block_after, genesis, pay, utxos_of
+
+SIGNATURE = "5a" * 128
+
+
+def signed(transaction: Transaction) -> Transaction:
+    transaction.signature = SIGNATURE
+    return transaction
+
+
+def test_transaction_round_trip():
+    utxos = utxos_of(genesis(100))
+    transaction = signed(pay(ALICE, BOB, 10, utxos.get_outputs(ALICE)))
+
+    loaded = serialization.loads(serialization.dumps(transaction),\
+        Transaction)
+    assert loaded.to_dict() == transaction.to_dict()
+    assert loaded.signature == SIGNATURE
+    assert loaded.validate_ids()
+
+
+def test_lazy_ids_are_computed_before_serialization():
+    utxos = utxos_of(genesis(100))
+    fresh = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    same = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+
+    # the id and the outputs of `fresh` are first computed when it is
+    # serialized
+    loaded = serialization.loads(serialization.dumps(fresh), Transaction)
+    assert loaded.transaction_id == same.transaction_id
+    assert [x.id for x in loaded.transaction_outputs] ==\
+        [x.id for x in same.transaction_outputs]
+    assert all(x.transaction_id == same.transaction_id\
+        for x in loaded.transaction_outputs)
+
+
+def test_loaded_ids_are_read_not_recomputed():
+    utxos = utxos_of(genesis(100))
+    transaction = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    loaded = serialization.loads(serialization.dumps(transaction),\
+        Transaction)
+
+    loaded.amount = 20
+    assert loaded.transaction_id == transaction.transaction_id
+    assert not loaded.validate_ids()
+    loaded.amount = 10
+    loaded.transaction_outputs[1].amount = 91
+    assert not loaded.validate_ids()
+
+
+def test_block_round_trip():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    block = block_after(first, [signed(pay(ALICE, BOB, 10,\
+        utxos.get_outputs(ALICE)))])
+    block.set_nonce(7)
+
+    loaded = serialization.loads(serialization.dumps(block), Block)
+    assert loaded.to_dict() == block.to_dict()
+    assert loaded.hash == block.hash
+    assert loaded.validate_block(block.hash)
+    assert loaded.validate_merkle_root()
+    assert serialization.loads(serialization.dumps(first), Block).hash ==\
+        first.hash
+
+
+def test_list_round_trip_and_streamed_list():
+    utxos = utxos_of(genesis(100))
+    transactions = [signed(pay(ALICE, BOB, x, utxos.get_outputs(ALICE)))\
+        for x in (1, 2, 3)]
+    data = serialization.dumps(transactions)
+
+    assert b"".join(serialization.iter_dumps(transactions, 3)) == data
+    loaded = serialization.load(io.BytesIO(data), Transaction, many=True)
+    assert [x.to_dict() for x in loaded] ==\
+        [x.to_dict() for x in transactions]
+
+
+def test_utxos_and_transaction_index_round_trip():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    transaction = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    assert utxos.apply_transaction(transaction)
+    second = block_after(first, [transaction])
+    transaction_index = TransactionIndex()
+    transaction_index.add_block(first)
+    transaction_index.add_block(second)
+
+    loaded = serialization.loads(serialization.dumps(utxos), UTXOSet)
+    assert loaded.to_dict() == utxos.to_dict()
+    assert loaded.balance(ALICE) == 90 and loaded.balance(BOB) == 10
+    loaded_index = serialization.loads(serialization.dumps(\
+        transaction_index), TransactionIndex)
+    assert loaded_index.locate(transaction.transaction_id) == (1, 0)
+    assert loaded_index.history(BOB) == transaction_index.history(BOB)
+
+
+def test_malformed_data_is_rejected():
+    data = serialization.dumps(genesis(100))
+    with pytest.raises(ValueError):
+        serialization.loads(b"\x7f" + data[1:], Block)
+    with pytest.raises(ValueError):
+        serialization.loads(data[:len(data) // 2], Block)
@@ -0,0 +1,73 @@
+from blockchain import TransactionOutput
+
+from helpers import ALICE, BOB, genesis, pay, state, utxos_of
+
+
+def test_apply_and_rollback_restore_the_prior_state():
+    utxos = utxos_of(genesis(100))
+    before = state(utxos)
+    transaction = pay(ALICE, BOB, 30, utxos.get_outputs(ALICE))
+    spent = []
+
+    assert utxos.apply_transaction(transaction, spent)
+    assert utxos.balance(ALICE) == 70 and utxos.balance(BOB) == 30
+    utxos.rollback_transaction(transaction, spent)
+    assert state(utxos) == before
+    assert len(utxos) == 1
+
+
+def test_rollback_restores_the_stored_outputs():
+    utxos = utxos_of(genesis(100))
+    before = state(utxos)
+    stored = utxos.get_outputs(ALICE)[0]
+    transaction = pay(ALICE, BOB, 30, [stored])
+    spent = []
+
+    assert utxos.apply_transaction(transaction, spent)
+    assert spent == [stored]
+    # the input the sender supplied is not what is restored
+    transaction.transaction_inputs[0] = TransactionOutput(\
+        stored.transaction_id, ALICE, 1000000, id=stored.id)
+    utxos.rollback_transaction(transaction, spent)
+    assert state(utxos) == before
+
+
+def test_can_apply_rejects_forged_inputs():
+    utxos = utxos_of(genesis(100))
+    stored = utxos.get_outputs(ALICE)[0]
+    outputs = pay(ALICE, BOB, 10, [stored]).transaction_outputs
+    forged_amount = TransactionOutput(stored.transaction_id, ALICE, 1000,\
+        id=stored.id)
+    forged_recipient = TransactionOutput(stored.transaction_id, BOB, 100,\
+        id=stored.id)
+
+    assert not utxos.can_apply(pay(ALICE, BOB, 10, [forged_amount],\
+        outputs))
+    assert not utxos.can_apply(pay(ALICE, BOB, 10, [forged_recipient],\
+        outputs))
+    assert utxos.can_apply(pay(ALICE, BOB, 10, [stored], outputs))
+
+
+def test_can_apply_rejects_outputs_already_in_the_set():
+    utxos = utxos_of(genesis(100))
+    existing = TransactionOutput("cd" * 32, BOB, 5)
+    utxos.add(existing)
+    before = state(utxos)
+    stored = utxos.get_outputs(ALICE)[0]
+    to_bob, change = pay(ALICE, BOB, 10, [stored]).transaction_outputs
+    change = TransactionOutput(change.transaction_id, ALICE, 90,\
+        id=existing.id)
+
+    transaction = pay(ALICE, BOB, 10, [stored], [to_bob, change])
+    assert not utxos.apply_transaction(transaction)
+    assert state(utxos) == before
+
+
+def test_can_apply_rejects_wrong_change():
+    utxos = utxos_of(genesis(100))
+    stored = utxos.get_outputs(ALICE)[0]
+    to_bob, change = pay(ALICE, BOB, 10, [stored]).transaction_outputs
+    change = TransactionOutput(change.transaction_id, ALICE, 95)
+
+    assert not utxos.can_apply(pay(ALICE, BOB, 10, [stored],\
+        [to_bob, change]))
@@ -0,0 +1,129 @@
+from blockchain import ChainValidator, SignatureVerifier, TransactionIndex,\
+    TransactionOutput
+
+from helpers import ALICE, BOB, block_after, genesis, pay, state, utxos_of
+
+
+def replay(utxos, ancestor, blocks, transaction_index=None):
+    validator = ChainValidator(0, 10, SignatureVerifier(processes=1))
+    return validator.replay(ancestor, blocks, utxos,\
+        transaction_index or TransactionIndex())
+
+
+def test_rejected_block_with_forged_input_leaves_utxos_unchanged():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    before = state(utxos)
+    real = utxos.get_outputs(ALICE)[0]
+    forged = TransactionOutput(real.transaction_id, ALICE, 1000000,\
+        id=real.id)
+    # the outputs match the real input, so only the input's amount is forged
+    honest = pay(ALICE, BOB, 10, [real])
+    forging = pay(ALICE, BOB, 10, [forged], honest.transaction_outputs)
+    invalid = pay(BOB, ALICE, 5, [TransactionOutput("ab" * 32, BOB, 5)])
+
+    block = block_after(first, [forging, invalid])
+    assert replay(utxos, first, [block]) is not None
+    assert state(utxos) == before
+    assert utxos.balance(ALICE) == 100
+
+
+def test_rejected_block_rolls_back_applied_transactions():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    before = state(utxos)
+    valid = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    invalid = pay(BOB, ALICE, 5, [TransactionOutput("ab" * 32, BOB, 5)])
+
+    block = block_after(first, [valid, invalid])
+    assert replay(utxos, first, [block]) is not None
+    assert state(utxos) == before
+    assert utxos.balance(ALICE) == 100 and utxos.balance(BOB) == 0
+
+
+def test_replay_applies_valid_blocks():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    to_bob = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    back = pay(BOB, ALICE, 4, [to_bob.transaction_outputs[0]])
+    second = block_after(first, [to_bob])
+    third = block_after(second, [back])
+
+    assert replay(utxos, first, [second, third]) is None
+    assert utxos.balance(ALICE) == 94 and utxos.balance(BOB) == 6
+
+
+def test_replay_rejects_double_spend_in_a_block():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    before = state(utxos)
+    inputs = utxos.get_outputs(ALICE)
+    block = block_after(first, [pay(ALICE, BOB, 10, inputs),\
+        pay(ALICE, BOB, 20, inputs)])
+
+    assert "unavailable outputs" in replay(utxos, first, [block])
+    assert state(utxos) == before
+
+
+def test_replay_rejects_double_spend_across_blocks():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    before = state(utxos)
+    inputs = utxos.get_outputs(ALICE)
+    second = block_after(first, [pay(ALICE, BOB, 10, inputs)])
+    third = block_after(second, [pay(ALICE, BOB, 20, inputs)])
+
+    assert "unavailable outputs" in replay(utxos, first, [second, third])
+    assert state(utxos) == before
+
+
+def test_replay_rejects_spending_a_later_output():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    before = state(utxos)
+    to_bob = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    back = pay(BOB, ALICE, 4, [to_bob.transaction_outputs[0]])
+    block = block_after(first, [back, to_bob])
+
+    assert "later output" in replay(utxos, first, [block])
+    assert state(utxos) == before
+
+
+def test_replay_rejects_transaction_included_twice():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    to_bob = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    block = block_after(first, [to_bob, to_bob])
+
+    assert "included twice" in replay(utxos, first, [block])
+
+
+def test_replay_rejects_transaction_of_the_main_chain():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    to_bob = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    second = block_after(first, [to_bob])
+    assert replay(utxos, first, [second]) is None
+    transaction_index = TransactionIndex()
+    transaction_index.add_block(first)
+    transaction_index.add_block(second)
+    before = state(utxos)
+
+    third = block_after(second, [to_bob])
+    assert "included twice" in replay(utxos, second, [third],\
+        transaction_index)
+    assert state(utxos) == before
+
+
+def test_replay_skips_transactions_already_applied():
+    first = genesis(100)
+    utxos = utxos_of(first)
+    to_bob = pay(ALICE, BOB, 10, utxos.get_outputs(ALICE))
+    # e.g. the transaction was validated when it was broadcasted
+    assert utxos.apply_transaction(to_bob)
+    before = state(utxos)
+    validator = ChainValidator(0, 10, SignatureVerifier(processes=1))
+
+    assert validator.replay(first, [block_after(first, [to_bob])], utxos,\
+        TransactionIndex(), {to_bob.transaction_id}) is None
+    assert state(utxos) == before